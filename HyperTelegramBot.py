@@ -8,11 +8,14 @@ from modules.token_map import TOKEN_MAP
 from modules.hyper_debridge import get_debridge_quote, send_debridge_tx
 from dotenv import load_dotenv
 import os
-import json
-from modules.hyper_lifi_bridge import fetch_lifi_balance, get_lifi_quote, format_lifi_quote, send_lifi_tx
+from modules.hyper_lifi_bridge import fetch_lifi_balance, get_lifi_quote, format_lifi_quote, send_lifi_tx, lifi_chains
 import modules.hyperlend as hyperlend
 import modules.hypurrfi as hypurrfi
+import modules.lending_protocols as lending_protocols
 from modules.loopedhype import convert_to_loop_hype, get_lhype_balance
+import modules.token_metadata as token_metadata
+from modules.instrumentation import tagged
+from eth_utils import to_checksum_address
 
 load_dotenv()
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
@@ -24,10 +27,6 @@ bot = telebot.TeleBot(TOKEN)
 db = WalletDatabase()
 wallet_manager = WalletManager(db)
 
-with open('lifi_list.json', 'r') as f:
-    lifi_data = json.load(f)
-chains = lifi_data['chains']
-
 text_header = f"```_\n_             [ HYPERFROG ]              _\n```\n\n"
 
 # In-memory user state for swap and input handling
@@ -97,6 +96,7 @@ def show_home(chat_id, user_id, message_id=None):
     else:
         bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
 
+@tagged()
 def show_balance(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     sol_wallet = wallet_manager.get_solana_wallet(user_id)
@@ -211,7 +211,7 @@ def show_private_key(chat_id, user_id, message_id):
 def format_hyperlend_data(data):
     address = data.get('address', 'N/A')
     positions = data.get('positions', {})
-    acc = data.get('account', {})
+    acc = data.get('account') or {}
 
     text = "✨ *HyperLend Overview* ✨\n\n"
     text += f"*Address:* `{address}`\n\n"
@@ -222,15 +222,16 @@ def format_hyperlend_data(data):
     else:
         text += "```\n"
         for addr, pos in positions.items():
-            if pos['supplied'] > 0 or pos['stableDebt'] > 0 or pos['variableDebt'] > 0:
-                text += f"{pos['symbol']} ({pos['name']})\n"
-                text += f"  Supplied:           {pos['supplied']:.4f}\n"
-                text += f"  Stable Debt:        {pos['stableDebt']:.4f}\n"
-                text += f"  Variable Debt:      {pos['variableDebt']:.4f}\n"
-                text += f"  Collateral:         {'Yes' if pos['usageAsCollateralEnabled'] else 'No'}\n"
-                text += f"  Liquidity Rate:     {pos['market_liquidityRatePct']:.2f}%\n"
-                text += f"  Variable Borrow:    {pos['market_variableBorrowRatePct']:.2f}%\n"
-                text += f"  Wallet Balance:     {pos['walletBalance']:.4f}\n\n"
+            if not pos.is_empty:
+                reserve = pos.reserve
+                text += f"{reserve.symbol} ({reserve.name})\n"
+                text += f"  Supplied:           {pos.supplied_amount:.4f}\n"
+                text += f"  Stable Debt:        {reserve.amount(pos.stable_debt):.4f}\n"
+                text += f"  Variable Debt:      {reserve.amount(pos.variable_debt):.4f}\n"
+                text += f"  Collateral:         {'Yes' if pos.collateral else 'No'}\n"
+                text += f"  Liquidity Rate:     {reserve.supply_rate_pct:.2f}%\n"
+                text += f"  Variable Borrow:    {reserve.borrow_rate_pct:.2f}%\n"
+                text += f"  Wallet Balance:     {reserve.amount(pos.wallet or 0):.4f}\n\n"
         text += "```\n"
 
     text += "📌 *Account Summary:*\n"
@@ -277,14 +278,14 @@ def format_hyperfi_data(account, reserves):
 
     # Account Summary (in USD)
     text += "📊 *Account Summary (USD)*\n"
-    text += f"`Collateral:`    {account.get('total_collateral', 0) * 1e10:.2f} USD\n"
-    text += f"`Debt:`          {account.get('total_debt', 0) * 1e10:.2f} USD\n"
-    text += f"`Can Borrow:`    {account.get('available_borrow', 0) * 1e10:.2f} USD\n\n"
+    text += f"`Collateral:`    {account.total_collateral / 1e8:.2f} USD\n"
+    text += f"`Debt:`          {account.total_debt / 1e8:.2f} USD\n"
+    text += f"`Can Borrow:`    {account.available_borrows / 1e8:.2f} USD\n\n"
 
     text += "🧮 *Risk Metrics*\n"
-    text += f"`LTV:`           {account.get('ltv', 0):.2f}%\n"
-    text += f"`Threshold:`     {account.get('liquidation_threshold', 0):.2f}%\n"
-    text += f"`Health Factor:` {account.get('health_factor', 'N/A')}\n\n"
+    text += f"`LTV:`           {account.ltv / 100:.2f}%\n"
+    text += f"`Threshold:`     {account.liquidation_threshold / 100:.2f}%\n"
+    text += f"`Health Factor:` {account.health_factor}\n\n"
 
     # Active Reserves
     text += "🏦 *Your Active Positions*\n"
@@ -294,12 +295,12 @@ def format_hyperfi_data(account, reserves):
 
     for addr, res in reserves.items():
         symbol = get_token_symbol(addr) or addr[:10] + "..."
-        supplied = res["supplied_balance"]
-        stable = res["stable_debt"]
-        variable = res["variable_debt"]
-        used = "Yes" if res["usage_as_collateral"] else "No"
+        supplied = res.supplied_amount
+        stable = res.reserve.amount(res.stable_debt)
+        variable = res.reserve.amount(res.variable_debt)
+        used = "Yes" if res.collateral else "No"
 
-        if supplied > 0 or stable > 0 or variable > 0:
+        if not res.is_empty:
             text += f"\n• *{symbol}*\n"
             text += f"   ├ Supplied:       `{supplied:.4f}`\n"
             text += f"   ├ Stable Debt:    `{stable:.4f}`\n"
@@ -308,6 +309,7 @@ def format_hyperfi_data(account, reserves):
 
     return text
 
+@tagged()
 def show_yield(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     if not evm_wallet:
@@ -330,6 +332,7 @@ def show_yield(chat_id, user_id, message_id):
     markup.add(types.InlineKeyboardButton('Home', callback_data='back_home'))
     bot.edit_message_text(text, chat_id, message_id, reply_markup=markup, parse_mode='Markdown')
 
+@tagged()
 def show_hyperlend_positions(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     if not evm_wallet:
@@ -388,6 +391,7 @@ def show_hyperlend_positions(chat_id, user_id, message_id):
         except telegram.error.TelegramError:
             pass
 
+@tagged()
 def show_hypurrfi_positions(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     if not evm_wallet:
@@ -413,8 +417,10 @@ def show_hypurrfi_positions(chat_id, user_id, message_id):
         loading_message_id = None
 
     try:
-        hyperfi_account = hypurrfi.get_user_account_data(address)
-        hyperfi_reserves = hypurrfi.get_user_reserve_data_full(address)
+        # reserves and account data from one multicall
+        portfolio = hypurrfi.get_full_user_portfolio(address)
+        hyperfi_account = portfolio['account']
+        hyperfi_reserves = hypurrfi.get_user_reserve_data_full(address, portfolio)
         formatted_hyperfi = format_hyperfi_data(hyperfi_account, hyperfi_reserves)
         text = (
             f"```_\n_             [ HYPERFROG ]              _\n```\n\n"
@@ -447,6 +453,7 @@ def show_hypurrfi_positions(chat_id, user_id, message_id):
         except telegram.error.TelegramError:
             pass
 
+@tagged()
 def show_loopedhype_positions(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     if not evm_wallet:
@@ -475,7 +482,7 @@ def show_loopedhype_positions(chat_id, user_id, message_id):
         text = (
             f"```_\n_             [ HYPERFROG ]              _\n```\n\n"
             f"✨ *Looped Hype Overview* ✨\n\n"
-            f"*Hype Balance:* {hype_balance:.4f}\n\n"
+            f"*Hype Balance:* {format_balance(hype_balance)}\n\n"
             f"*Looped Hype Balance:* {lhype_balance:.4f}\n\n"
         )
         markup = types.InlineKeyboardMarkup(row_width=2)
@@ -502,6 +509,7 @@ def show_loopedhype_positions(chat_id, user_id, message_id):
         except telegram.error.TelegramError:
             pass
 
+@tagged()
 def show_hyperlend_markets(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     if not evm_wallet:
@@ -555,6 +563,7 @@ def show_hyperlend_markets(chat_id, user_id, message_id):
         except telegram.error.TelegramError:
             pass
 
+@tagged()
 def show_hypurrfi_markets(chat_id, user_id, message_id):
     evm_wallet = wallet_manager.get_evm_wallet(user_id)
     if not evm_wallet:
@@ -603,6 +612,7 @@ def show_hypurrfi_markets(chat_id, user_id, message_id):
         except telegram.error.TelegramError:
             pass
 
+@tagged()
 def show_asset_actions(chat_id, user_id, message_id):
     protocol = state.get(user_id, {}).get('protocol')
     asset_addr = state.get(user_id, {}).get('asset_addr')
@@ -657,8 +667,8 @@ def show_asset_actions(chat_id, user_id, message_id):
             reserves_list = state[user_id].get('hypurrfi_reserves', [])
             r = next((rr for rr in reserves_list if rr['asset'] == asset_addr), {})
             symbol = r.get('symbol', 'Unknown')
-            account = hypurrfi.get_user_account_data(address)
-            res = hypurrfi.get_user_reserve_data_full(address).get(asset_addr, {})
+            portfolio = hypurrfi.get_full_user_portfolio(address)
+            res = portfolio['positions'].get(asset_addr, {})
             text += "```"  
             text += f"\n💠 Asset:              {symbol}\n"
             text += f"💰 Supplied:           {res.get('supplied_balance', 0):.4f}\n"
@@ -667,7 +677,7 @@ def show_asset_actions(chat_id, user_id, message_id):
             text += f"🛡️ Collateral Enabled: {'Yes' if res.get('usage_as_collateral', False) else 'No'}\n"
             text += f"💧 Liquidity Rate:     {r.get('liquidity_rate_%', 0):.2f}%\n"
             text += f"⚡ Borrow Rate:        {r.get('variable_borrow_rate_%', 0):.2f}%\n"
-            text += f"🔓 Wallet Balance:     {get_token_balance_evm(address, asset_addr):.4f} {(symbol)}\n"
+            text += f"🔓 Wallet Balance:     {format_balance(get_token_balance_evm(address, asset_addr))} {(symbol)}\n"
             text += "```"
             text += "\n\n👇 *Select an action:*"
             markup = types.InlineKeyboardMarkup(row_width=2)
@@ -694,9 +704,8 @@ def show_asset_actions(chat_id, user_id, message_id):
             pass
 
 def prompt_for_amount(chat_id, user_id, message_id, action):
-    protocol = state[user_id]['protocol']
     text = f"Enter amount to {action} "
-    if protocol == 'hyperlend' and action in ['supply', 'withdraw', 'repay']:
+    if action in ['supply', 'withdraw', 'repay']:
         text += "(or 'max' for maximum):"
     else:
         text += ":"
@@ -706,53 +715,30 @@ def prompt_for_amount(chat_id, user_id, message_id, action):
     state[user_id]['waiting'] = f'amount_{action}'
     state[user_id]['message_id'] = message_id
 
+@tagged()
 def execute_action(chat_id, user_id, mid, action, amount_str):
     protocol = state.get(user_id, {}).get('protocol')
     asset_addr = state.get(user_id, {}).get('asset_addr')
     private_key, address = wallet_manager.get_evm_wallet(user_id)
     try:
-        if protocol == 'hyperlend':
-            markets = state[user_id].get('hyperlend_markets', {})
-            m = markets.get(asset_addr, {})
-            decimals = m.get('decimals', 18)
-            if amount_str.lower() == 'max':
-                if action == 'supply':
-                    positions = hyperlend.get_user_positions(private_key)
-                    pos = positions['positions'].get(asset_addr, {})
-                    amount_wei = pos.get('walletBalance_raw', 0)
-                elif action == 'withdraw':
-                    amount_wei = None
-                elif action == 'repay':
-                    amount_wei = None
-                else:
-                    raise ValueError(" 'max' not supported for this action.")
-            else:
-                amount = float(amount_str)
-                amount_wei = int(amount * 10 ** decimals)
+        adapter = lending_protocols.get_protocol(protocol)
+        try:
+            reserve = adapter.snapshot_markets().get(to_checksum_address(asset_addr))
+        except Exception as e:
+            print(f"{adapter.label} markets unavailable, decimals from token metadata: {e}")
+            reserve = None
+        decimals = reserve.decimals if reserve else token_metadata.token_decimals(asset_addr)
+        if amount_str.lower() == 'max':
             if action == 'supply':
-                tx_hash = hyperlend.supply_with_approve(private_key, asset_addr, amount_wei, approve_infinite=True)
-            elif action == 'withdraw':
-                tx_hash = hyperlend.withdraw(private_key, asset_addr, amount_wei)
-            elif action == 'borrow':
-                tx_hash = hyperlend.borrow(private_key, asset_addr, amount_wei)
-            elif action == 'repay':
-                tx_hash = hyperlend.repay_with_approve(private_key, asset_addr, amount_wei, approve_infinite=True)
-        elif protocol == 'hypurrfi':
-            reserves_list = state[user_id].get('hypurrfi_reserves', [])
-            r = next((rr for rr in reserves_list if rr['asset'] == asset_addr), {})
-            decimals = r.get('decimals', 18)
-            if amount_str.lower() == 'max':
-                raise ValueError(" 'max' not supported for HypurrFi supply, enter numeric amount.")
+                amount_wei = adapter.wallet_balance(asset_addr, address)
+            elif action in ('withdraw', 'repay'):
+                amount_wei = None
+            else:
+                raise ValueError(" 'max' not supported for this action.")
+        else:
             amount = float(amount_str)
             amount_wei = int(amount * 10 ** decimals)
-            if action == 'supply':
-                tx_hash = hypurrfi.supply(asset_addr, amount_wei, address, private_key)
-            elif action == 'withdraw':
-                tx_hash = hypurrfi.withdraw(asset_addr, amount_wei, address, private_key)
-            elif action == 'borrow':
-                tx_hash = hypurrfi.borrow(asset_addr, amount_wei, address, private_key)
-            elif action == 'repay':
-                tx_hash = hypurrfi.repay(asset_addr, amount_wei, address, private_key)
+        tx_hash = adapter.send(private_key, {'type': action, 'asset': asset_addr, 'amount': amount_wei})
         # Delete user input message if it exists
         if 'user_input_message_id' in state[user_id]:
             try:
@@ -806,6 +792,7 @@ def prompt_for_stake_amount(chat_id, user_id, message_id):
     state[user_id]['waiting'] = 'stake_amount'
     state[user_id]['message_id'] = message_id
 
+@tagged()
 def execute_stake(chat_id, user_id, mid, amount_str):
     private_key, address = wallet_manager.get_evm_wallet(user_id)
     try:
@@ -865,6 +852,10 @@ def show_settings(chat_id, user_id, message_id=None):
     else:
         bot.send_message(chat_id, text, reply_markup=markup, parse_mode='Markdown')
 
+def format_balance(balance):
+    # None: the read failed, which must not look like an empty wallet
+    return "unavailable" if balance is None else f"{balance:.4f}"
+
 def convert_wei_to_units(amount: str, token: str, token_address: str) -> float:
     decimals = get_token_decimals(token_address)
     return float(amount) / (10 ** decimals)
@@ -888,6 +879,7 @@ def format_bridge_message(resp: dict) -> str:
         f"to *{dst_amount:.4f}* {dst_symbol} (~${dst_usd:.2f}) _via deBridge_"
     )
 
+@tagged()
 def show_swap_selection(chat_id, user_id, message_id):
     # Show loading template
     markup = types.InlineKeyboardMarkup(row_width=2)
@@ -1064,7 +1056,7 @@ def show_swap_selection(chat_id, user_id, message_id):
 def show_bridge_evm_chains(chat_id, user_id, message_id):
     text = f"```_\n_             [ HYPERFROG ]              _\n```\n\nChoose chain to bridge from:"
     markup = types.InlineKeyboardMarkup(row_width=2)
-    chain_buttons = [types.InlineKeyboardButton(chain['name'], callback_data=f'bridge_evm_from_{chain["key"]}') for chain in chains]
+    chain_buttons = [types.InlineKeyboardButton(chain['name'], callback_data=f'bridge_evm_from_{chain["key"]}') for chain in lifi_chains()]
     markup.add(*chain_buttons)
     markup.add(types.InlineKeyboardButton('Home', callback_data='back_home'))
     markup.add(types.InlineKeyboardButton('Back', callback_data='balance'))
@@ -1210,7 +1202,7 @@ def callback_handler(call):
         show_bridge_evm_chains(chat_id, user_id, message_id)
     elif data.startswith('bridge_evm_from_'):
         chain_key = data.split('_')[3]
-        selected_chain = next((c for c in chains if c['key'] == chain_key), None)
+        selected_chain = next((c for c in lifi_chains() if c['key'] == chain_key), None)
         if not selected_chain:
             bot.edit_message_text(f"```_\n_             [ HYPERFROG ]              _\n```\n\nError: Chain not found.", chat_id, message_id, parse_mode='Markdown')
             show_home(chat_id, user_id)
@@ -1417,7 +1409,15 @@ def callback_handler(call):
         hype_token_address = "0x2222222222222222222222222222222222222222"
         _, address = wallet_manager.get_evm_wallet(user_id)
         hype_balance = get_token_balance_evm(address, hype_token_address)
-        if hype_balance <= 0:
+        if hype_balance is None:
+            text = f"```_\n_             [ HYPERFROG ]              _\n```\n\nCould not read your HYPE balance, please try again."
+            markup = types.InlineKeyboardMarkup(row_width=2)
+            markup.add(
+                types.InlineKeyboardButton('HOME', callback_data='back_home'),
+                types.InlineKeyboardButton('Back', callback_data='yield_loopedhype')
+            )
+            bot.edit_message_text(text, chat_id, message_id, reply_markup=markup, parse_mode='Markdown')
+        elif hype_balance <= 0:
             text = f"```_\n_             [ HYPERFROG ]              _\n```\n\nNo hype available, please send on hyperevm to `{address}` or bridge from solana or any evm chain"
             markup = types.InlineKeyboardMarkup(row_width=2)
             markup.add(
@@ -1505,6 +1505,19 @@ def handle_text(message):
                 token = state[user_id]['swap_from']
                 max_balance = get_token_balance_evm(evm_wallet[1], TOKEN_MAP[token])
                 # max_balance = evm_balances['native'] if token == 'HYPE' else evm_balances['tokens'].get(token, 0)
+                hype_balance = get_token_balance_evm(evm_wallet[1], TOKEN_MAP['HYPE'])
+                if max_balance is None or hype_balance is None:
+                    bot.reply_to(message, f"```_\n_             [ HYPERFROG ]              _\n```\n\nCould not read your balances, please try again.", parse_mode='Markdown')
+                    markup = types.InlineKeyboardMarkup(row_width=2)
+                    markup.add(types.InlineKeyboardButton('Home', callback_data='back_home'))
+                    try:
+                        bot.delete_message(chat_id, kid)
+                    except:
+                        pass
+                    bot.send_message(chat_id, f"```_\n_             [ HYPERFROG ]              _\n```\n\n", reply_markup=markup, parse_mode='Markdown')
+                    if user_id in state:
+                        state.pop(user_id)
+                    return
                 if amount > max_balance:
                     bot.reply_to(message, f"```_\n_             [ HYPERFROG ]              _\n```\n\nInsufficient balance. Available: {max_balance:.2f} {token}.", parse_mode='Markdown')
                     text = f"```_\n_             [ HYPERFROG ]              _\n```\n\n"
@@ -1519,7 +1532,6 @@ def handle_text(message):
                     show_swap_selection(chat_id, user_id, message_id)
                     return
                 # Check HYPE balance for gas fees
-                hype_balance = get_token_balance_evm(evm_wallet[1], TOKEN_MAP['HYPE'])
                 if token == 'HYPE' and hype_balance - amount < 0.02:
                     bot.reply_to(message, f"```_\n_             [ HYPERFROG ]              _\n```\n\nError: You need at least 0.05 HYPE to cover gas fees.", parse_mode='Markdown')
                     markup = types.InlineKeyboardMarkup(row_width=2)
@@ -1741,6 +1753,7 @@ def handle_text(message):
 
 if __name__ == '__main__':
     try:
+        token_metadata.prewarm()
         bot.infinity_polling()
     finally:
         db.close()  # Ensure database connection is closed on exit
\ No newline at end of file
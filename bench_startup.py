@@ -0,0 +1,102 @@
+"""
+Startup benchmark: wall-clock import time of the bot and the strategy runner.
+Every run imports the module in a fresh interpreter, so nothing is cached between runs.
+
+    python bench_startup.py                 # HyperTelegramBot and froghop, 5 runs each
+    python bench_startup.py -n 10 --offline # HyperEVM pointed at an unreachable endpoint
+    python bench_startup.py --top 15 froghop
+
+--offline checks that importing does no network I/O: the import must still succeed
+and take about as long as with a reachable node.
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TARGETS = ["HyperTelegramBot", "froghop"]
+UNREACHABLE_RPC = "http://127.0.0.1:9"
+
+TIMER = (
+    "import time; t = time.perf_counter(); import {module}; "
+    "print('IMPORT_SECONDS', time.perf_counter() - t)"
+)
+
+
+def bench_env(offline):
+    env = dict(os.environ)
+    # placeholders so the import gets past config checks when no .env is present
+    env.setdefault("TELEGRAM_BOT_TOKEN", "0:startup-bench")
+    if not env.get("MASTER_KEY"):
+        from cryptography.fernet import Fernet
+        env["MASTER_KEY"] = Fernet.generate_key().decode()
+    env.setdefault("GLUEX_API_KEY", "startup-bench")
+    env.setdefault("GLUEX_PID", "startup-bench")
+    if offline:
+        env["HYPEREVM_RPC_URLS"] = UNREACHABLE_RPC
+    return env
+
+
+def time_import(module, env, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", TIMER.format(module=module)]
+    proc = subprocess.run(cmd, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip()[-2000:]}")
+    seconds = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("IMPORT_SECONDS"):
+            seconds = float(line.split()[1])
+    return seconds, proc.stderr
+
+
+def slowest_imports(stderr, top):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  self_us | cumulative_us | module"
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            rows.append((int(parts[1]), parts[2].strip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--offline", action="store_true", help="point HyperEVM at an unreachable endpoint")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports (python -X importtime)")
+    args = parser.parse_args()
+
+    env = bench_env(args.offline)
+    for module in args.targets:
+        try:
+            samples = [time_import(module, env)[0] for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(e)
+            continue
+        print(
+            f"{module}: min {min(samples) * 1000:.0f} ms | median {statistics.median(samples) * 1000:.0f} ms | "
+            f"max {max(samples) * 1000:.0f} ms ({args.runs} runs{', offline' if args.offline else ''})"
+        )
+        if args.top:
+            _, stderr = time_import(module, env, importtime=True)
+            for cumulative_us, name in slowest_imports(stderr, args.top):
+                print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
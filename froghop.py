@@ -4,20 +4,32 @@ from datetime import datetime
 import sqlite3
 from modules.token_map import TOKEN_MAP
 import modules.hyperlend as hyperlend
-import modules.hypurrfi as hypurrfi
 from web3 import Web3
 import os
 from eth_account import Account
-from web3.exceptions import ContractLogicError, Web3RPCError
+from web3.exceptions import Web3RPCError
 from modules.gluex import get_swap_quote, execute_swap, gluex_get_exchange_rates
-from modules.loopedhype import convert_to_loop_hype
+from modules.loopedhype import convert_to_loop_hype, CCD_ADDRESS, CCD_ABI
 from modules.wallet_manager import WalletDatabase, WalletManager
 from modules.balance_manager import get_token_symbol
+from modules.rpc_manager import get_w3
+from modules.multicall import multicall, native_balance_call
+from modules.token_metadata import token_decimals, prewarm as prewarm_tokens
+from modules.snapshot import snapshot
+from modules import rate_limiter
+from modules import allowance_cache
+from modules import health
+from modules import pool_indexer
+from modules.lending_protocols import PROTOCOLS, ACTIONS as LENDING_ACTIONS, get_protocol, protocols
+from modules.lazy import lazy
+from modules.instrumentation import tagged, dump_metrics
+from modules.receipt_tracker import wait_for_receipt
+from modules.simulation import call_tx, simulate_sequence, first_failure
 
 db = WalletDatabase()
 wallet_manager = WalletManager(db)
 
-web3 = Web3(Web3.HTTPProvider('https://hyperliquid.drpc.org'))
+web3 = lazy(get_w3)
 NATIVE_ADDRESS = '0x2222222222222222222222222222222222222222'
 LOOPED_APY = 0.1  # Assumed % for looped HYPE
 SAFETY_FACTOR = 0.8
@@ -27,6 +39,7 @@ GAS_MIN = 0.05
 GAS_TARGET = 0.1
 LOG_FILE = 'actions_log.json'
 MAX_UINT256 = 2**256 - 1
+ACTION_RECEIPT_TIMEOUT = 120
 ERC20_ABI = [
     {"constant": True, "inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}], "type": "function"},
     {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"},
@@ -50,6 +63,26 @@ def append_log(action_dict):
     with open(LOG_FILE, 'w') as f:
         json.dump(logs, f, indent=4)
 
+def tx_hash_of(result):
+    """Transaction hash in an action result (hex string or GlueX result dict), else None."""
+    if isinstance(result, dict):
+        result = result.get('txHash')
+    if not isinstance(result, (str, bytes)):
+        return None
+    tx_hash = hyperlend.normalize_txhash(result)
+    try:
+        int(tx_hash, 16)
+    except ValueError:
+        return None
+    return tx_hash if len(tx_hash) == 66 else None
+
+def wait_for_action(result, timeout=ACTION_RECEIPT_TIMEOUT, sender=None):
+    """Block until the action's transaction is mined; earlier ones from the wallet are too (nonce order)."""
+    tx_hash = tx_hash_of(result)
+    if tx_hash is None:
+        return None
+    return wait_for_receipt(tx_hash, timeout=timeout, sender=sender)
+
 def get_address(private_key):
     return Account.from_key(private_key).address
 
@@ -76,84 +109,127 @@ def safe_call(func, max_retries=3):
             if attempt == max_retries - 1:
                 print(f"Failed after {max_retries} attempts: {e}")
                 return None
-            time.sleep(2 ** attempt)  # Exponential backoff
+            # 429s already paused the shared bucket, the retry waits for a token there
+            if not rate_limiter.is_rate_limited(e):
+                time.sleep(2 ** attempt)
     return None
 
-def fetch_all_data(private_key):
+def prefetch_positions(addresses):
+    """Lending positions of many wallets on every protocol in a handful of chunked multicalls."""
+    snaps = {p.name: p.snapshot_users(addresses) for p in protocols()}
+    return {addr: {name: users.get(addr) for name, users in snaps.items()} for addr in addresses}
+
+# {address: (positions per protocol, read at)}; kept between cycles, re-read when the pool indexer
+# saw an event for the wallet or the entry is older than FULL_RESCAN_INTERVAL (interest accrual)
+_position_cache = {}
+FULL_RESCAN_INTERVAL = float(os.getenv("FULL_RESCAN_INTERVAL", str(15 * 60)))
+
+def refresh_positions(addresses):
+    """prefetch_positions() restricted to the wallets whose positions changed since their last read."""
+    try:
+        changed = pool_indexer.sync(addresses)
+    except Exception as e:
+        print(f"Pool indexer sync failed, rescanning every wallet: {e}")
+        changed = set(addresses)
+    now = time.time()
+    stale = {a for a in addresses if a not in _position_cache or now - _position_cache[a][1] > FULL_RESCAN_INTERVAL}
+    rescan = [a for a in addresses if a in changed or a in stale]
+    if rescan:
+        fresh = prefetch_positions(rescan)
+        complete = [a for a, snap in fresh.items() if all(v is not None for v in snap.values())]
+        for a in complete:
+            _position_cache[a] = (fresh[a], now)
+        pool_indexer.mark_clean(complete)
+        for a in rescan:
+            if a not in complete:
+                _position_cache.pop(a, None)
+    return {a: _position_cache[a][0] for a in addresses if a in _position_cache}
+
+@tagged()
+def fetch_all_data(private_key, prefetched=None):
     if not check_network():
         raise Exception("Network connection failed")
     address = get_address(private_key)
-    lend_markets = hyperlend.fetch_all_markets_combined()
-    fi_reserves = hypurrfi.fetch_reserves()
-    lend_positions = hyperlend.get_user_positions(private_key, include_wallet_balances=True, include_allowances=False)
-    fi_portfolio = hypurrfi.get_full_user_portfolio(address)
-    lend_account = lend_positions['account']
-    fi_account = hypurrfi.get_user_account_data(address)
-    # Filter tokens to only those in TOKEN_MAP
-    token_addresses = set(TOKEN_MAP.values())
-    filtered_lend_markets = {addr: data for addr, data in lend_markets.items() if addr in token_addresses}
-    filtered_fi_reserves = [res for res in fi_reserves if res['asset'] in token_addresses]
-    
-    asset_data = {}
-    for addr, data in filtered_lend_markets.items():
-        asset_data[addr] = {
-            'symbol': data['symbol'],
-            'decimals': data['decimals'],
-            'lend_supply_apy': data['liquidityRatePct'],
-            'lend_borrow_apy': data['variableBorrowRatePct'],
-            'ltv': data['baseLTVasCollateral'] / 10000,
-            'collateral_enabled': data['usageAsCollateralEnabled'],
-            'borrow_enabled': data['borrowingEnabled'],
-            'liq_threshold': data.get('liquidationThreshold', data['baseLTVasCollateral'] / 10000 + 0.1)
-        }
-    for res in filtered_fi_reserves:
-        addr = res['asset']
-        if addr not in asset_data:
-            asset_data[addr] = {'symbol': res['symbol'], 'decimals': res['decimals']}
-        asset_data[addr]['fi_supply_apy'] = res['liquidity_rate_%']
-        asset_data[addr]['fi_borrow_apy'] = res['variable_borrow_rate_%']
-        asset_data[addr]['fi_ltv'] = 0.6
-        asset_data[addr]['fi_liq_threshold'] = 0.8
-        asset_data[addr]['fi_collateral_enabled'] = True
-        asset_data[addr]['fi_borrow_enabled'] = True
-
-    prices = {}
-    for addr in asset_data:
-        try:
-            prices[addr] = gluex_get_exchange_rates(addr)
-        except Exception:
-            prices[addr] = 1.0  # Fallback for stables or errors
-    prices[NATIVE_ADDRESS] = prices.get(TOKEN_MAP.get('WHYPE', next(iter(prices), None)), 1.0)
+    # every on-chain read below is pinned to one block and shares the snapshot cache
+    with snapshot(w3=web3) as snap:
+        # a protocol whose markets cannot be read from any source is left out of this round's planning
+        markets = {}
+        for p in protocols():
+            try:
+                markets[p.name] = p.snapshot_markets()
+            except Exception as e:
+                print(f"{p.label} markets unavailable, skipping it for new strategies: {e}")
+                markets[p.name] = {}
+        # positions from a prefetch_positions() scan when available, otherwise read for this wallet
+        positions = dict(prefetched or {})
+        for p in protocols():
+            if positions.get(p.name) is None:
+                positions[p.name] = p.snapshot_users([address]).get(address)
+            if positions[p.name] is None:
+                raise RuntimeError(f"{p.label} positions unavailable for {address}")
+        # local account states for health projections (reserve configs + oracle prices)
+        health_states = {}
+        for p in protocols():
+            if not markets[p.name]:
+                continue
+            try:
+                health_states[p.name] = health.positions_state(positions[p.name]['positions'], markets[p.name])
+            except Exception as e:
+                print(f"{p.label} health projection unavailable, using static estimates: {e}")
+        # Filter tokens to only those in TOKEN_MAP
+        token_addresses = set(TOKEN_MAP.values())
+        asset_data = {}
+        for p in protocols():
+            for addr, r in markets[p.name].items():
+                if addr not in token_addresses:
+                    continue
+                d = asset_data.setdefault(addr, {'symbol': r.symbol, 'decimals': r.decimals})
+                d[p.name + '_supply_apy'] = r.supply_rate_pct
+                d[p.name + '_borrow_apy'] = r.borrow_rate_pct
+                d[p.name + '_ltv'] = r.ltv / 10000
+                d[p.name + '_liq_threshold'] = r.liquidation_threshold / 10000
+                d[p.name + '_collateral_enabled'] = r.collateral_enabled and r.ltv > 0
+                d[p.name + '_borrow_enabled'] = r.borrowing_enabled and r.is_active and not r.is_frozen
 
-    balances = {}
-    for symbol, addr in TOKEN_MAP.items():
-        try:
+        prices = {}
+        for addr in asset_data:
+            try:
+                prices[addr] = gluex_get_exchange_rates(addr)
+            except Exception:
+                prices[addr] = 1.0  # Fallback for stables or errors
+        prices[NATIVE_ADDRESS] = prices.get(TOKEN_MAP.get('WHYPE', next(iter(prices), None)), 1.0)
+
+        # wallet balances for every TOKEN_MAP entry in one multicall, decimals from the token store
+        balances = {}
+        calls = []
+        for symbol, addr in TOKEN_MAP.items():
             if addr == NATIVE_ADDRESS:
-                balances[symbol] = safe_call(lambda: web3.eth.get_balance(address) / 10**18) or 0
+                calls.append(native_balance_call(address, web3))
             else:
-                try:
-                    contract = web3.eth.contract(address=Web3.to_checksum_address(addr), abi=ERC20_ABI)
-                    dec = safe_call(contract.functions.decimals().call) or 18
-                    balances[symbol] = safe_call(lambda: contract.functions.balanceOf(address).call() / 10**dec) or 0
-                except ContractLogicError as e:
-                    print(f"Error fetching balance for {symbol}: {e}")
-                    balances[symbol] = 0
-                except Exception as e:
-                    print(f"Unexpected error for {symbol}: {e}")
-                    balances[symbol] = 0
-        except Exception as e:
-            print(f"Error processing {symbol}: {e}")
-            balances[symbol] = 0
-    return {
-        'address': address,
-        'asset_data': asset_data,
-        'prices': prices,
-        'balances': balances,
-        'lend_positions': lend_positions,
-        'fi_portfolio': fi_portfolio,
-        'lend_health': lend_account['healthFactorRaw'] / 10**18 if 'healthFactorRaw' in lend_account else fi_account['health_factor'],
-        'fi_health': fi_account['health_factor']
-    }
+                calls.append((ERC20(addr), 'balanceOf', [address]))
+        out = multicall(calls, w3=web3)
+        for (symbol, addr), raw in zip(TOKEN_MAP.items(), out):
+            # a dropped read is retried on its own; it never counts as an empty balance
+            if raw is None:
+                if addr == NATIVE_ADDRESS:
+                    raw = safe_call(lambda: snap.get_balance(address))
+                else:
+                    raw = safe_call(lambda: snap.read(ERC20(addr).functions.balanceOf(address)))
+            if raw is None:
+                raise RuntimeError(f"{symbol} balance unavailable for {address}")
+            balances[symbol] = raw / 10**(18 if addr == NATIVE_ADDRESS else token_decimals(addr))
+        return {
+            'address': address,
+            'asset_data': asset_data,
+            'prices': prices,
+            'balances': balances,
+            'positions': positions,
+            'health_factors': {
+                name: user['account'].health_factor if user['account'] is not None else None
+                for name, user in positions.items()
+            },
+            'health': health_states
+        }
 
 def classify_groups(asset_data):
     hype_symbols = ['HYPE', 'WHYPE', 'wstHYPE', 'kHYPE', 'LHYPE']
@@ -167,11 +243,13 @@ def classify_groups(asset_data):
     gas_priority_hype = ['WHYPE', 'wstHYPE', 'kHYPE', 'LHYPE']
     return groups, [TOKEN_MAP[s] for s in gas_priority_hype if s in TOKEN_MAP]
 
+def _position(data, protocol, addr):
+    """Position of the wallet on `addr` in `protocol` ("lend", "fi"), or None."""
+    return data['positions'][protocol]['positions'].get(addr)
+
 def calculate_current_apy(group, data):
     prices = data['prices']
     balances = data['balances']
-    lend_pos = data['lend_positions']['positions']
-    fi_pos = {t['symbol']: t for t in data['fi_portfolio']['tokens']}
     equity = 0
     net_yield = 0
     for addr in group:
@@ -179,46 +257,61 @@ def calculate_current_apy(group, data):
         price = prices.get(addr, 1.0)
         wallet_val = balances.get(symbol, 0) * price
         equity += wallet_val
-        if addr in lend_pos:
-            pos = lend_pos[addr]
-            sup_val = pos['supplied'] * price
-            debt_val = pos['variableDebt'] * price
-            equity += sup_val - debt_val
-            net_yield += (pos['market_liquidityRatePct'] / 100 * sup_val) - (pos['market_variableBorrowRatePct'] / 100 * debt_val)
-        if symbol in fi_pos:
-            pos = fi_pos[symbol]
-            sup_val = float(pos['supplied']) * price
-            debt_val = float(pos['borrowed']) * price
+        for p in protocols():
+            pos = _position(data, p.name, addr)
+            if pos is None:
+                continue
+            sup_val = pos.supplied_amount * price
+            debt_val = pos.debt_amount * price
             equity += sup_val - debt_val
-            s_apy = data['asset_data'][addr].get('fi_supply_apy', 0) / 100
-            b_apy = data['asset_data'][addr].get('fi_borrow_apy', 0) / 100
+            s_apy = data['asset_data'][addr].get(p.name + '_supply_apy', 0) / 100
+            b_apy = data['asset_data'][addr].get(p.name + '_borrow_apy', 0) / 100
             net_yield += s_apy * sup_val - b_apy * debt_val
     apy = (net_yield / equity * 100) if equity > 0 else 0
     return apy, equity
 
-def calculate_potential_strategies(group, data, is_hype=False):
+def project_strategy_health(strategies, group, data, equity):
+    """Health factor of each leveraged strategy, projected over the lending actions it would generate."""
+    for protocol in PROTOCOLS:
+        state = data.get('health', {}).get(protocol)
+        candidates = [s for s in strategies if s['protocol'] == protocol]
+        if state is None or not candidates:
+            continue
+        sequences = [
+            [a for a in generate_actions(group, s, data, equity or 1.0) if a.get('protocol') == protocol]
+            for s in candidates
+        ]
+        try:
+            projections = health.project_many(state, sequences)
+        except Exception as e:
+            print(f"{protocol} health projection unavailable, using static estimates: {e}")
+            continue
+        for s, projection in zip(candidates, projections):
+            s['health'] = projection['health_factor']
+
+def calculate_potential_strategies(group, data, is_hype=False, equity=0):
     strategies = []
-    for protocol in ['lend', 'fi']:
+    for protocol in PROTOCOLS:
         for addr in group:
-            if protocol == 'lend':
-                s_apy = data['asset_data'][addr].get('lend_supply_apy', 0)
-            else:
-                s_apy = data['asset_data'][addr].get('fi_supply_apy', 0)
+            s_apy = data['asset_data'][addr].get(protocol + '_supply_apy', 0)
             strategies.append({'type': 'unleveraged', 'protocol': protocol, 'supply_asset': addr, 'borrow_asset': None, 'apy': s_apy, 'health': float('inf')})
-    for protocol in ['lend', 'fi']:
+    leveraged = []
+    for protocol in PROTOCOLS:
         for s_addr in group:
             for b_addr in group:
                 if data['asset_data'][s_addr].get(protocol + '_collateral_enabled', False) and data['asset_data'][b_addr].get(protocol + '_borrow_enabled', False):
-                    ltv = data['asset_data'][s_addr].get(protocol + '_ltv' if protocol=='fi' else 'ltv', 0)
+                    ltv = data['asset_data'][s_addr].get(protocol + '_ltv', 0)
                     eff_ltv = SAFETY_FACTOR * ltv
-                    liq_th = data['asset_data'][s_addr].get(protocol + '_liq_threshold' if protocol=='fi' else 'liq_threshold', 0)
+                    liq_th = data['asset_data'][s_addr].get(protocol + '_liq_threshold', 0)
                     s_apy = data['asset_data'][s_addr].get(protocol + '_supply_apy', 0)
                     b_apy = data['asset_data'][b_addr].get(protocol + '_borrow_apy', 0)
                     if eff_ltv > 0:
                         lev_apy = max(0, (s_apy - b_apy * eff_ltv) / (1 - eff_ltv))
-                        est_health = liq_th / eff_ltv if eff_ltv > 0 else float('inf')
-                        if est_health >= MIN_HEALTH:
-                            strategies.append({'type': 'leveraged', 'protocol': protocol, 'supply_asset': s_addr, 'borrow_asset': b_addr, 'apy': lev_apy, 'health': est_health})
+                        # static estimate, replaced by the projection when account states are available
+                        est_health = liq_th / eff_ltv
+                        leveraged.append({'type': 'leveraged', 'protocol': protocol, 'supply_asset': s_addr, 'borrow_asset': b_addr, 'apy': lev_apy, 'health': est_health})
+    project_strategy_health(leveraged, group, data, equity)
+    strategies.extend(s for s in leveraged if s['health'] >= MIN_HEALTH)
     strategies.append({'type': 'hold', 'protocol': None, 'supply_asset': None, 'borrow_asset': None, 'apy': 0, 'health': float('inf')})
     if is_hype:
         strategies.append({'type': 'looped', 'protocol': None, 'supply_asset': NATIVE_ADDRESS, 'borrow_asset': None, 'apy': LOOPED_APY, 'health': float('inf')})
@@ -228,30 +321,16 @@ def calculate_potential_strategies(group, data, is_hype=False):
 def generate_actions(group, best_strategy, data, equity):
     actions = []
     withdrawn_amounts = {}
-    for protocol in ['lend', 'fi']:
-        if protocol == 'lend':
-            pos = data['lend_positions']['positions']
-            for addr in group:
-                if addr in pos:
-                    p = pos[addr]
-                    if p['variableDebt_raw'] > 0:
-                        actions.append({'type': 'repay', 'protocol': 'lend', 'asset': addr, 'amount': None})
-                    if p['supplied_raw'] > 0:
-                        amount_wei = int(p['supplied_raw'])
-                        actions.append({'type': 'withdraw', 'protocol': 'lend', 'asset': addr, 'amount': None})
-                        withdrawn_amounts[addr] = amount_wei
-        else:
-            fi_pos = {t['symbol']: t for t in data['fi_portfolio']['tokens']}
-            for addr in group:
-                symbol = data['asset_data'][addr]['symbol']
-                if symbol in fi_pos:
-                    p = fi_pos[symbol]
-                    if float(p['raw_borrowed']) > 0:
-                        actions.append({'type': 'repay', 'protocol': 'fi', 'asset': addr, 'amount': None})
-                    if float(p['raw_supplied']) > 0:
-                        amount_wei = int(float(p['raw_supplied']))
-                        actions.append({'type': 'withdraw', 'protocol': 'fi', 'asset': addr, 'amount': None})
-                        withdrawn_amounts[addr] = amount_wei
+    for protocol in PROTOCOLS:
+        for addr in group:
+            p = _position(data, protocol, addr)
+            if p is None:
+                continue
+            if p.debt > 0:
+                actions.append({'type': 'repay', 'protocol': protocol, 'asset': addr, 'amount': None})
+            if p.supplied > 0:
+                actions.append({'type': 'withdraw', 'protocol': protocol, 'asset': addr, 'amount': None})
+                withdrawn_amounts[addr] = withdrawn_amounts.get(addr, 0) + p.supplied
     target_asset = best_strategy['supply_asset'] if best_strategy['type'] != 'hold' else None
     if best_strategy['type'] == 'looped':
         target_asset = NATIVE_ADDRESS
@@ -270,7 +349,7 @@ def generate_actions(group, best_strategy, data, equity):
             actions.append({'type': 'supply', 'protocol': best_strategy['protocol'], 'asset': target_asset, 'amount': total_wei})
         if best_strategy['type'] == 'leveraged':
             borrow_asset = best_strategy['borrow_asset']
-            eff_ltv = SAFETY_FACTOR * data['asset_data'][target_asset].get(best_strategy['protocol'] + '_ltv' if best_strategy['protocol']=='fi' else 'ltv', 0)
+            eff_ltv = SAFETY_FACTOR * data['asset_data'][target_asset].get(best_strategy['protocol'] + '_ltv', 0)
             for _ in range(2):
                 supply_value_usd = (total_wei / 10**data['asset_data'][target_asset]['decimals']) * data['prices'].get(target_asset, 1.0)
                 borrow_value_usd = supply_value_usd * eff_ltv / 2  # Adjusted to 2 for safer leverage
@@ -306,8 +385,74 @@ def manage_gas(private_key, data, gas_priority):
             break
     return actions
 
-def make_decision(private_key, yield_hype, yield_stables):
-    data = fetch_all_data(private_key)
+def _repay_debt_wei(act, data):
+    pos = _position(data, act['protocol'], act['asset'])
+    return pos.variable_debt if pos is not None else 0
+
+def plan_steps(address, act, data):
+    """Unsigned transactions for one action as [(label, tx)], or None when it cannot be prepared upfront."""
+    t = act['type']
+    if t in LENDING_ACTIONS:
+        asset = Web3.to_checksum_address(act['asset'])
+        if asset == NATIVE_ADDRESS:
+            return None
+        if t == 'repay':
+            symbol = data['asset_data'][asset]['symbol']
+            wallet_wei = int(data['balances'].get(symbol, 0) * 10**data['asset_data'][asset]['decimals'])
+            if wallet_wei < _repay_debt_wei(act, data):
+                return None  # execute() swaps into the asset first
+        return get_protocol(act['protocol']).prepare_tx(act, address)
+    if t == 'swap':
+        result = get_swap_quote(act['from'], act['to'], act['amount'], address).get('result')
+        if not result:
+            return None
+        router = Web3.to_checksum_address(result['router'])
+        steps = []
+        if not result.get('isNativeTokenInput', False):
+            token = Web3.to_checksum_address(result['inputToken'])
+            steps.append(("approve for swap", call_tx(address, (ERC20(token), 'approve', [router, int(result['inputAmount'])]))))
+        value = int(result.get('value', 0)) if result.get('isNativeTokenInput') else 0
+        steps.append(("swap", {'from': address, 'to': router, 'data': result['calldata'], 'value': value}))
+        return steps
+    if t == 'convert_looped':
+        ccd = web3.eth.contract(address=CCD_ADDRESS, abi=CCD_ABI)
+        return [("convert_looped", call_tx(address, (ccd, 'depositNative', [act['amount'], 0, address, b""]), value=act['amount']))]
+    return None
+
+@tagged()
+def simulate_plan(address, actions, data):
+    """
+    Simulate a whole action plan as one sequence at the pending block before anything is broadcast.
+    Actions run in order up to the first one that cannot be prepared upfront (a swap without a quote,
+    a repay that needs a swap first); the rest is left unverified.
+    """
+    labels, txs = [], []
+    unverified = 0
+    for i, act in enumerate(actions):
+        try:
+            steps = plan_steps(address, act, data)
+        except Exception as e:
+            print(f"Cannot prepare {act['type']} for simulation: {e}")
+            steps = None
+        if steps is None:
+            unverified = len(actions) - i
+            break
+        for label, tx in steps:
+            labels.append(f"#{i + 1} {label}")
+            txs.append(tx)
+    results = simulate_sequence(txs)
+    failed = first_failure(results)
+    return {
+        'ok': failed is None,
+        'failed': labels[failed] if failed is not None else None,
+        'reason': results[failed]['reason'] if failed is not None else None,
+        'simulated': len(txs),
+        'unverified_actions': unverified,
+    }
+
+@tagged()
+def make_decision(private_key, yield_hype, yield_stables, prefetched=None):
+    data = fetch_all_data(private_key, prefetched)
     groups, gas_priority = classify_groups(data['asset_data'])
     decision = {'reasoning': {}, 'actions': []}
     gas_actions = manage_gas(private_key, data, gas_priority)
@@ -318,7 +463,7 @@ def make_decision(private_key, yield_hype, yield_stables):
             continue
         current_apy, equity = calculate_current_apy(group, data)
         is_hype = g_name == 'hype'
-        best_strategy, all_strats = calculate_potential_strategies(group, data, is_hype)
+        best_strategy, all_strats = calculate_potential_strategies(group, data, is_hype, equity)
         best_apy = best_strategy['apy']
         reasoning = {
             'group': g_name,
@@ -326,8 +471,7 @@ def make_decision(private_key, yield_hype, yield_stables):
             'best_apy': best_apy,
             'best_strategy': best_strategy,
             'all_strategies': all_strats,
-            'health_lend': data['lend_health'],
-            'health_fi': data['fi_health'],
+            **{'health_' + name: hf for name, hf in data['health_factors'].items()},
             'worth_switch': best_apy > current_apy + SWITCH_THRESHOLD
         }
         decision['reasoning'][g_name] = reasoning
@@ -345,8 +489,17 @@ def make_decision(private_key, yield_hype, yield_stables):
                     'asset': best_strategy['supply_asset'],
                     'amount': amount_wei
                 })
+    if decision['actions']:
+        sim = simulate_plan(data['address'], decision['actions'], data)
+        decision['simulation'] = sim
+        if not sim['ok']:
+            # a plan that would revert is dropped before anything is broadcast
+            print(f"Plan dropped: {sim['failed']} would revert: {sim['reason']}")
+            decision['dropped_actions'] = decision['actions']
+            decision['actions'] = []
     return decision
 
+@tagged()
 def execute(private_key, actions):
     data = fetch_all_data(private_key)
     groups, gas_priority = classify_groups(data['asset_data'])
@@ -355,29 +508,10 @@ def execute(private_key, actions):
         tx_hash = None
         now = datetime.now().isoformat()
         try:
-            if act['type'] == 'supply':
-                if act['protocol'] == 'lend':
-                    tx_hash = hyperlend.supply_with_approve(private_key, act['asset'], act['amount'], approve_infinite=True)
-                else:
-                    tx_hash = hypurrfi.supply(act['asset'], act['amount'], address, private_key)
-            elif act['type'] == 'withdraw':
-                amount = act['amount'] if act['amount'] is not None else MAX_UINT256
-                if act['protocol'] == 'lend':
-                    tx_hash = hyperlend.withdraw(private_key, act['asset'], amount)
-                else:
-                    tx_hash = hypurrfi.withdraw(act['asset'], amount, address, private_key)
-            elif act['type'] == 'borrow':
-                if act['protocol'] == 'lend':
-                    tx_hash = hyperlend.borrow(private_key, act['asset'], act['amount'])
-                else:
-                    tx_hash = hypurrfi.borrow(act['asset'], act['amount'], address, private_key)
-            elif act['type'] == 'repay':
-                if act['protocol'] == 'lend':
-                    pos = hyperlend.get_user_positions(private_key)['positions'].get(act['asset'], {})
-                    debt = pos.get('variableDebt_raw', 0)
-                else:
-                    pos = hypurrfi.get_user_reserve_data(address, act['asset'])
-                    debt = int(float(pos.get('variable_debt', 0)) * 10**data['asset_data'][act['asset']]['decimals'])
+            if act['type'] == 'repay':
+                protocol = get_protocol(act['protocol'])
+                pos = protocol.position(address, act['asset'])
+                debt = pos.variable_debt if pos is not None else 0
                 wallet_bal = safe_call(lambda: web3.eth.get_balance(address) if act['asset'] == NATIVE_ADDRESS else ERC20(act['asset']).functions.balanceOf(address).call()) or 0
                 if wallet_bal < debt and debt > 0:
                     extra_needed = debt - wallet_bal
@@ -387,11 +521,9 @@ def execute(private_key, actions):
                     quote = get_swap_quote(from_addr, act['asset'], extra_wei + int(extra_wei * 0.01), address)
                     tx_hash = execute_swap(quote['result'], address, private_key)
                     append_log({'timestamp': now, 'type': 'swap_for_repay', 'tx_hash': tx_hash, 'details': {'from': from_addr, 'to': act['asset'], 'amount': extra_wei}})
-                    time.sleep(10)
-                if act['protocol'] == 'lend':
-                    tx_hash = hyperlend.repay_with_approve(private_key, act['asset'], debt, approve_infinite=True)
-                else:
-                    tx_hash = hypurrfi.repay(act['asset'], debt, address, private_key)
+                tx_hash = protocol.send(private_key, {**act, 'amount': debt})
+            elif act['type'] in LENDING_ACTIONS:
+                tx_hash = get_protocol(act['protocol']).send(private_key, act)
             elif act['type'] == 'swap':
                 quote = get_swap_quote(act['from'], act['to'], act['amount'], address)
                 tx_hash = execute_swap(quote['result'], address, private_key)
@@ -399,14 +531,14 @@ def execute(private_key, actions):
                 tx_hash = convert_to_loop_hype(private_key, act['amount'])
             if tx_hash:
                 append_log({'timestamp': now, 'type': act['type'], 'tx_hash': tx_hash, 'details': act})
+            # re-read state only once the action is mined (swaps already return after their receipt)
+            wait_for_action(tx_hash, sender=address)
             data = fetch_all_data(private_key)
             gas_actions = manage_gas(private_key, data, gas_priority)
             for g_act in gas_actions:
                 quote = get_swap_quote(g_act['from'], g_act['to'], g_act['amount'], address)
                 g_tx = execute_swap(quote['result'], address, private_key)
                 append_log({'timestamp': now, 'type': 'gas_swap', 'tx_hash': g_tx, 'details': g_act})
-                time.sleep(10)
-            time.sleep(10)
         except Exception as e:
             print(f"Error executing {act['type']}: {e}")
             append_log({'timestamp': now, 'type': 'error', 'details': act, 'error': str(e)})
@@ -429,17 +561,41 @@ def store_decision(user_id, decision):
     conn.commit()
     conn.close()
 
+@tagged()
 def process_all_users():
+    # low-frequency on-chain re-check of cached allowances (at most once per SWEEP_INTERVAL)
+    allowance_cache.maybe_sweep()
     users = get_users()
+    active = []
     for user_id, yield_hype, yield_stables in users:
         if not yield_hype and not yield_stables:
             continue
         private_key, pubkey = wallet_manager.get_evm_wallet(user_id)
-        decision = make_decision(private_key, yield_hype, yield_stables)
+        active.append((user_id, yield_hype, yield_stables, private_key))
+    # every active wallet's positions in one bulk scan, limited to the wallets the pool indexer saw move
+    positions = {}
+    if active:
+        try:
+            positions = refresh_positions([get_address(pk) for _, _, _, pk in active])
+        except Exception as e:
+            print(f"Bulk position scan failed, reading per user: {e}")
+    for user_id, yield_hype, yield_stables, private_key in active:
+        try:
+            decision = make_decision(private_key, yield_hype, yield_stables, positions.get(get_address(private_key)))
+        except Exception as e:
+            # one wallet's unreadable state must not stop the round for the others
+            print(f"Skipping user {user_id} this round: {e}")
+            continue
         store_decision(user_id, decision)
+        if decision['actions']:
+            # re-read next cycle even if the indexer has not reached these transactions yet
+            _position_cache.pop(get_address(private_key), None)
         execute(private_key, decision['actions'])
+    print(rate_limiter.format_stats())
+    print(dump_metrics())
 
 if __name__ == "__main__":
+    prewarm_tokens()
     # For testing with one user_id
     test_user_id = ""  # Replace with actual user_id for testing
     execute_flag = False  # Set to True to execute actions during testing; False to only compute and print/store decisions
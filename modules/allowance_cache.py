@@ -0,0 +1,308 @@
+"""
+Persistent ERC20 allowance cache keyed by (owner, token, spender).
+- filled from our own approvals (recorded as pending when broadcast, confirmed from the receipt's
+  Approval logs) and from on-chain reads the position fetchers already make
+- trusted while the cached allowance covers the amount needed, so an infinite approval is
+  read from the node once instead of before every supply, repay and swap
+- finite allowances are debited locally as they are spent (infinite ones are left alone, as
+  the tokens themselves do)
+- a failed transaction invalidates the entry; sweep() re-reads entries older than
+  SWEEP_INTERVAL in one multicall
+
+    if not allowance_cache.covers(owner, token, spender, amount):
+        ...approve...
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from eth_utils import to_checksum_address, keccak
+
+from modules.rpc_manager import get_w3
+from modules.multicall import multicall
+from modules.lazy import load_abi
+from modules.receipt_tracker import track
+
+
+DB_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "allowances.db")
+)
+SWEEP_INTERVAL = 6 * 3600      # seconds between on-chain re-checks of a cached entry
+INFINITE = 2 ** 255            # at or above this an allowance is not debited by transfers
+APPROVAL_TOPIC = "0x" + keccak(text="Approval(address,address,uint256)").hex()
+
+logger = logging.getLogger(__name__)
+
+
+def pair_key(owner, token, spender):
+    return (owner.lower(), token.lower(), spender.lower())
+
+
+def _hex(value):
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value).hex()
+    value = str(value).lower()
+    return value if value.startswith("0x") else "0x" + value
+
+
+def _topic_address(topic):
+    return "0x" + _hex(topic)[-40:]
+
+
+def approval_rows(logs):
+    """Approval(owner, spender, value) events in `logs` -> [(owner, token, spender, value)], lowercase."""
+    rows = []
+    for log in logs or []:
+        topics = log.get("topics") or []
+        if len(topics) != 3 or _hex(topics[0]) != APPROVAL_TOPIC:
+            continue
+        data = _hex(log.get("data") or "0x")
+        rows.append((_topic_address(topics[1]), _hex(log["address"]), _topic_address(topics[2]), int(data, 16) if data != "0x" else 0))
+    return rows
+
+
+class AllowanceCache:
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # amounts are stored as decimal text: uint256 does not fit an SQLite integer
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS allowances (
+                owner TEXT,
+                token TEXT,
+                spender TEXT,
+                amount TEXT,
+                source TEXT,
+                updated_at REAL,
+                PRIMARY KEY (owner, token, spender)
+            )
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.last_sweep = 0.0
+
+    # -- SQLite --
+
+    def get(self, owner, token, spender):
+        """Cached allowance, or None when the pair is unknown."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT amount FROM allowances WHERE owner = ? AND token = ? AND spender = ?",
+                pair_key(owner, token, spender),
+            ).fetchone()
+        return int(row[0]) if row is not None else None
+
+    def get_many(self, keys):
+        """{(owner, token, spender): amount} for the cached ones among `keys` (lowercase tuples)."""
+        out = {}
+        with self._lock:
+            for key in keys:
+                row = self.conn.execute(
+                    "SELECT amount FROM allowances WHERE owner = ? AND token = ? AND spender = ?", key
+                ).fetchone()
+                if row is not None:
+                    out[key] = int(row[0])
+        return out
+
+    def put_many(self, rows, source):
+        """rows: [(owner, token, spender, amount)]."""
+        if not rows:
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO allowances (owner, token, spender, amount, source, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*pair_key(o, t, s), str(int(a)), source, now) for o, t, s, a in rows],
+            )
+            self.conn.commit()
+
+    def put(self, owner, token, spender, amount, source="chain"):
+        self.put_many([(owner, token, spender, amount)], source)
+
+    def invalidate(self, owner, token, spender):
+        """Forget a pair; the next covers() reads it from the node."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM allowances WHERE owner = ? AND token = ? AND spender = ?", pair_key(owner, token, spender)
+            )
+            self.conn.commit()
+
+    # -- lookups --
+
+    def covers(self, owner, token, spender, needed):
+        """True when the cached allowance is at least `needed`; never reads the chain."""
+        cached = self.get(owner, token, spender)
+        if cached is not None and cached >= int(needed):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def read(self, owner, token, spender):
+        """Allowance from the node, stored in the cache."""
+        token_contract = get_w3().eth.contract(address=to_checksum_address(token), abi=load_abi("erc20_abi.json"))
+        amount = token_contract.functions.allowance(to_checksum_address(owner), to_checksum_address(spender)).call()
+        self.put(owner, token, spender, amount)
+        return amount
+
+    def allowance(self, owner, token, spender, needed):
+        """Cached allowance when it covers `needed`, otherwise the on-chain value (cached)."""
+        if self.covers(owner, token, spender, needed):
+            return self.get(owner, token, spender)
+        return self.read(owner, token, spender)
+
+    # -- updates --
+
+    def consume(self, owner, token, spender, amount):
+        """`spender` pulled `amount` with transferFrom: debit a finite cached allowance."""
+        key = pair_key(owner, token, spender)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT amount FROM allowances WHERE owner = ? AND token = ? AND spender = ?", key
+            ).fetchone()
+            if row is None or int(row[0]) >= INFINITE:
+                return
+            self.conn.execute(
+                "UPDATE allowances SET amount = ?, updated_at = ? WHERE owner = ? AND token = ? AND spender = ?",
+                (str(max(int(row[0]) - int(amount), 0)), time.time(), *key),
+            )
+            self.conn.commit()
+
+    def ingest_logs(self, logs):
+        """Record every Approval(owner, spender, value) event in `logs` (receipt or eth_getLogs)."""
+        rows = approval_rows(logs)
+        self.put_many(rows, "log")
+        return len(rows)
+
+    def _settle(self, owner, token, spender, approved, logged):
+        """
+        Our pending approval of `approved` was mined with Approval value `logged` (None: reverted or
+        no event). Untouched, the entry is confirmed (or dropped); once consume() debited it, the
+        lower of the cached and logged amounts is kept.
+        """
+        key = pair_key(owner, token, spender)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT amount, source FROM allowances WHERE owner = ? AND token = ? AND spender = ?", key
+            ).fetchone()
+            if row is None:
+                return
+            if logged is None:
+                self.conn.execute("DELETE FROM allowances WHERE owner = ? AND token = ? AND spender = ?", key)
+            else:
+                cached = int(row[0])
+                amount = logged if row[1] == "pending" and cached == int(approved) else min(cached, logged)
+                self.conn.execute(
+                    "UPDATE allowances SET amount = ?, source = ?, updated_at = ? WHERE owner = ? AND token = ? AND spender = ?",
+                    (str(amount), "log", time.time(), *key),
+                )
+            self.conn.commit()
+
+    def record_approval(self, owner, token, spender, amount, tx_hash):
+        """
+        Our approval was broadcast: trust it right away (the transactions it enables are sent
+        behind it in nonce order), then confirm from the receipt or drop it if it reverted.
+        Amounts consume() debited in the meantime are not given back.
+        """
+        self.put(owner, token, spender, amount, "pending")
+
+        def confirm(future):
+            try:
+                receipt = future.result()
+            except Exception as e:
+                logger.warning(f"approval {_hex(tx_hash)} not confirmed, dropping cached allowance: {e}")
+                self.invalidate(owner, token, spender)
+                return
+            logged = None
+            if receipt["status"] == 1:
+                key = pair_key(owner, token, spender)
+                for o, t, sp, value in approval_rows(receipt.get("logs")):
+                    if (o, t, sp) == key:
+                        logged = value
+            self._settle(owner, token, spender, amount, logged)
+
+        track(tx_hash, callback=confirm, sender=owner)
+
+    def sweep(self, max_age=SWEEP_INTERVAL):
+        """Re-read every entry older than `max_age` seconds in one multicall; returns the count."""
+        cutoff = time.time() - max_age
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT owner, token, spender FROM allowances WHERE updated_at < ?", (cutoff,)
+            ).fetchall()
+        self.last_sweep = time.time()
+        if not rows:
+            return 0
+        w3 = get_w3()
+        abi = load_abi("erc20_abi.json")
+        calls = [
+            (w3.eth.contract(address=to_checksum_address(t), abi=abi), "allowance", [to_checksum_address(o), to_checksum_address(s)])
+            for o, t, s in rows
+        ]
+        out = multicall(calls, w3=w3)
+        fresh = [(o, t, s, amount) for (o, t, s), amount in zip(rows, out) if amount is not None]
+        self.put_many(fresh, "sweep")
+        for o, t, s in (r for r, amount in zip(rows, out) if amount is None):
+            self.invalidate(o, t, s)
+        return len(rows)
+
+    def maybe_sweep(self):
+        """sweep() at most once per SWEEP_INTERVAL; safe to call from every loop iteration."""
+        if time.time() - self.last_sweep < SWEEP_INTERVAL:
+            return 0
+        try:
+            return self.sweep()
+        except Exception as e:
+            logger.warning(f"allowance sweep failed: {e}")
+            return 0
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM allowances").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "last_sweep": self.last_sweep}
+
+    def close(self):
+        self.conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AllowanceCache()
+    return _cache
+
+
+def covers(owner, token, spender, needed):
+    return get_cache().covers(owner, token, spender, needed)
+
+
+def allowance(owner, token, spender, needed):
+    return get_cache().allowance(owner, token, spender, needed)
+
+
+def record_approval(owner, token, spender, amount, tx_hash):
+    get_cache().record_approval(owner, token, spender, amount, tx_hash)
+
+
+def consume(owner, token, spender, amount):
+    get_cache().consume(owner, token, spender, amount)
+
+
+def invalidate(owner, token, spender):
+    get_cache().invalidate(owner, token, spender)
+
+
+def maybe_sweep():
+    return get_cache().maybe_sweep()
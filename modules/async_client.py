@@ -0,0 +1,200 @@
+"""
+Async HyperEVM client.
+- JSON-RPC over one aiohttp session, routed through the shared endpoint pool (same scoring
+  and failover as the sync transport)
+- a semaphore caps in-flight requests and the shared per-host rate limiter paces them,
+  so hundreds of wallets can be gathered safely
+- contract reads reuse the sync contract objects for encoding only: call() and multicall()
+  take the same (contract, fn_name, args) specs as modules.multicall
+
+    async with AsyncChainClient() as client:
+        results = await gather_wallets(hypurrfi.async_get_user_account_data, wallets, client=client)
+"""
+
+import json
+import time
+import asyncio
+import itertools
+
+import aiohttp
+from eth_utils import to_checksum_address
+
+from modules import rate_limiter, instrumentation
+from modules.rpc_manager import REQUEST_TIMEOUT, get_endpoint_pool
+from modules.multicall import (
+    DEFAULT_CHUNK_SIZE, multicall_contract, encode_call, decode_result, encode_chunk, decode_chunk,
+    _function_abi,
+)
+
+
+DEFAULT_CONCURRENCY = 32
+
+_ids = itertools.count(1)
+
+
+def _block_param(block):
+    if isinstance(block, int):
+        return hex(block)
+    return block
+
+
+class RpcError(RuntimeError):
+    """The node answered with a JSON-RPC error (revert, bad params...)."""
+
+
+class AsyncChainClient:
+
+    def __init__(self, pool=None, concurrency=DEFAULT_CONCURRENCY, timeout=REQUEST_TIMEOUT):
+        self.pool = pool or get_endpoint_pool()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._sem = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+    def _ensure_session(self):
+        if self._session is None or self._session.closed:
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _post(self, url, payload):
+        session = self._ensure_session()
+        async with self._sem:
+            await rate_limiter.async_acquire(url)
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as resp:
+                    if resp.status == 429:
+                        rate_limiter.throttled(url, resp.headers)
+                    resp.raise_for_status()
+                    body = await resp.read()
+                out = json.loads(body)
+            except Exception as e:
+                latency = time.perf_counter() - started
+                self.pool.record(url, latency, e)
+                instrumentation.record(url, "POST", payload, latency, error=True)
+                raise
+            latency = time.perf_counter() - started
+            self.pool.record(url, latency)
+            instrumentation.record(url, "POST", payload, latency, len(body), instrumentation.rpc_errors(body))
+            return out
+
+    async def request(self, method, params=None):
+        """One JSON-RPC request, failing over across the pool's ranked endpoints."""
+        payload = {"jsonrpc": "2.0", "id": next(_ids), "method": method, "params": list(params or [])}
+        last_error = None
+        for url in self.pool.ranked():
+            try:
+                response = await self._post(url, payload)
+                break
+            except Exception as e:
+                last_error = e
+        else:
+            raise ConnectionError(f"All HyperEVM endpoints failed: {last_error}")
+        if response.get("error"):
+            err = response["error"]
+            raise RpcError(f"{method} failed: {err.get('message') if isinstance(err, dict) else err}")
+        return response.get("result")
+
+    # -- node calls --
+
+    async def block_number(self):
+        return int(await self.request("eth_blockNumber"), 16)
+
+    async def get_balance(self, address, block="latest"):
+        return int(await self.request("eth_getBalance", [to_checksum_address(address), _block_param(block)]), 16)
+
+    async def eth_call(self, to, data, block="latest"):
+        result = await self.request("eth_call", [{"to": to, "data": data}, _block_param(block)])
+        return bytes.fromhex(result[2:] if result.startswith("0x") else result)
+
+    async def call(self, contract, fn_name, args=None, block="latest"):
+        """Async equivalent of contract.functions.<fn_name>(*args).call()."""
+        target, calldata, outputs = encode_call((contract, fn_name, args))
+        return decode_result(outputs, await self.eth_call(target, calldata, block))
+
+    async def multicall(self, calls, default=None, block="latest", chunk_size=DEFAULT_CHUNK_SIZE):
+        """Async equivalent of modules.multicall.multicall(); chunks are sent concurrently."""
+        calls = list(calls)
+        if not calls:
+            return []
+        chunks = [calls[i:i + chunk_size] for i in range(0, len(calls), chunk_size)]
+        parts = await asyncio.gather(*(self._run_chunk(c, default, block) for c in chunks))
+        return [r for part in parts for r in part]
+
+    async def _run_chunk(self, chunk, default, block):
+        encoded, payload = encode_chunk(chunk)
+        if not payload:
+            return [default] * len(chunk)
+        mc = multicall_contract()
+        try:
+            raw = decode_result(_function_abi(mc, "aggregate3")["outputs"],
+                                await self.eth_call(mc.address, mc.encode_abi("aggregate3", args=[payload]), block))
+        except Exception:
+            # Multicall3 unavailable or the whole batch failed: degrade to one call each
+            single = await asyncio.gather(
+                *(self.call(*c[:2], c[2] if len(c) > 2 else None, block=block)
+                  for c, outputs in zip(chunk, encoded) if outputs is not None),
+                return_exceptions=True,
+            )
+            it = iter(single)
+            out = []
+            for outputs in encoded:
+                value = default if outputs is None else next(it)
+                out.append(default if isinstance(value, BaseException) else value)
+            return out
+        return decode_chunk(encoded, raw, default)
+
+
+class _ClientScope:
+    """`async with client_scope(client) as c:` uses `client`, or a temporary one closed on exit."""
+
+    def __init__(self, client):
+        self.client = client
+        self.own = client is None
+
+    async def __aenter__(self):
+        if self.own:
+            self.client = AsyncChainClient()
+        return self.client
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.own:
+            await self.client.close()
+        return False
+
+
+def client_scope(client=None):
+    return _ClientScope(client)
+
+
+async def gather_wallets(fn, addresses, client=None, **kwargs):
+    """
+    Run `fn(address, client=client, **kwargs)` for every address concurrently.
+    Returns {address: result}; a wallet whose fetch failed maps to its exception.
+    """
+    addresses = list(addresses)
+    async with client_scope(client) as c:
+        results = await asyncio.gather(*(fn(a, client=c, **kwargs) for a in addresses), return_exceptions=True)
+    return dict(zip(addresses, results))
+
+
+def run(coro):
+    """Run a coroutine from sync code (bot handlers, scripts)."""
+    return asyncio.run(coro)
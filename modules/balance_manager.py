@@ -1,8 +1,10 @@
 from typing import Dict, Any, List, Optional
-from web3 import Web3, HTTPProvider
-import requests
+from web3 import Web3
 import os
 from modules.token_map import TOKEN_MAP
+from modules.rpc_manager import get_w3, get_session
+from modules.multicall import multicall, native_balance_call
+from modules.token_metadata import token_decimals, token_symbol, warm_tokens
 
 ERC20_MINI_ABI = [
     {"constant": True, "inputs": [{"name": "_owner", "type": "address"}], "name": "balanceOf",
@@ -11,8 +13,6 @@ ERC20_MINI_ABI = [
     {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"}
 ]
 
-DEFAULT_HYPEREVM_RPC = "https://rpc.hyperliquid.xyz/evm"
-
 DEFAULT_HYPEREVM_TOKENS = []
 for i in TOKEN_MAP:
     DEFAULT_HYPEREVM_TOKENS.append(TOKEN_MAP[i])
@@ -26,41 +26,49 @@ def fetch_hyperevm_balances(wallet_address: str, tokens: Optional[List[str]] = N
 
     results: Dict[str, Any] = {"native": 0, "tokens": {}, "errors": []}
     try:
-        w3 = Web3(HTTPProvider(DEFAULT_HYPEREVM_RPC))
+        w3 = get_w3()
         addr = Web3.to_checksum_address(wallet_address)
     except Exception as e:
         results["errors"].append(f"RPC or address init failed: {e}")
         return results
 
+    contracts = []
+    for t in tokens:
+        if t.lower() == "0x2222222222222222222222222222222222222222" or t.lower() == "0x0000000000000000000000000000000000000000":
+            continue
+        try:
+            contracts.append((t, w3.eth.contract(address=Web3.to_checksum_address(t), abi=ERC20_MINI_ABI)))
+        except Exception as e:
+            results["errors"].append(f"{t} fetch failed: {e}")
+
+    # metadata comes from the token store; native + balanceOf for every token in one eth_call
+    warm_tokens([t for t, _ in contracts])
+    calls = [native_balance_call(addr, w3)] + [(contract, "balanceOf", [addr]) for _, contract in contracts]
+    out = multicall(calls, w3=w3)
+
     try:
-        raw_hype = w3.eth.get_balance(addr)
+        raw_hype = out[0] if out[0] is not None else w3.eth.get_balance(addr)
         hype_balance = raw_hype / 1e18
         if hype_balance > 0:
             results["native"] = hype_balance
     except Exception as e:
         results["errors"].append(f"Native HYPE fetch failed: {e}")
 
-    for t in tokens:
-        if t.lower() == "0x2222222222222222222222222222222222222222" or t.lower() == "0x0000000000000000000000000000000000000000":
+    for (t, _), raw in zip(contracts, out[1:]):
+        if raw is None:
+            results["errors"].append(f"{t} fetch failed: balanceOf reverted")
+            continue
+        if raw == 0:
             continue
         try:
-            contract = w3.eth.contract(address=Web3.to_checksum_address(t), abi=ERC20_MINI_ABI)
-            raw = contract.functions.balanceOf(addr).call()
-            if raw == 0:
-                continue
-            try:
-                decimals = contract.functions.decimals().call()
-            except Exception:
-                decimals = 18
-            try:
-                symbol = contract.functions.symbol().call()
-            except Exception:
-                symbol = t
-            bal = raw / (10 ** decimals)
-            if bal > 0:
-                results["tokens"][symbol] = bal
-        except Exception as e:
-            results["errors"].append(f"{t} fetch failed: {e}")
+            decimals = token_decimals(t)
+        except RuntimeError as e:
+            results["errors"].append(str(e))
+            continue
+        symbol = token_symbol(t, t)
+        bal = raw / (10 ** decimals)
+        if bal > 0:
+            results["tokens"][symbol] = bal
     return results
 
 def fetch_solana_balance(sol_addr: str) -> Dict[str, Any]:
@@ -72,7 +80,7 @@ def fetch_solana_balance(sol_addr: str) -> Dict[str, Any]:
         "params": [sol_addr, {"commitment": "confirmed"}]
     }
     try:
-        r = requests.post(DEFAULT_SOLANA_RPC, json=payload, timeout=10)
+        r = get_session(DEFAULT_SOLANA_RPC).post(DEFAULT_SOLANA_RPC, json=payload, timeout=10)
         r.raise_for_status()
         data = r.json()
     except Exception as e:
@@ -90,55 +98,27 @@ def fetch_solana_balance(sol_addr: str) -> Dict[str, Any]:
     return results
 
 def get_token_decimals(token_address: str) -> int:
-    if token_address.lower() == "0x0000000000000000000000000000000000000000" or token_address.lower() == "0x2222222222222222222222222222222222222222":
-        return 18
-    try:
-        w3 = Web3(HTTPProvider(DEFAULT_HYPEREVM_RPC))
-        contract = w3.eth.contract(address=Web3.to_checksum_address(token_address), abi=ERC20_MINI_ABI)
-        decimals = contract.functions.decimals().call()
-        return decimals
-    except Exception:
-        return 18 
-    
+    return token_decimals(token_address)
+
 def get_token_symbol(token_address: str) -> str:
-    if token_address.lower() == "0x0000000000000000000000000000000000000000" or token_address.lower() == "0x2222222222222222222222222222222222222222":
-        return "HYPE"
-    try:
-        w3 = Web3(HTTPProvider(DEFAULT_HYPEREVM_RPC))
-        contract = w3.eth.contract(address=Web3.to_checksum_address(token_address), abi=ERC20_MINI_ABI)
-        symbol = contract.functions.symbol().call()
-        return str(symbol)
-    except Exception:
-        return str(token_address)
+    return str(token_symbol(token_address, token_address))
 
-def get_token_balance_evm(wallet_address, token_address: str) -> str:
+def get_token_balance_evm(wallet_address, token_address: str) -> Optional[float]:
+    """Token balance in units; 0 for an empty balance, None when it could not be read."""
     try:
-        w3 = Web3(HTTPProvider(DEFAULT_HYPEREVM_RPC))
+        w3 = get_w3()
 
         if token_address.lower() == "0x0000000000000000000000000000000000000000" or token_address.lower() == "0x2222222222222222222222222222222222222222":
-            try:
-                raw_hype = w3.eth.get_balance(wallet_address)
-                hype_balance = raw_hype / 1e18
-                if hype_balance > 0:
-                    return hype_balance
-                else:
-                    return 0
-            except Exception as e:
-                return 0
+            return w3.eth.get_balance(wallet_address) / 1e18
         contract = w3.eth.contract(address=Web3.to_checksum_address(token_address), abi=ERC20_MINI_ABI)
-
-
         raw = contract.functions.balanceOf(wallet_address).call()
         if raw == 0:
             return 0
-        try:
-            decimals = get_token_decimals(token_address)
-        except Exception:
-            decimals = 18
 
-        return raw / (10 ** decimals)
-    except Exception:
-        return 0
+        return raw / (10 ** token_decimals(token_address))
+    except Exception as e:
+        print(f"Balance read failed for {token_address}: {e}")
+        return None
 
 if __name__ == "__main__":
     hype_wallet = ""
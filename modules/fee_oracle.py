@@ -0,0 +1,138 @@
+"""
+Per-block fee oracle shared by every transaction builder.
+- one JSON-RPC batch (latest block, eth_gasPrice, eth_maxPriorityFeePerGas) per block and
+  endpoint; every transaction prepared within FEE_TTL seconds reuses the same quote
+- quoting policies:
+    "legacy"   {"gasPrice"}                                   (node gas price)
+    "eip1559"  {"maxFeePerGas", "maxPriorityFeePerGas"}       (base fee headroom + tip)
+    "auto"     eip1559 when the block has a base fee, legacy otherwise
+
+    tx = fn.build_transaction({"from": addr, "nonce": nonce, **fee_params("eip1559")})
+"""
+
+import time
+import threading
+
+from modules.rpc_batch import rpc_batch
+
+
+FEE_TTL = 1.0                        # seconds a quote is reused (about one HyperEVM block)
+MIN_PRIORITY_FEE = 10 ** 9           # 1 gwei tip floor
+BASE_FEE_HEADROOM = 2                # maxFeePerGas = base fee * headroom + tip
+POLICIES = ("legacy", "eip1559", "auto")
+
+
+class FeeQuote:
+
+    __slots__ = ("block", "base_fee", "gas_price", "priority_fee", "fetched_at")
+
+    def __init__(self, block, base_fee, gas_price, priority_fee, fetched_at):
+        self.block = block
+        self.base_fee = base_fee           # None on chains without EIP-1559
+        self.gas_price = gas_price
+        self.priority_fee = priority_fee
+        self.fetched_at = fetched_at
+
+    def legacy(self):
+        return {"gasPrice": self.gas_price}
+
+    def eip1559(self):
+        if self.base_fee is None:
+            raise RuntimeError(f"block {self.block} has no baseFeePerGas; use the legacy policy")
+        return {
+            "maxPriorityFeePerGas": self.priority_fee,
+            "maxFeePerGas": self.base_fee * BASE_FEE_HEADROOM + self.priority_fee,
+        }
+
+    def params(self, policy="auto"):
+        if policy == "legacy":
+            return self.legacy()
+        if policy == "eip1559":
+            return self.eip1559()
+        if policy == "auto":
+            return self.eip1559() if self.base_fee is not None else self.legacy()
+        raise ValueError(f"unknown fee policy {policy!r} (expected one of {POLICIES})")
+
+    def as_dict(self):
+        return {
+            "block": self.block,
+            "base_fee": self.base_fee,
+            "gas_price": self.gas_price,
+            "priority_fee": self.priority_fee,
+            "age_s": round(time.monotonic() - self.fetched_at, 2),
+        }
+
+
+class FeeOracle:
+
+    def __init__(self, endpoint=None, ttl=FEE_TTL):
+        self.endpoint = endpoint
+        self.ttl = ttl
+        self._quote = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+
+    def _fetch(self):
+        with rpc_batch(self.endpoint) as batch:
+            block_r = batch.get_block("latest")
+            gas_price_r = batch.gas_price()
+            tip_r = batch.max_priority_fee()
+        block = block_r.result()
+        try:
+            suggested = tip_r.result() or 0
+        except Exception:
+            suggested = 0   # node without eth_maxPriorityFeePerGas
+        return FeeQuote(
+            block=block["number"],
+            base_fee=block.get("baseFeePerGas"),
+            gas_price=gas_price_r.result(),
+            priority_fee=max(suggested, MIN_PRIORITY_FEE),
+            fetched_at=time.monotonic(),
+        )
+
+    def quote(self, force=False):
+        with self._lock:
+            q = self._quote
+            if q is not None and not force and time.monotonic() - q.fetched_at < self.ttl:
+                self.hits += 1
+                return q
+            q = self._quote = self._fetch()
+            self.refreshes += 1
+            return q
+
+    def fee_params(self, policy="auto"):
+        return self.quote().params(policy)
+
+    def stats(self):
+        with self._lock:
+            q = self._quote
+            return {
+                "endpoint": self.endpoint or "hyperevm-pool",
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "quote": q.as_dict() if q is not None else None,
+            }
+
+
+_oracles = {}
+_lock = threading.Lock()
+
+
+def get_fee_oracle(endpoint=None):
+    """Oracle for `endpoint` (None: the HyperEVM endpoint pool)."""
+    oracle = _oracles.get(endpoint)
+    if oracle is None:
+        with _lock:
+            oracle = _oracles.setdefault(endpoint, FeeOracle(endpoint))
+    return oracle
+
+
+def fee_params(policy="auto", endpoint=None):
+    return get_fee_oracle(endpoint).fee_params(policy)
+
+
+def stats():
+    with _lock:
+        oracles = list(_oracles.values())
+    return [o.stats() for o in oracles]
@@ -2,12 +2,19 @@ import requests
 from web3 import Web3
 from dotenv import load_dotenv
 import os
-import json
+from modules.rpc_manager import DEFAULT_HYPEREVM_RPC, get_w3, get_session
+from modules.token_metadata import token_decimals
+from modules.lazy import lazy, load_abi
+from modules.nonce_manager import reserve_nonce
+from modules.fee_oracle import fee_params
+from modules.receipt_tracker import wait_for_receipt
+from modules.simulation import preflight, SimulationError
+from modules import allowance_cache
 # Load environment variables
 load_dotenv()
 GLUEX_API_KEY = os.getenv('GLUEX_API_KEY')
 GLUEX_PID = os.getenv('GLUEX_PID')
-RPC_URL = 'https://rpc.hyperliquid.xyz/evm'
+RPC_URL = DEFAULT_HYPEREVM_RPC
 
 if not GLUEX_API_KEY:
     raise RuntimeError("GLUEX_API_KEY not set in .env")
@@ -21,11 +28,8 @@ HEADERS = {
     'x-api-key': GLUEX_API_KEY
 }
 
-with open("modules/abi/erc20_abi.json") as f:
-    erc20_abi = json.load(f)
-
-
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+# provider is built on first use; importing this module does no I/O
+w3 = lazy(get_w3)
 
 def get_swap_quote(input_token: str, output_token: str, input_amount: str, user_address: str) -> dict:
 
@@ -41,7 +45,7 @@ def get_swap_quote(input_token: str, output_token: str, input_amount: str, user_
         "isPermit2":    False
     }
     try:
-        resp = requests.post(url, headers=HEADERS, json=payload)
+        resp = get_session(url).post(url, headers=HEADERS, json=payload)
         resp.raise_for_status()
         data = resp.json()
         if 'result' not in data:
@@ -58,50 +62,65 @@ def execute_swap(quote_result: dict, user_address: str, private_key: str) -> dic
             return {"statusCode": 400, "error": "Cannot connect to RPC endpoint"}
 
 
+        spent = None
         if not quote_result.get('isNativeTokenInput', False):
             token_address = Web3.to_checksum_address(quote_result['inputToken'])
             router = Web3.to_checksum_address(quote_result['router'])
             amount_in = int(quote_result['inputAmount'])
+            spent = (user_address, token_address, router, amount_in)
 
-            token_contract = w3.eth.contract(address=token_address, abi=erc20_abi)
-            allowance = token_contract.functions.allowance(user_address, router).call()
+            token_contract = w3.eth.contract(address=token_address, abi=load_abi("erc20_abi.json"))
+            allowance = allowance_cache.allowance(user_address, token_address, router, amount_in)
 
             if allowance < amount_in:
-                approve_tx = token_contract.functions.approve(router, amount_in).build_transaction({
-                    'chainId': 999,
-                    'from': user_address,
-                    'nonce': w3.eth.get_transaction_count(user_address,"pending"),
-                    'gasPrice': w3.eth.gas_price
-                })
-                approve_tx['gas'] = w3.eth.estimate_gas(approve_tx)
-                signed_approve = w3.eth.account.sign_transaction(approve_tx, private_key)
-                approve_hash = w3.eth.send_raw_transaction(signed_approve.raw_transaction)
+                with reserve_nonce(user_address) as nonce:
+                    approve_tx = token_contract.functions.approve(router, amount_in).build_transaction({
+                        'chainId': 999,
+                        'from': user_address,
+                        'nonce': nonce,
+                        **fee_params("legacy")
+                    })
+                    approve_tx['gas'] = preflight(approve_tx)
+                    signed_approve = w3.eth.account.sign_transaction(approve_tx, private_key)
+                    approve_hash = w3.eth.send_raw_transaction(signed_approve.raw_transaction)
+                allowance_cache.record_approval(user_address, token_address, router, amount_in, approve_hash)
                 print("Approve tx sent, hash:", approve_hash.hex())
-                approve_receipt = w3.eth.wait_for_transaction_receipt(approve_hash)
+                approve_receipt = wait_for_receipt(approve_hash, sender=user_address)
                 if approve_receipt.status == 0:
                     return {"statusCode": 400, "error": "Approval transaction failed"}
                 print(f"Approval tx confirmed: {approve_hash.hex()}")
 
 
-        tx = {
-            'from': user_address,
-            'to': quote_result['router'],
-            'data': quote_result['calldata'],
-            'value': int(quote_result.get('value', 0)) if quote_result.get('isNativeTokenInput') else 0,
-            'nonce': w3.eth.get_transaction_count(user_address),
-            'gasPrice': w3.eth.gas_price
-        }
-        tx['gas'] = w3.eth.estimate_gas(tx)
-        signed = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        with reserve_nonce(user_address) as nonce:
+            tx = {
+                'from': user_address,
+                'to': quote_result['router'],
+                'data': quote_result['calldata'],
+                'value': int(quote_result.get('value', 0)) if quote_result.get('isNativeTokenInput') else 0,
+                'nonce': nonce,
+                **fee_params("legacy")
+            }
+            # simulated at the pending block with the estimate: a calldata revert stops here, unsigned
+            tx['gas'] = preflight(tx)
+            signed = w3.eth.account.sign_transaction(tx, private_key)
+            tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+        receipt = wait_for_receipt(tx_hash, sender=user_address)
         # print(receipt)
         # print(tx_hash.hex())
 
         if receipt.status == 0:
+            if spent:
+                allowance_cache.invalidate(*spent[:3])
             return {"statusCode": 400, "error": "Transaction reverted"}
+        if spent:
+            allowance_cache.consume(*spent)
         return {"statusCode": 200, "txHash": tx_hash.hex(), "error": None}
 
+    except SimulationError as e:
+        if spent:
+            # a stale cached allowance is one reason the swap would revert: re-read it next time
+            allowance_cache.invalidate(*spent[:3])
+        return {"statusCode": 400, "error": f"Swap simulation failed: {str(e)}"}
     except Exception as e:
         return {"statusCode": 400, "error": f"Transaction failed: {str(e)}"}
 
@@ -115,14 +134,12 @@ def gluex_get_exchange_rates(token_address):
         }
     ]
     url = "https://exchange-rates.gluex.xyz/"
-    resp = requests.post(url, json=pairs)
+    resp = get_session(url).post(url, json=pairs)
     resp.raise_for_status()
     rates =  resp.json()
     try:
         # rates[0]['price'] = ("0xb50A96253aBDF803D85efcDce07Ad8becBc52BD5")*10**(18-6)
-        web3 = Web3(Web3.HTTPProvider('https://hyperliquid.drpc.org'))
-        contract = web3.eth.contract(address=Web3.to_checksum_address(token_address), abi=erc20_abi)
-        dec = contract.functions.decimals().call()
+        dec = token_decimals(token_address)
         if dec != 18:
             return (round(float(rates[0]['price']) / 10**(18-dec), 2))
         return round(float(rates[0]['price']),2)
@@ -0,0 +1,156 @@
+"""
+Local health-factor projection for the Aave v3 pools (HyperLend, HypurrFi).
+- same integer math as the pools' GenericLogic.calculateUserAccountData, so an account with no
+  actions projects to what getUserAccountData reports (base currency, bps, WAD health factor)
+- reserve configs (LTV, liquidation threshold, decimals, flags) and oracle prices come from one
+  getReservesData read per protocol (the adapters' snapshot_markets(), cached)
+- an account is reduced to its sums (collateral, collateral x LTV, collateral x liquidation
+  threshold, debt); a candidate sequence of supply / withdraw / borrow / repay only re-prices the
+  reserves it touches, so many candidates and users project against one read without RPC
+
+    state = lend_state(positions["positions"])
+    for p in project_many(state, [[{"type": "borrow", "asset": usdc, "amount": 10**6}], ...]):
+        p["health_factor"]
+"""
+
+from modules.lending_models import WAD
+from modules.lending_protocols import get_protocol, protocols
+
+
+PERCENTAGE_FACTOR = 10_000
+HALF_PERCENT = PERCENTAGE_FACTOR // 2
+MAX_UINT256 = 2 ** 256 - 1
+LENDING_ACTIONS = ("supply", "withdraw", "borrow", "repay")
+
+
+def percent_mul(value, percentage):
+    return (value * percentage + HALF_PERCENT) // PERCENTAGE_FACTOR
+
+
+def wad_div(a, b):
+    return (a * WAD + b // 2) // b
+
+
+def reserve_configs(protocol, force=False):
+    """{asset: Reserve} for "lend" (HyperLend) or "fi" (HypurrFi), cached by the protocol adapter."""
+    return get_protocol(protocol).snapshot_markets(force=force)
+
+
+def invalidate_configs(protocol=None):
+    for p in protocols():
+        if protocol is None or protocol == p.name:
+            p.invalidate_markets()
+
+
+# ----------------------------
+# account state
+# ----------------------------
+def _contribution(cfg, supplied, debt, collateral):
+    """(collateral, collateral x ltv, collateral x liquidation threshold, debt), all in base currency."""
+    if cfg.price is None and (supplied or debt):
+        raise RuntimeError(f"{cfg.symbol}: no oracle price, cannot project health")
+    coll = coll_ltv = coll_lt = 0
+    if collateral and supplied and cfg.liquidation_threshold:
+        coll = supplied * cfg.price // cfg.unit
+        coll_ltv = coll * cfg.ltv
+        coll_lt = coll * cfg.liquidation_threshold
+    debt_base = debt * cfg.price // cfg.unit if debt else 0
+    return coll, coll_ltv, coll_lt, debt_base
+
+
+class AccountState:
+    """One user's positions on one pool: {asset: (supplied, debt, used as collateral)} in wei."""
+
+    __slots__ = ("configs", "balances", "totals")
+
+    def __init__(self, configs, balances):
+        self.configs = configs
+        self.balances = {a: b for a, b in balances.items() if a in configs}
+        totals = [0, 0, 0, 0]
+        for asset, (supplied, debt, collateral) in self.balances.items():
+            for i, v in enumerate(_contribution(configs[asset], supplied, debt, collateral)):
+                totals[i] += v
+        self.totals = tuple(totals)
+
+    def project(self, actions=()):
+        """Account data after `actions` (dicts with type / asset / amount; amount None = all)."""
+        touched = {}
+        for act in actions:
+            kind, asset = act.get("type"), act.get("asset")
+            if kind not in LENDING_ACTIONS or asset not in self.configs:
+                continue   # swaps, conversions and other pools do not change this account
+            if asset not in touched:
+                touched[asset] = list(self.balances.get(asset, (0, 0, False)))
+            pos = touched[asset]
+            amount = act.get("amount")
+            if kind == "supply":
+                cfg = self.configs[asset]
+                if pos[0] == 0 and not pos[2]:
+                    # first supply turns collateral on when the reserve can be collateral
+                    pos[2] = cfg.collateral_enabled and cfg.ltv != 0
+                pos[0] += int(amount)
+            elif kind == "withdraw":
+                pos[0] -= pos[0] if amount is None else min(int(amount), pos[0])
+                if pos[0] == 0:
+                    pos[2] = False
+            elif kind == "borrow":
+                pos[1] += int(amount)
+            else:
+                pos[1] -= pos[1] if amount is None else min(int(amount), pos[1])
+
+        coll, coll_ltv, coll_lt, debt = self.totals
+        for asset, pos in touched.items():
+            cfg = self.configs[asset]
+            old = self.balances.get(asset)
+            if old is not None:
+                o = _contribution(cfg, *old)
+                coll, coll_ltv, coll_lt, debt = coll - o[0], coll_ltv - o[1], coll_lt - o[2], debt - o[3]
+            n = _contribution(cfg, *pos)
+            coll, coll_ltv, coll_lt, debt = coll + n[0], coll_ltv + n[1], coll_lt + n[2], debt + n[3]
+        return account_data(coll, coll_ltv, coll_lt, debt)
+
+
+def account_data(coll, coll_ltv, coll_lt, debt):
+    """Sums -> the getUserAccountData fields (same keys as hyperlend's account summary)."""
+    ltv = coll_ltv // coll if coll else 0
+    lt = coll_lt // coll if coll else 0
+    hf_raw = wad_div(percent_mul(coll, lt), debt) if debt else MAX_UINT256
+    available = percent_mul(coll, ltv)
+    return {
+        "totalCollateralBase": coll,
+        "totalDebtBase": debt,
+        "availableBorrowsBase": available - debt if available > debt else 0,
+        "currentLiquidationThreshold": lt,
+        "ltv": ltv,
+        "healthFactorRaw": hf_raw,
+        "health_factor": hf_raw / WAD if debt else float("inf"),
+    }
+
+
+def positions_state(positions, configs):
+    """AccountState from {asset: Position} (either adapter's "positions")."""
+    return AccountState(configs, {asset: (p.supplied, p.debt, p.collateral) for asset, p in positions.items()})
+
+
+def lend_state(positions, configs=None):
+    """AccountState from hyperlend.get_user_positions()["positions"]."""
+    return positions_state(positions, configs if configs is not None else reserve_configs("lend"))
+
+
+def fi_state(portfolio, configs=None):
+    """AccountState from hypurrfi.get_full_user_portfolio()."""
+    return positions_state(portfolio.get("positions", {}), configs if configs is not None else reserve_configs("fi"))
+
+
+def project(state, actions=()):
+    return state.project(actions)
+
+
+def project_many(state, candidates):
+    """One projection per candidate action sequence, all against the same account snapshot."""
+    return [state.project(actions) for actions in candidates]
+
+
+def project_users(states, candidates):
+    """{user: [projection per candidate]} for {user: AccountState}."""
+    return {user: project_many(state, candidates) for user, state in states.items()}
@@ -4,6 +4,7 @@ from solders.transaction import VersionedTransaction
 from solders.message import MessageV0
 from solders.hash import Hash
 from solana.rpc.api import Client
+from modules.rpc_manager import get_session
 
 CREATE_TX_URL = "https://dln.debridge.finance/v1.0/dln/order/create-tx"
 SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"
@@ -29,7 +30,7 @@ def get_debridge_quote(amount: int, sender_address: str, recipient_address: str)
     }
 
     try:
-        response = requests.get(CREATE_TX_URL, params=params, headers={"accept": "application/json"})
+        response = get_session(CREATE_TX_URL).get(CREATE_TX_URL, params=params, headers={"accept": "application/json"})
         data = response.json()
         if "errorCode" in data:
             return data  # Return deBridge error response directly
@@ -9,7 +9,9 @@ from solders.message import MessageV0
 from solders.hash import Hash
 from solana.rpc.api import Client as SolClient
 from web3 import Web3
-import json
+from modules.rpc_manager import get_w3, get_session
+from modules.lazy import load_json
+from modules.fee_oracle import get_fee_oracle
 
 LIFI_QUOTE_URL = "https://li.quest/v1/quote"
 HEADERS = {"accept": "application/json"}
@@ -17,9 +19,18 @@ HEADERS = {"accept": "application/json"}
 def _err(code: int, id_: str, message: str) -> Dict[str, Union[int, str]]:
     return {"errorCode": code, "errorId": id_, "errorMessage": message}
 
-with open('lifi_list.json', 'r') as f:
-    lifi_data = json.load(f)
-chains = lifi_data['chains']
+def lifi_chains():
+    """Supported source chains from lifi_list.json (read on first use)."""
+    return load_json("lifi_list.json")["chains"]
+
+
+def __getattr__(name):
+    # lifi_data / chains used to be loaded at import time
+    if name == "lifi_data":
+        return load_json("lifi_list.json")
+    if name == "chains":
+        return lifi_chains()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_lifi_quote(from_chain: str, from_token: str, from_amount: Union[int, str], from_address: str, to_address: Optional[str] = None, timeout: int = 10,) -> Dict[str, Any]:
@@ -35,7 +46,7 @@ def get_lifi_quote(from_chain: str, from_token: str, from_amount: Union[int, str
         params["toAddress"] = to_address
 
     try:
-        r = requests.get(LIFI_QUOTE_URL, params=params, headers=HEADERS, timeout=timeout)
+        r = get_session(LIFI_QUOTE_URL).get(LIFI_QUOTE_URL, params=params, headers=HEADERS, timeout=timeout)
     except requests.RequestException as e:
         return _err(10, "NETWORK_ERROR", f"Network error calling LiFi: {e}")
 
@@ -160,7 +171,7 @@ def send_lifi_tx_evm(private_key_hex: str, lifi_response: Dict[str, Any], evm_rp
     if not to or not data:
         return _err(11, "INVALID_RESPONSE", "LiFi EVM response missing 'to' or 'data' fields")
 
-    w3 = Web3(Web3.HTTPProvider(evm_rpc))
+    w3 = get_w3(evm_rpc)
     if not w3.is_connected():
         return _err(10, "RPC_ERROR", f"Cannot connect to EVM RPC {evm_rpc}")
 
@@ -212,15 +223,8 @@ def send_lifi_tx_evm(private_key_hex: str, lifi_response: Dict[str, Any], evm_rp
 
 
     try:
-        latest = w3.eth.get_block("latest")
-        if "baseFeePerGas" in latest and latest["baseFeePerGas"] is not None:
-            # EIP-1559
-            base_fee = latest["baseFeePerGas"]
-            tx["maxPriorityFeePerGas"] = w3.to_wei(1, "gwei")
-            tx["maxFeePerGas"] = base_fee + tx["maxPriorityFeePerGas"]
-        else:
-            # Legacy gasPrice
-            tx["gasPrice"] = w3.eth.gas_price
+        # EIP-1559 when the chain has a base fee, legacy gasPrice otherwise (cached per block)
+        tx.update(get_fee_oracle(evm_rpc).fee_params("auto"))
     except Exception:
         tx["gasPrice"] = w3.to_wei("5", "gwei")
 
@@ -332,7 +336,7 @@ def format_lifi_quote(resp: dict) -> str:
 
 def fetch_lifi_balance(address: str, evm_rpc: str) -> float:
     try:
-        w3 = Web3(Web3.HTTPProvider(evm_rpc))
+        w3 = get_w3(evm_rpc)
         if not w3.is_connected():
             return {
                 "errorCode": 10,
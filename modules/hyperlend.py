@@ -1,32 +1,60 @@
 
 """
 HyperLend helper module.
-- Fetch markets (API + onchain)
-- Get detailed user positions (per reserve)
+- Fetch markets (conditional API requests, full on-chain fallback, TTL cache)
+- Get detailed user positions (UiPoolDataProvider bulk reads, many wallets per call; async variant)
+  as lending_models.Position / AccountSummary
 - Basic interactions (approve, supply, borrow, repay, withdraw)
-- Simple (non-atomic) hyper-loop function that supplies, borrows and re-supplies
+- Hyper-loop (supply, borrow, re-supply): planned upfront, pre-signed on consecutive nonces,
+  broadcast together (non-atomic; a revert stops the remaining steps)
 """
 
+import os
 import time
-import requests
-from web3 import Web3
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import wait as wait_futures, FIRST_COMPLETED
 from eth_account import Account
 from eth_utils import to_checksum_address
-
-
-RPC_URL = "https://rpc.hyperliquid.xyz/evm"
+from modules.rpc_manager import DEFAULT_HYPEREVM_RPC, get_w3, get_session
+from modules.multicall import multicall
+import modules.token_metadata as token_metadata
+from modules import snapshot
+from modules.async_client import client_scope
+from modules.lazy import lazy, load_abi
+from modules.multicall import multicall_contract
+from modules.ttl_cache import TTLCache
+from modules import nonce_manager
+from modules import receipt_tracker
+from modules import simulation
+from modules import allowance_cache
+from modules.lending_models import Reserve, Position, AccountSummary
+from modules.fee_oracle import fee_params
+
+logger = logging.getLogger(__name__)
+
+
+RPC_URL = DEFAULT_HYPEREVM_RPC
 CHAIN_ID = 999
 API_BASE = "https://api.hyperlend.finance"
+MARKET_CACHE_TTL = float(os.getenv("MARKET_CACHE_TTL", "30"))        # seconds market data is fresh
+MARKET_CACHE_STALE = float(os.getenv("MARKET_CACHE_STALE", "300"))   # extra seconds it may be served while refreshing
+MARKETS_API_TIMEOUT = 3
+MARKETS_API_RETRIES = 2
+MARKET_REPORT_HISTORY = 20
+LOOP_LTV_FRACTION = 0.9       # share of each supply's new borrowing power a planned loop borrows
+LOOP_RECEIPT_TIMEOUT = 60
 
 
 POOL_ADDRESS = "0x00A89d7a5A02160f20150EbEA7a2b5E4879A1A8b"
 PROTOCOL_DATA_PROVIDER = "0x5481bf8d3946E6A3168640c1D7523eB59F055a29"
 UI_POOL_DATA_PROVIDER = "0x3Bb92CF81E38484183cc96a4Fb8fBd2d73535807"
 MAX_UINT256 = 2**256 - 1
+POOL_GAS_LIMIT = 500_000   # used when the call follows an approval that is not mined yet (estimateGas would revert)
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
-if not w3.is_connected():
-    raise RuntimeError(f"Cannot connect to RPC {RPC_URL}")
+# provider and contracts are built on first use; importing this module does no I/O
+w3 = lazy(get_w3)
 
 POOL_ABI = [
     {"inputs":[{"internalType":"address","name":"asset","type":"address"},
@@ -60,6 +88,9 @@ POOL_ABI = [
          {"internalType":"uint256","name":"currentLiquidationThreshold","type":"uint256"},
          {"internalType":"uint256","name":"ltv","type":"uint256"},
          {"internalType":"uint256","name":"healthFactor","type":"uint256"}],
+     "stateMutability":"view","type":"function"},
+    {"inputs":[],"name":"ADDRESSES_PROVIDER",
+     "outputs":[{"internalType":"contract IPoolAddressesProvider","name":"","type":"address"}],
      "stateMutability":"view","type":"function"}
 ]
 
@@ -112,11 +143,14 @@ ERC20_ABI = [
 ]
 
 # Instances
-pool = w3.eth.contract(address=to_checksum_address(POOL_ADDRESS), abi=POOL_ABI)
-pdata = w3.eth.contract(address=to_checksum_address(PROTOCOL_DATA_PROVIDER), abi=PROTOCOL_DATA_PROVIDER_ABI)
+pool = lazy(lambda: w3.eth.contract(address=to_checksum_address(POOL_ADDRESS), abi=POOL_ABI))
+pdata = lazy(lambda: w3.eth.contract(address=to_checksum_address(PROTOCOL_DATA_PROVIDER), abi=PROTOCOL_DATA_PROVIDER_ABI))
+ui_pool = lazy(lambda: w3.eth.contract(address=to_checksum_address(UI_POOL_DATA_PROVIDER), abi=load_abi("UiPoolDataProviderV3.json")))
 
 RAY = 10**27
+HALF_RAY = RAY // 2
 WAD = 10**18
+SECONDS_PER_YEAR = 365 * 24 * 3600
 MAX_UINT = 2**256 - 1
 
 def ray_to_percent(ray_val):
@@ -135,17 +169,11 @@ def to_wei(amount, decimals):
 def erc20(token_addr):
     return w3.eth.contract(address=to_checksum_address(token_addr), abi=ERC20_ABI)
 
-def token_decimals(token_addr, default=18):
-    try:
-        return erc20(token_addr).functions.decimals().call()
-    except Exception:
-        return default
+def token_decimals(token_addr, default=None):
+    return token_metadata.token_decimals(token_addr, default)
 
 def token_symbol(token_addr):
-    try:
-        return erc20(token_addr).functions.symbol().call()
-    except Exception:
-        return "TOKEN"
+    return token_metadata.token_symbol(token_addr, "TOKEN")
 
 def wallet_balance(token_addr, owner):
     try:
@@ -159,42 +187,87 @@ def allowance(token_addr, owner, spender):
     except Exception:
         return 0
 
+def send_tx(acct, fn, gas=None):
+    """
+    Sign and broadcast a contract call with a locally managed nonce (no receipt wait).
+    Without an explicit gas limit the call is simulated at the pending block first (one batch
+    with the gas estimate); a revert raises SimulationError before anything is signed.
+    """
+    with nonce_manager.reserve_nonce(acct.address) as nonce:
+        params = {
+            "from": acct.address,
+            "nonce": nonce,
+            "chainId": CHAIN_ID,
+            "gas": int(gas or 0),
+            **fee_params("legacy")
+        }
+        tx = fn.build_transaction(params)
+        if gas is None:
+            tx["gas"] = simulation.preflight(tx)
+        signed = acct.sign_transaction(tx)
+        return w3.eth.send_raw_transaction(signed.raw_transaction)
+
 def approve_erc20(private_key, token_addr, spender, amount_wei):
     acct = Account.from_key(private_key)
     token = erc20(token_addr)
-    tx = token.functions.approve(to_checksum_address(spender), int(amount_wei)).build_transaction({
-        "from": acct.address,
-        "nonce": w3.eth.get_transaction_count(acct.address, 'pending'),
-        "gasPrice": w3.eth.gas_price,
-        "chainId": CHAIN_ID
-    })
     # let node set gas (or estimate)
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    tx_hash = send_tx(acct, token.functions.approve(to_checksum_address(spender), int(amount_wei)))
     return tx_hash.hex()
 
-def ensure_allowance(private_key, token_addr, spender, min_needed_wei, approve_infinite=True):
-
+def ensure_allowance(private_key, token_addr, spender, min_needed_wei, approve_infinite=True, follow_up=None):
+    """
+    Approve `spender` if the allowance is short. `follow_up` is the (contract, fn_name, args) call
+    the approval is for: both are simulated as one sequence before the approval is signed.
+    """
     acct = Account.from_key(private_key)
+    # a cached allowance that covers the amount is trusted; otherwise read (and cache) it on-chain
+    if allowance_cache.covers(acct.address, token_addr, spender, min_needed_wei):
+        return (False, None)
     current = allowance(token_addr, acct.address, spender)
+    allowance_cache.get_cache().put(acct.address, token_addr, spender, current)
     if current >= int(min_needed_wei):
         return (False, None)
     amt = MAX_UINT if approve_infinite else int(min_needed_wei)
+    if follow_up is not None:
+        approve_call = (erc20(token_addr), "approve", [to_checksum_address(spender), amt])
+        simulation.require_ok(
+            simulation.simulate_sequence([simulation.call_tx(acct.address, c) for c in (approve_call, follow_up)]),
+            ["approve", follow_up[1]],
+        )
     h = approve_erc20(private_key, token_addr, spender, amt)
+    allowance_cache.record_approval(acct.address, token_addr, spender, amt, h)
     return (True, h)
 
+def _send_with_allowance(private_key, asset, amount_wei, approve_infinite, follow_up, send):
+    """
+    ensure_allowance() then `send(gas)`. When the cached allowance was trusted and the pool call
+    still fails its simulation, the allowance is re-read on-chain and the call tried once more.
+    """
+    acct = Account.from_key(private_key)
+    _, txh = ensure_allowance(private_key, asset, POOL_ADDRESS, amount_wei, approve_infinite=approve_infinite, follow_up=follow_up)
+    try:
+        # the approval and the pool call go out back to back on consecutive nonces
+        h = send(POOL_GAS_LIMIT if txh else None)
+    except simulation.SimulationError:
+        if txh:
+            raise
+        allowance_cache.invalidate(acct.address, asset, POOL_ADDRESS)
+        _, txh = ensure_allowance(private_key, asset, POOL_ADDRESS, amount_wei, approve_infinite=approve_infinite, follow_up=follow_up)
+        if not txh:
+            raise   # the allowance was fine: the call fails for another reason
+        h = send(POOL_GAS_LIMIT)
+    allowance_cache.consume(acct.address, asset, POOL_ADDRESS, amount_wei)
+    return h
+
 # ----------------------------
 # API: markets & rates
 # ----------------------------
-def fetch_markets_api():
+_api_cache = {"etag": None, "last_modified": None, "markets": None}
+_market_reports = deque(maxlen=MARKET_REPORT_HISTORY)
 
-    url = f"{API_BASE}/data/markets"
-    r = requests.get(url, params={"chain":"hyperEvm"}, timeout=2)
-    r.raise_for_status()
-    obj = r.json()
-    reserves = obj.get("reserves", [])
+def _parse_markets_api(obj):
     out = []
-    for rsv in reserves:
+    for rsv in obj.get("reserves", []):
         lr = int(rsv.get("liquidityRate") or 0)
         vbr = int(rsv.get("variableBorrowRate") or 0)
         entry = {
@@ -214,12 +287,43 @@ def fetch_markets_api():
             "variableDebtTokenAddress": rsv.get("variableDebtTokenAddress"),
             "stableDebtTokenAddress": rsv.get("stableDebtTokenAddress")
         }
+        if rsv.get("reserveLiquidationThreshold") is not None:
+            entry["liquidationThreshold"] = int(rsv["reserveLiquidationThreshold"]) / 10000
         out.append(entry)
     return out
 
+def _fetch_markets_api():
+    """(markets, "api" | "api-304"); conditional GET on the pooled session, retried on failure."""
+    url = f"{API_BASE}/data/markets"
+    headers = {}
+    if _api_cache["markets"] is not None:
+        if _api_cache["etag"]:
+            headers["If-None-Match"] = _api_cache["etag"]
+        if _api_cache["last_modified"]:
+            headers["If-Modified-Since"] = _api_cache["last_modified"]
+    last_error = None
+    for attempt in range(MARKETS_API_RETRIES + 1):
+        try:
+            r = get_session(url).get(url, params={"chain":"hyperEvm"}, headers=headers, timeout=MARKETS_API_TIMEOUT)
+            if r.status_code == 304 and _api_cache["markets"] is not None:
+                return [dict(m) for m in _api_cache["markets"]], "api-304"
+            r.raise_for_status()
+            out = _parse_markets_api(r.json())
+        except Exception as e:
+            last_error = e
+            if attempt < MARKETS_API_RETRIES:
+                time.sleep(0.25 * (attempt + 1))
+            continue
+        _api_cache.update(etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"), markets=out)
+        return [dict(m) for m in out], "api"
+    raise RuntimeError(f"HyperLend markets API unavailable: {last_error}")
+
+def fetch_markets_api():
+    return _fetch_markets_api()[0]
+
 def fetch_reserves_onchain():
     try:
-        raw = pdata.functions.getAllReservesTokens().call()
+        raw = snapshot.read(pdata.functions.getAllReservesTokens())
     except Exception:
         return []
     out = []
@@ -229,29 +333,66 @@ def fetch_reserves_onchain():
         out.append({"symbol": sym, "underlyingAsset": addr})
     return out
 
-def fetch_all_markets_combined():
-    api = fetch_markets_api()
-    onchain = fetch_reserves_onchain()
-    store = {}
-    for m in api:
-        store[m["underlyingAsset"]] = m
-    for o in onchain:
-        addr = o["underlyingAsset"]
-        if addr not in store:
-            store[addr] = {
-                "underlyingAsset": addr,
-                "symbol": o.get("symbol"),
-                "decimals": 18,
-                "liquidityRate": 0,
-                "liquidityRatePct": 0.0,
-                "variableBorrowRate": 0,
-                "variableBorrowRatePct": 0.0,
-                "availableLiquidity": 0,
-                "borrowingEnabled": False,
-                "usageAsCollateralEnabled": False,
-                "name": o.get("symbol") or addr[:8]
-            }
+def fetch_markets_onchain():
+    """{asset: market} for every reserve, with real rates/decimals/LTVs from UiPoolDataProvider.getReservesData."""
+    out = multicall(_bulk_calls(_addresses_provider(), []), w3=w3)
+    decoded = _decode_reserves(out)
+    if decoded is None:
+        raise RuntimeError("UiPoolDataProvider.getReservesData unavailable")
+    return decoded[1]
+
+def _load_markets_combined():
+    started = time.perf_counter()
+    report = {"fetched_at": time.time(), "api_error": None}
+    try:
+        api, source = _fetch_markets_api()
+    except Exception as e:
+        api, source = None, None
+        report["api_error"] = str(e)
+
+    if api is None:
+        # API down: every reserve from chain, with real rates and decimals
+        try:
+            store = fetch_markets_onchain()
+        except Exception as e:
+            raise RuntimeError(f"No HyperLend market source available (api: {report['api_error']}; onchain: {e})")
+        source = "onchain"
+    else:
+        store = {m["underlyingAsset"]: m for m in api}
+        missing = [o for o in fetch_reserves_onchain() if o["underlyingAsset"] not in store]
+        if missing:
+            # reserves the API does not list yet are read from chain instead of zero-filled
+            try:
+                full = fetch_markets_onchain()
+                for o in missing:
+                    if o["underlyingAsset"] in full:
+                        store[o["underlyingAsset"]] = full[o["underlyingAsset"]]
+                source += "+onchain"
+            except Exception as e:
+                logger.warning(f"HyperLend: {len(missing)} reserves missing from API and chain read failed: {e}")
+
+    report.update(source=source, duration_ms=round((time.perf_counter() - started) * 1000, 1), reserves=len(store))
+    _market_reports.append(report)
     return store
+
+def market_source_report(last=1):
+    """Which source served the most recent market snapshots and how long each took."""
+    reports = list(_market_reports)[-last:]
+    return reports[-1] if last == 1 and reports else reports
+
+_market_cache = TTLCache(_load_markets_combined, MARKET_CACHE_TTL, MARKET_CACHE_STALE, name="hyperlend_markets")
+
+def fetch_all_markets_combined(force=False):
+    """{asset: market}; served from the process-wide cache, refreshed in the background once stale."""
+    return dict(_market_cache.get(force=force))
+
+def invalidate_markets():
+    """Drop cached market data; called after our own pool transactions change rates/liquidity."""
+    _market_cache.invalidate()
+
+def market_cache_stats():
+    return _market_cache.stats()
+
 def normalize_txhash(txh):
 
     if txh is None:
@@ -263,15 +404,13 @@ def normalize_txhash(txh):
         return txh if txh.startswith("0x") else "0x" + txh
     return txh
 
-def wait_for_tx(txh, timeout=2):
+def wait_for_tx(txh, timeout=2, sender=None):
 
     txh_n = normalize_txhash(txh)
     if not txh_n:
         raise RuntimeError("No tx hash provided to wait_for_tx()")
     try:
-
-        receipt = w3.eth.wait_for_transaction_receipt(txh_n, timeout=timeout)
-        return receipt
+        return receipt_tracker.wait_for_receipt(txh_n, timeout=timeout, sender=sender)
     except Exception as e:
         raise RuntimeError(f"Waiting for tx {txh_n} failed: {e}")
     
@@ -293,10 +432,10 @@ def supply_with_approve(private_key, asset, amount_wei, on_behalf=None, approve_
     approved, txh = ensure_allowance(private_key, asset, POOL_ADDRESS, int(amount_wei), approve_infinite=approve_infinite)
     if txh:
 
-        wait_for_tx(txh, timeout=2)
+        wait_for_tx(txh, timeout=2, sender=acct.address)
 
     h = supply(private_key, asset, amount_wei, on_behalf=on_behalf)
-    wait_for_tx(h, timeout=2)
+    wait_for_tx(h, timeout=2, sender=acct.address)
     return h
 
 
@@ -316,78 +455,289 @@ def best_borrow_markets(top=5):
     return mk[:top]
 
 
-def get_user_positions(private_key, include_wallet_balances=True, include_allowances=True):
-    acct = Account.from_key(private_key)
-    address = acct.address
-    markets = fetch_all_markets_combined()
+# ----------------------------
+# user positions
+# ----------------------------
+def _cached_allowances(users, markets, include_allowances):
+    """Infinite pool allowances already in the allowance cache; they are not read again."""
+    if not include_allowances:
+        return {}
+    keys = [allowance_cache.pair_key(u, a, POOL_ADDRESS) for u in users for a in markets]
+    return {k: v for k, v in allowance_cache.get_cache().get_many(keys).items() if v >= allowance_cache.INFINITE}
+
+def _allowance_value(out, user, asset_addr, cached, read):
+    key = allowance_cache.pair_key(user, asset_addr, POOL_ADDRESS)
+    if key in cached:
+        return cached[key]
+    value = next(out)
+    if value is not None:
+        read.append((user, asset_addr, POOL_ADDRESS, value))
+    return value or 0
+
+def _position_calls(markets, address, include_wallet_balances, include_allowances, cached=None):
+    # per reserve: user reserve data (+ wallet balance, + allowance unless cached), then the account summary
+    cached = cached or {}
+    calls = []
+    for asset_addr in markets:
+        calls.append((pdata, "getUserReserveData", [asset_addr, address]))
+        if include_wallet_balances:
+            calls.append((erc20(asset_addr), "balanceOf", [address]))
+        if include_allowances and allowance_cache.pair_key(address, asset_addr, POOL_ADDRESS) not in cached:
+            calls.append((erc20(asset_addr), "allowance", [address, to_checksum_address(POOL_ADDRESS)]))
+    calls.append((pool, "getUserAccountData", [address]))
+    return calls
+
+def _reserve_model(m):
+    """Market dict (API or on-chain) -> Reserve; the API does not carry prices."""
+    return Reserve(
+        asset=m["underlyingAsset"],
+        symbol=m.get("symbol"),
+        name=m.get("name"),
+        decimals=m.get("decimals", 18),
+        ltv=int(m.get("baseLTVasCollateral") or 0),
+        liquidation_threshold=round(m.get("liquidationThreshold", 0) * 10000),
+        liquidity_rate=int(m.get("liquidityRate") or 0),
+        variable_borrow_rate=int(m.get("variableBorrowRate") or 0),
+        available_liquidity=m.get("availableLiquidity"),
+        collateral_enabled=m.get("usageAsCollateralEnabled", True),
+        borrowing_enabled=m.get("borrowingEnabled", True),
+        a_token=to_checksum_address(m["aTokenAddress"]) if m.get("aTokenAddress") else None,
+    )
+
+def _account_summary(ac):
+    # None when getUserAccountData reverted
+    return AccountSummary.from_tuple(ac) if ac is not None else None
+
+def _shape_positions(address, markets, out, include_wallet_balances, include_allowances, cached=None):
+    cached = cached or {}
+    out = iter(out)
     positions = {}
+    read = []
     for asset_addr, m in markets.items():
-        try:
-            data = pdata.functions.getUserReserveData(asset_addr, address).call()
-            # (aBal, stableDebt, varDebt, principalStableDebt, scaledVarDebt, stableBorrowRate, liquidityRate, stableRateLastUpdated, usageAsCollateralEnabled)
-            a_bal = int(data[0])
-            st_debt = int(data[1])
-            var_debt = int(data[2])
-            usage_flag = bool(data[8])
-            decimals = m.get("decimals", 18)
-
-            entry = {
-                "symbol": m.get("symbol"),
-                "name": m.get("name"),
-                "decimals": decimals,
-                "supplied_raw": a_bal,
-                "supplied": wei_to_amount(a_bal, decimals),
-                "stableDebt_raw": st_debt,
-                "stableDebt": wei_to_amount(st_debt, decimals),
-                "variableDebt_raw": var_debt,
-                "variableDebt": wei_to_amount(var_debt, decimals),
-                "usageAsCollateralEnabled": usage_flag,
-                "market_liquidityRatePct": m.get("liquidityRatePct"),
-                "market_variableBorrowRatePct": m.get("variableBorrowRatePct"),
-                "market_availableLiquidity": m.get("availableLiquidity"),
-            }
-
-            if include_wallet_balances:
-                entry["walletBalance_raw"] = wallet_balance(asset_addr, address)
-                entry["walletBalance"] = wei_to_amount(entry["walletBalance_raw"], decimals)
-
-            if include_allowances:
-                entry["allowanceToPool_raw"] = allowance(asset_addr, address, POOL_ADDRESS)
-
-            positions[asset_addr] = entry
-
-        except Exception:
+        data = next(out)
+        wallet_raw = (next(out) or 0) if include_wallet_balances else None
+        allowance_raw = _allowance_value(out, address, asset_addr, cached, read) if include_allowances else None
+        if data is None:
             # skip reserves that revert
             continue
-
+        # (aBal, stableDebt, varDebt, principalStableDebt, scaledVarDebt, stableBorrowRate, liquidityRate, stableRateLastUpdated, usageAsCollateralEnabled)
+        positions[asset_addr] = Position(
+            _reserve_model(m), supplied=int(data[0]), stable_debt=int(data[1]), variable_debt=int(data[2]),
+            collateral=bool(data[8]), wallet=wallet_raw, allowance=allowance_raw,
+        )
+    allowance_cache.get_cache().put_many(read, "chain")
+    return {"address": address, "positions": positions, "account": _account_summary(next(out))}
+
+def get_user_positions_per_reserve(address, include_wallet_balances=True, include_allowances=True):
+    """Per-reserve getUserReserveData path, used when the UI data provider cannot be read."""
+    address = to_checksum_address(address)
+    markets = fetch_all_markets_combined()
+    cached = _cached_allowances([address], markets, include_allowances)
+    calls = _position_calls(markets, address, include_wallet_balances, include_allowances, cached)
+    out = multicall(calls, w3=w3)
+    return _shape_positions(address, markets, out, include_wallet_balances, include_allowances, cached)
+
+# -- bulk path: UiPoolDataProvider.getReservesData / getUserReservesData --
+
+def ray_mul(a, b):
+    return (a * b + HALF_RAY) // RAY
+
+def linear_interest(rate, last_update, now):
+    return RAY + rate * max(now - last_update, 0) // SECONDS_PER_YEAR
+
+def compounded_interest(rate, last_update, now):
+    # same binomial approximation as Aave's MathUtils.calculateCompoundedInterest
+    exp = max(now - last_update, 0)
+    if exp == 0:
+        return RAY
+    base_power_two = ray_mul(rate, rate) // (SECONDS_PER_YEAR * SECONDS_PER_YEAR)
+    base_power_three = ray_mul(base_power_two, rate) // SECONDS_PER_YEAR
+    second_term = exp * (exp - 1) * base_power_two // 2
+    third_term = exp * (exp - 1) * max(exp - 2, 0) * base_power_three // 6
+    return RAY + rate * exp // SECONDS_PER_YEAR + second_term + third_term
+
+def _struct_fields(fn_name, output_index=0):
+    for item in ui_pool.abi:
+        if item.get("type") == "function" and item.get("name") == fn_name:
+            return [c["name"] for c in item["outputs"][output_index]["components"]]
+    raise ValueError(f"{fn_name} not in UiPoolDataProvider ABI")
+
+_ADDRESSES_PROVIDER = None
+
+def _addresses_provider():
+    # PoolAddressesProvider is immutable on the pool, resolve it once
+    global _ADDRESSES_PROVIDER
+    if _ADDRESSES_PROVIDER is None:
+        _ADDRESSES_PROVIDER = to_checksum_address(snapshot.read(pool.functions.ADDRESSES_PROVIDER()))
+    return _ADDRESSES_PROVIDER
+
+def _bulk_calls(provider, users):
+    calls = [
+        (ui_pool, "getReservesData", [provider]),
+        (multicall_contract(w3), "getCurrentBlockTimestamp", []),
+    ]
+    for user in users:
+        calls.append((ui_pool, "getUserReservesData", [provider, user]))
+        calls.append((pool, "getUserAccountData", [user]))
+    return calls
+
+def _reserve_market(r):
+    addr = to_checksum_address(r["underlyingAsset"])
+    return {
+        "underlyingAsset": addr,
+        "name": r["name"],
+        "symbol": r["symbol"],
+        "decimals": int(r["decimals"]),
+        "baseLTVasCollateral": int(r["baseLTVasCollateral"]),
+        "liquidationThreshold": int(r["reserveLiquidationThreshold"]) / 10000,
+        "liquidityRate": int(r["liquidityRate"]),
+        "liquidityRatePct": ray_to_percent(int(r["liquidityRate"])),
+        "variableBorrowRate": int(r["variableBorrowRate"]),
+        "variableBorrowRatePct": ray_to_percent(int(r["variableBorrowRate"])),
+        "availableLiquidity": int(r["availableLiquidity"]),
+        "borrowingEnabled": bool(r["borrowingEnabled"]),
+        "usageAsCollateralEnabled": bool(r["usageAsCollateralEnabled"]),
+        "aTokenAddress": r["aTokenAddress"],
+        "variableDebtTokenAddress": r["variableDebtTokenAddress"],
+        "stableDebtTokenAddress": r["stableDebtTokenAddress"],
+    }
+
+def _decode_reserves(out):
+    """getReservesData + block timestamp -> ({asset: reserve dict}, {asset: market dict}, timestamp)."""
+    reserves_out, now = out[0], out[1]
+    if reserves_out is None or now is None:
+        return None
+    fields = _struct_fields("getReservesData")
+    reserves = {}
+    markets = {}
+    for raw in reserves_out[0]:
+        r = dict(zip(fields, raw))
+        addr = to_checksum_address(r["underlyingAsset"])
+        reserves[addr] = r
+        markets[addr] = _reserve_market(r)
+    return reserves, markets, now
+
+def fetch_reserves_data():
+    """{asset: getReservesData struct} (configs, indexes, oracle prices) from one multicall."""
+    decoded = _decode_reserves(multicall(_bulk_calls(_addresses_provider(), []), w3=w3))
+    if decoded is None:
+        raise RuntimeError("HyperLend reserve data unavailable (getReservesData failed).")
+    return decoded[0]
+
+def _wallet_calls(users, markets, include_wallet_balances, include_allowances, cached=None):
+    cached = cached or {}
+    calls = []
+    for user in users:
+        for asset_addr in markets:
+            if include_wallet_balances:
+                calls.append((erc20(asset_addr), "balanceOf", [user]))
+            if include_allowances and allowance_cache.pair_key(user, asset_addr, POOL_ADDRESS) not in cached:
+                calls.append((erc20(asset_addr), "allowance", [user, to_checksum_address(POOL_ADDRESS)]))
+    return calls
+
+def _shape_bulk(users, reserves, markets, now, user_out, wallet_out, include_wallet_balances, include_allowances, cached=None):
+    cached = cached or {}
+    user_fields = _struct_fields("getUserReservesData")
+    wallet_out = iter(wallet_out)
+    # one Reserve per reserve, shared by every user's positions
+    models = {asset_addr: Reserve.from_struct(r) for asset_addr, r in reserves.items()}
+    results = {}
+    read = []
+    for i, user in enumerate(users):
+        user_reserves, account = user_out[2 * i], user_out[2 * i + 1]
+        by_asset = {}
+        if user_reserves is not None:
+            for raw in user_reserves[0]:
+                u = dict(zip(user_fields, raw))
+                by_asset[to_checksum_address(u["underlyingAsset"])] = u
+        positions = {}
+        for asset_addr in markets:
+            wallet_raw = (next(wallet_out) or 0) if include_wallet_balances else None
+            allowance_raw = _allowance_value(wallet_out, user, asset_addr, cached, read) if include_allowances else None
+            if user_reserves is None:
+                continue
+            r = reserves[asset_addr]
+            u = by_asset.get(asset_addr, {})
+            # scaled balances -> current balances with the reserve indexes accrued to this block
+            income = ray_mul(linear_interest(r["liquidityRate"], r["lastUpdateTimestamp"], now), r["liquidityIndex"])
+            debt_index = ray_mul(compounded_interest(r["variableBorrowRate"], r["lastUpdateTimestamp"], now), r["variableBorrowIndex"])
+            a_bal = ray_mul(int(u.get("scaledATokenBalance", 0)), income)
+            var_debt = ray_mul(int(u.get("scaledVariableDebt", 0)), debt_index)
+            st_debt = ray_mul(
+                int(u.get("principalStableDebt", 0)),
+                compounded_interest(int(u.get("stableBorrowRate", 0)), int(u.get("stableBorrowLastUpdateTimestamp", 0)), now),
+            ) if u.get("principalStableDebt") else 0
+            positions[asset_addr] = Position(
+                models[asset_addr], supplied=a_bal, stable_debt=st_debt, variable_debt=var_debt,
+                collateral=bool(u.get("usageAsCollateralEnabledOnUser", False)), wallet=wallet_raw, allowance=allowance_raw,
+            )
+        if user_reserves is None:
+            results[user] = None
+        else:
+            results[user] = {"address": user, "positions": positions, "account": _account_summary(account)}
+    allowance_cache.get_cache().put_many(read, "chain")
+    return results
+
+def get_user_positions_bulk(addresses, include_wallet_balances=True, include_allowances=True):
+    """
+    Positions for many wallets: every reserve of every user comes from one
+    getReservesData + getUserReservesData multicall (plus one for wallet balances/allowances).
+    Returns {address: same shape as get_user_positions()}.
+    """
+    users = [to_checksum_address(a) for a in addresses]
+    if not users:
+        return {}
     try:
-        ac = pool.functions.getUserAccountData(address).call()
-        acct_summary = {
-            "totalCollateralBase": ac[0],
-            "totalDebtBase": ac[1],
-            "availableBorrowsBase": ac[2],
-            "currentLiquidationThreshold": ac[3],
-            "ltv": ac[4],
-            "healthFactorRaw": ac[5],
-        }
-    except Exception as e:
-        acct_summary = {"error": str(e)}
-
-    return {"address": address, "positions": positions, "account": acct_summary}
+        provider = _addresses_provider()
+    except Exception:
+        provider = None
+    user_out = multicall(_bulk_calls(provider, users), w3=w3) if provider else None
+    decoded = _decode_reserves(user_out) if user_out else None
+    if decoded is None:
+        return {u: get_user_positions_per_reserve(u, include_wallet_balances, include_allowances) for u in users}
+    reserves, markets, now = decoded
+    cached = _cached_allowances(users, markets, include_allowances)
+    wallet_out = multicall(_wallet_calls(users, markets, include_wallet_balances, include_allowances, cached), w3=w3)
+    results = _shape_bulk(users, reserves, markets, now, user_out[2:], wallet_out, include_wallet_balances, include_allowances, cached)
+    for u, res in results.items():
+        if res is None:
+            results[u] = get_user_positions_per_reserve(u, include_wallet_balances, include_allowances)
+    return results
 
+def get_user_positions(private_key, include_wallet_balances=True, include_allowances=True):
+    address = Account.from_key(private_key).address
+    return get_user_positions_bulk([address], include_wallet_balances, include_allowances)[address]
 
-def supply(private_key, asset, amount_wei, on_behalf=None):
+async def async_get_user_positions(address, client=None, include_wallet_balances=True, include_allowances=True):
+    """Async get_user_positions() for a wallet address."""
+    users = [to_checksum_address(address)]
+    async with client_scope(client) as c:
+        try:
+            provider = await asyncio.to_thread(_addresses_provider)
+            user_out = await c.multicall(_bulk_calls(provider, users))
+            decoded = _decode_reserves(user_out)
+        except Exception:
+            decoded = None
+        if decoded is not None:
+            reserves, markets, now = decoded
+            cached = _cached_allowances(users, markets, include_allowances)
+            wallet_out = await c.multicall(_wallet_calls(users, markets, include_wallet_balances, include_allowances, cached))
+            result = _shape_bulk(users, reserves, markets, now, user_out[2:], wallet_out,
+                                 include_wallet_balances, include_allowances, cached)[users[0]]
+            if result is not None:
+                return result
+        markets = await asyncio.to_thread(fetch_all_markets_combined)
+        cached = _cached_allowances(users, markets, include_allowances)
+        out = await c.multicall(_position_calls(markets, users[0], include_wallet_balances, include_allowances, cached))
+    return _shape_positions(users[0], markets, out, include_wallet_balances, include_allowances, cached)
+
+
+def supply(private_key, asset, amount_wei, on_behalf=None, gas=None):
     acct = Account.from_key(private_key)
     if on_behalf is None:
         on_behalf = acct.address
-    tx = pool.functions.supply(to_checksum_address(asset), int(amount_wei), to_checksum_address(on_behalf), 0).build_transaction({
-        "from": acct.address,
-        "nonce": w3.eth.get_transaction_count(acct.address, 'pending'),
-        "gasPrice": w3.eth.gas_price,
-        "chainId": CHAIN_ID
-    })
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    tx_hash = send_tx(acct, pool.functions.supply(to_checksum_address(asset), int(amount_wei), to_checksum_address(on_behalf), 0), gas=gas)
+    invalidate_markets()
     return tx_hash.hex()
 
 def supply_with_approve(private_key, asset, amount_wei, on_behalf=None, approve_infinite=True):
@@ -402,102 +752,270 @@ def supply_with_approve(private_key, asset, amount_wei, on_behalf=None, approve_
     if bal < int(amount_wei):
         raise RuntimeError(f"Insufficient wallet balance for supply. balance={bal}, need={int(amount_wei)}")
 
-    # Ensure allowance
-    _, txh = ensure_allowance(private_key, asset, POOL_ADDRESS, int(amount_wei), approve_infinite=approve_infinite)
-    if txh:
-        # small delay for allowance to propagate (optional)
-        time.sleep(1.0)
-    return supply(private_key, asset, amount_wei, on_behalf=on_behalf)
+    # Ensure allowance (approve + supply simulated together first)
+    on_behalf = to_checksum_address(on_behalf or acct.address)
+    follow_up = (pool, "supply", [to_checksum_address(asset), int(amount_wei), on_behalf, 0])
+    return _send_with_allowance(private_key, asset, int(amount_wei), approve_infinite, follow_up,
+                                lambda gas: supply(private_key, asset, amount_wei, on_behalf=on_behalf, gas=gas))
 
-def withdraw(private_key, asset, amount_wei, to_addr=None):
+def withdraw(private_key, asset, amount_wei, to_addr=None, gas=None):
     acct = Account.from_key(private_key)
     if to_addr is None:
         to_addr = acct.address
-    tx = pool.functions.withdraw(to_checksum_address(asset), int(amount_wei), to_checksum_address(to_addr)).build_transaction({
-        "from": acct.address,
-        "nonce": w3.eth.get_transaction_count(acct.address, 'pending'),
-        "gasPrice": w3.eth.gas_price,
-        "chainId": CHAIN_ID
-    })
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    tx_hash = send_tx(acct, pool.functions.withdraw(to_checksum_address(asset), int(amount_wei), to_checksum_address(to_addr)), gas=gas)
+    invalidate_markets()
     return tx_hash.hex()
 
-def borrow(private_key, asset, amount_wei, interest_mode=2, on_behalf=None):
+def borrow(private_key, asset, amount_wei, interest_mode=2, on_behalf=None, gas=None):
     acct = Account.from_key(private_key)
     if on_behalf is None:
         on_behalf = acct.address
     m = fetch_all_markets_combined().get(to_checksum_address(asset))
     if m and not m.get("borrowingEnabled", True):
         raise RuntimeError("Borrowing disabled for this asset (borrowingEnabled=false).")
-    tx = pool.functions.borrow(to_checksum_address(asset), int(amount_wei), int(interest_mode), 0, to_checksum_address(on_behalf)).build_transaction({
-        "from": acct.address,
-        "nonce": w3.eth.get_transaction_count(acct.address, 'pending'),
-        "gasPrice": w3.eth.gas_price,
-        "chainId": CHAIN_ID
-    })
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    tx_hash = send_tx(acct, pool.functions.borrow(to_checksum_address(asset), int(amount_wei), int(interest_mode), 0, to_checksum_address(on_behalf)), gas=gas)
+    invalidate_markets()
     return tx_hash.hex()
 
-def repay(private_key, asset, amount_wei, interest_mode=2, on_behalf=None):
+def repay(private_key, asset, amount_wei, interest_mode=2, on_behalf=None, gas=None):
     acct = Account.from_key(private_key)
     if on_behalf is None:
         on_behalf = acct.address
     if amount_wei is None:
         amount_wei = MAX_UINT256
-    tx = pool.functions.repay(to_checksum_address(asset), int(amount_wei), int(interest_mode), to_checksum_address(on_behalf)).build_transaction({
-        "from": acct.address,
-        "nonce": w3.eth.get_transaction_count(acct.address, 'pending'),
-        "gasPrice": w3.eth.gas_price,
-        "chainId": CHAIN_ID
-    })
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    tx_hash = send_tx(acct, pool.functions.repay(to_checksum_address(asset), int(amount_wei), int(interest_mode), to_checksum_address(on_behalf)), gas=gas)
+    invalidate_markets()
     return str(tx_hash.hex())
 
 def repay_with_approve(private_key, asset, amount_wei, interest_mode=2, on_behalf=None, approve_infinite=True):
     acct = Account.from_key(private_key)
+    # Preflight: balance (a max repay takes the whole debt, which the simulation checks)
     bal = wallet_balance(asset, acct.address)
-    if amount_wei is None:
+    if amount_wei is None or int(amount_wei) == MAX_UINT256:
+        if bal == 0:
+            raise RuntimeError("Insufficient wallet balance for repay. balance=0")
         amount_wei = MAX_UINT256
-    _, txh = ensure_allowance(private_key, asset, POOL_ADDRESS, int(amount_wei), approve_infinite=approve_infinite)
-    if txh:
-        time.sleep(1.0)
-    return repay(private_key, asset, amount_wei, interest_mode=interest_mode, on_behalf=on_behalf)
-
-def hyperloop_simple(private_key, supply_asset, initial_supply_amount_wei, borrow_asset, borrow_amount_per_loop_wei, loops=1, approve_infinite=True):
+    elif bal < int(amount_wei):
+        raise RuntimeError(f"Insufficient wallet balance for repay. balance={bal}, need={int(amount_wei)}")
+    on_behalf = to_checksum_address(on_behalf or acct.address)
+    follow_up = (pool, "repay", [to_checksum_address(asset), int(amount_wei), int(interest_mode), on_behalf])
+    return _send_with_allowance(private_key, asset, int(amount_wei), approve_infinite, follow_up,
+                                lambda gas: repay(private_key, asset, amount_wei, interest_mode=interest_mode, on_behalf=on_behalf, gas=gas))
+
+# -- pipelined hyperloop: plan every step upfront, pre-sign on consecutive nonces, broadcast together --
+
+def _reference_value(amount_wei, r):
+    """Token amount -> market reference currency units (oracle price of the reserve)."""
+    return amount_wei * int(r["priceInMarketReferenceCurrency"]) // 10 ** int(r["decimals"])
+
+def _from_reference_value(value, r):
+    price = int(r["priceInMarketReferenceCurrency"])
+    return value * 10 ** int(r["decimals"]) // price if price else 0
+
+def plan_hyperloop(address, supply_asset, initial_supply_amount_wei, borrow_asset, loops=1,
+                   borrow_amount_per_loop_wei=None, ltv_fraction=LOOP_LTV_FRACTION, approve_infinite=True):
+    """
+    Every step of a hyperloop, computed from one multicall (reserve LTVs and oracle prices,
+    wallet balance, allowances). Loop i borrows `ltv_fraction` of the borrowing power the
+    previous supply added, unless a fixed borrow_amount_per_loop_wei is given.
+    Returns {"steps": [...], "borrows": [...]} or {"error": "..."}.
+    """
+    address = to_checksum_address(address)
+    supply_asset = to_checksum_address(supply_asset)
+    borrow_asset = to_checksum_address(borrow_asset)
+    spender = to_checksum_address(POOL_ADDRESS)
+    initial = int(initial_supply_amount_wei)
+
+    calls = _bulk_calls(_addresses_provider(), []) + [
+        (erc20(supply_asset), "balanceOf", [address]),
+        (erc20(supply_asset), "allowance", [address, spender]),
+        (erc20(borrow_asset), "allowance", [address, spender]),
+    ]
+    out = multicall(calls, w3=w3)
+    decoded = _decode_reserves(out)
+    if decoded is None:
+        return {"error": "HyperLend reserve data unavailable (getReservesData failed)."}
+    reserves = decoded[0]
+    s_r, b_r = reserves.get(supply_asset), reserves.get(borrow_asset)
+    if s_r is None or b_r is None:
+        return {"error": "Asset is not a HyperLend reserve."}
+    if not s_r["usageAsCollateralEnabled"]:
+        return {"error": "Supply asset not allowed as collateral (usageAsCollateralEnabled=false)."}
+    if not b_r["borrowingEnabled"]:
+        return {"error": "Borrow asset borrowingEnabled=false."}
+    balance, supply_allowance, borrow_allowance = (x or 0 for x in out[2:5])
+    allowance_cache.get_cache().put_many(
+        [(address, supply_asset, spender, supply_allowance), (address, borrow_asset, spender, borrow_allowance)], "chain"
+    )
+    if balance < initial:
+        return {"error": f"Insufficient wallet balance for supply. balance={balance}, need={initial}"}
+
+    if borrow_amount_per_loop_wei is not None:
+        borrows = [int(borrow_amount_per_loop_wei)] * loops
+    else:
+        borrows = []
+        added_value, ltv = _reference_value(initial, s_r), int(s_r["baseLTVasCollateral"])
+        for _ in range(loops):
+            amount = int(_from_reference_value(added_value * ltv // 10000, b_r) * ltv_fraction)
+            if amount <= 0:
+                break
+            borrows.append(amount)
+            added_value = _reference_value(amount, b_r)
+            ltv = int(b_r["baseLTVasCollateral"]) if b_r["usageAsCollateralEnabled"] else 0
+    if not borrows:
+        return {"error": "Nothing to borrow: the supplied collateral adds no borrowing power."}
+    if sum(borrows) > int(b_r["availableLiquidity"]):
+        return {"error": f"Not enough {b_r['symbol']} liquidity for the planned borrows."}
+
+    steps = []
+    def step(label, action, asset, amount):
+        steps.append({"label": label, "action": action, "asset": asset, "amount": int(amount)})
+
+    resupplied = sum(borrows)
+    if supply_asset == borrow_asset:
+        if supply_allowance < initial + resupplied:
+            step("approve_supply_asset", "approve", supply_asset, MAX_UINT if approve_infinite else initial + resupplied)
+    elif supply_allowance < initial:
+        step("approve_supply_asset", "approve", supply_asset, MAX_UINT if approve_infinite else initial)
+    step("supply_initial", "supply", supply_asset, initial)
+    if supply_asset != borrow_asset and borrow_allowance < resupplied:
+        step("approve_borrow_asset", "approve", borrow_asset, MAX_UINT if approve_infinite else resupplied)
+    for i, amount in enumerate(borrows):
+        step(f"borrow_loop_{i+1}", "borrow", borrow_asset, amount)
+        step(f"supply_back_loop_{i+1}", "supply", borrow_asset, amount)
+    return {"address": address, "steps": steps, "borrows": borrows}
+
+def _step_call(step, address):
+    """Hyperloop step -> (contract, fn_name, args)."""
+    asset = step["asset"]
+    if step["action"] == "approve":
+        return (erc20(asset), "approve", [to_checksum_address(POOL_ADDRESS), step["amount"]])
+    if step["action"] == "supply":
+        return (pool, "supply", [asset, step["amount"], address, 0])
+    if step["action"] == "borrow":
+        return (pool, "borrow", [asset, step["amount"], 2, 0, address])
+    raise ValueError(f"unknown hyperloop action {step['action']!r}")
+
+def _cancel_step(acct, step, fees):
+    """Replace a not-yet-mined step with a 0-value self transfer on the same nonce."""
+    tx = {
+        "from": acct.address,
+        "to": acct.address,
+        "value": 0,
+        "nonce": step["nonce"],
+        "gas": 21000,
+        "gasPrice": fees["gasPrice"] * 2,
+        "chainId": CHAIN_ID,
+    }
+    try:
+        step["cancel_hash"] = normalize_txhash(w3.eth.send_raw_transaction(acct.sign_transaction(tx).raw_transaction))
+    except Exception as e:
+        # usually already mined; its receipt decides the step's status
+        logger.info(f"hyperloop: could not cancel {step['label']}: {e}")
+
+def _track_steps(acct, steps, fees, timeout):
+    """Follow every pending step on the receipt tracker; cancel what is left after a revert."""
+    tracker = receipt_tracker.get_tracker()
+    futures = {tracker.track(s["hash"], timeout=timeout, sender=acct.address): (s, False) for s in steps if s["status"] == "pending"}
+    stopped = False
+    while futures:
+        done, _ = wait_futures(list(futures), return_when=FIRST_COMPLETED)
+        for f in done:
+            step, is_cancel = futures.pop(f)
+            if step["status"] != "pending":
+                continue   # the other transaction on this nonce already decided the step
+            try:
+                receipt = f.result()
+            except Exception:
+                if not any(s is step for s, _ in futures.values()):
+                    step["status"] = "timeout"
+                continue
+            step["blockNumber"] = receipt["blockNumber"]
+            if is_cancel:
+                step["status"] = "cancelled"
+            else:
+                step["status"] = "mined" if receipt["status"] == 1 else "reverted"
+            if step["status"] == "reverted" and not stopped:
+                stopped = True
+                for later in steps:
+                    if later["status"] == "pending" and later["nonce"] > step["nonce"]:
+                        _cancel_step(acct, later, fees)
+                        if later.get("cancel_hash"):
+                            futures[tracker.track(later["cancel_hash"], timeout=timeout, sender=acct.address)] = (later, True)
+        futures = {f: v for f, v in futures.items() if v[0]["status"] == "pending"}
+
+def execute_hyperloop_plan(private_key, plan, timeout=LOOP_RECEIPT_TIMEOUT):
+    """
+    Simulate the whole plan as one sequence, then pre-sign every step on consecutive nonces,
+    broadcast them back to back and track the receipts together. A reverted step stops the loop: later steps still in the mempool are
+    replaced by no-op transfers. Returns {"status", "steps"}; each step gets nonce, hash and status.
+    """
     acct = Account.from_key(private_key)
-    txs = []
-
-    markets = fetch_all_markets_combined()
-    s_m = markets.get(to_checksum_address(supply_asset))
-    b_m = markets.get(to_checksum_address(borrow_asset))
-    if s_m and not s_m.get("usageAsCollateralEnabled"):
-        return ("Supply asset not allowed as collateral (usageAsCollateralEnabled=false).")
-    if b_m and not b_m.get("borrowingEnabled"):
-        return ("Borrow asset borrowingEnabled=false.")
-
-    h_supply0 = supply_with_approve(private_key, supply_asset, int(initial_supply_amount_wei), approve_infinite=approve_infinite)
-    txs.append(("supply_initial", h_supply0))
-
-    if supply_asset.lower() != borrow_asset.lower():
-        approved, h = ensure_allowance(private_key, borrow_asset, POOL_ADDRESS, int(borrow_amount_per_loop_wei), approve_infinite=approve_infinite)
-        if approved and h:
-            wait_for_tx(h, timeout=4)
-            txs.append(("approve_borrow_asset", h))
-
-
-    for i in range(loops):
-        h_b = borrow(private_key, borrow_asset, int(borrow_amount_per_loop_wei), interest_mode=2)
-        txs.append((f"borrow_loop_{i+1}", h_b))
-        wait_for_tx(h_b, timeout=4)
-
-        h_s = supply(private_key, borrow_asset, int(borrow_amount_per_loop_wei))
-        txs.append((f"supply_back_loop_{i+1}", h_s))
-        wait_for_tx(h_s, timeout=4)
-
-    return txs
+    steps = [dict(s, status="not_sent", hash=None) for s in plan["steps"]]
+    calls = [_step_call(step, acct.address) for step in steps]
+    # the whole sequence runs as one simulation before anything is signed
+    results = simulation.simulate_sequence([simulation.call_tx(acct.address, c) for c in calls])
+    failed = simulation.first_failure(results)
+    if failed is not None:
+        steps[failed]["status"] = "simulation_failed"
+        steps[failed]["error"] = results[failed]["reason"]
+        return {"status": "simulation_failed", "steps": steps}
+    fees = fee_params("legacy")
+    with nonce_manager.reserve_nonce(acct.address, len(steps)) as first:
+        signed = []
+        for i, (step, (contract, fn_name, args)) in enumerate(zip(steps, calls)):
+            step["nonce"] = first + i
+            # explicit gas: estimateGas would revert until the earlier steps are mined
+            tx = contract.get_function_by_name(fn_name)(*args).build_transaction({
+                "from": acct.address,
+                "nonce": step["nonce"],
+                "gas": POOL_GAS_LIMIT,
+                "chainId": CHAIN_ID,
+                **fees
+            })
+            signed.append(acct.sign_transaction(tx))
+        for step, tx in zip(steps, signed):
+            try:
+                step["hash"] = normalize_txhash(w3.eth.send_raw_transaction(tx.raw_transaction))
+                step["status"] = "pending"
+            except Exception as e:
+                # later steps are never sent; their nonces are re-read from the node
+                step["status"] = "send_failed"
+                step["error"] = str(e)
+                nonce_manager.resync(acct.address)
+                break
+    for step in steps:
+        if step["action"] == "approve" and step["status"] == "pending":
+            allowance_cache.record_approval(acct.address, step["asset"], POOL_ADDRESS, step["amount"], step["hash"])
+    _track_steps(acct, steps, fees, timeout)
+    for step in steps:
+        if step["action"] == "supply" and step["status"] == "mined":
+            allowance_cache.consume(acct.address, step["asset"], POOL_ADDRESS, step["amount"])
+    invalidate_markets()
+    statuses = [s["status"] for s in steps]
+    for bad in ("send_failed", "reverted", "timeout"):
+        if bad in statuses:
+            return {"status": bad, "steps": steps}
+    return {"status": "ok", "steps": steps}
+
+def hyperloop_simple(private_key, supply_asset, initial_supply_amount_wei, borrow_asset, borrow_amount_per_loop_wei=None, loops=1, approve_infinite=True):
+    """
+    Supply, then borrow and re-supply `loops` times. The whole sequence is planned upfront
+    (borrow sizes from LTV and oracle prices when borrow_amount_per_loop_wei is None),
+    pre-signed and broadcast in one go. Returns [(label, tx hash)] or an error string.
+    """
+    acct = Account.from_key(private_key)
+    plan = plan_hyperloop(acct.address, supply_asset, initial_supply_amount_wei, borrow_asset, loops=loops,
+                          borrow_amount_per_loop_wei=borrow_amount_per_loop_wei, approve_infinite=approve_infinite)
+    if "error" in plan:
+        return plan["error"]
+    result = execute_hyperloop_plan(private_key, plan)
+    txs = [(s["label"], s["hash"]) for s in result["steps"] if s["hash"]]
+    if result["status"] == "ok":
+        return txs
+    failed = next(s for s in result["steps"] if s["status"] == result["status"])
+    done = ", ".join(f"{s['label']}={s['status']}" for s in result["steps"])
+    return f"Hyperloop stopped at {failed['label']} ({result['status']}{': ' + failed['error'] if failed.get('error') else ''}). Steps: {done}"
 
 
 if __name__ == "__main__":
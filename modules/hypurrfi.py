@@ -1,10 +1,19 @@
-import json
-from decimal import Decimal
+import asyncio
 from web3 import Web3
-import time
-
-
-RPC_URL = "https://rpc.hyperliquid.xyz/evm"
+from modules.rpc_manager import DEFAULT_HYPEREVM_RPC, get_w3
+import modules.token_metadata as token_metadata
+from modules import snapshot
+from modules.multicall import multicall
+from modules.async_client import client_scope
+from modules.lazy import lazy, load_abi
+from modules import nonce_manager
+from modules import simulation
+from modules.fee_oracle import fee_params
+from modules.lending_models import Reserve, Position, HypurrFiAccountSummary, Portfolio, NATIVE_ASSET
+
+
+RPC_URL = DEFAULT_HYPEREVM_RPC
+CHAIN_ID = 999
 POOL_ADDRESSES_PROVIDER = "0xA73ff12D177D8F1Ec938c3ba0e87D33524dD5594"
 UI_POOL_DATA_PROVIDER_V3_ADDRESS = "0x7b883191011AEAe40581d3Fa1B112413808C9c00"
 PROTOCOL_DATA_PROVIDER_ADDRESS = "0x895C799a5bbdCb63B80bEE5BD94E7b9138D977d6"
@@ -12,248 +21,346 @@ POOL_ADDRESS = "0xceCcE0EB9DD2Ef7996e01e25DD70e461F918A14b"
 MAX_UINT256 = Web3.to_int(hexstr="0xffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff")
 
 
-with open("modules/abi/hypurrfi_pool_abi.json") as f:
-    POOL_ABI = json.load(f)
-with open("modules/abi/UiPoolDataProviderV3.json") as f:
-    UI_POOL_DATA_PROVIDER_ABI = json.load(f)
-with open("modules/abi/HyFiProtocolDataProvider.json") as f:
-    PROTOCOL_DATA_PROVIDER_ABI = json.load(f)
-with open("modules/abi/erc20_abi.json") as f:
-    ERC20_ABI = json.load(f)
+_ABI_FILES = {
+    "POOL_ABI": "hypurrfi_pool_abi.json",
+    "UI_POOL_DATA_PROVIDER_ABI": "UiPoolDataProviderV3.json",
+    "PROTOCOL_DATA_PROVIDER_ABI": "HyFiProtocolDataProvider.json",
+    "ERC20_ABI": "erc20_abi.json",
+}
 
 
-# supported_asset_addrs = ["0x5555555555555555555555555555555555555555", "0x94e8396e0869c9F2200760aF0621aFd240E1CF38", "0xca79db4B49f608eF54a5CB813FbEd3a6387bC645", "0x9FDBdA0A5e284c32744D2f17Ee5c74B284993463", "0xBe6727B535545C67d5cAa73dEa54865B92CF7907","0x5d3a1Ff2b6BAb83b63cd9AD0787074081a52ef34", "0x02c6a2fA58cC01A18B8D9E00eA48d65E4dF26c70", "0xB8CE59FC3717ada4C02eaDF9682A9e934F625ebb", "0xb50A96253aBDF803D85efcDce07Ad8becBc52BD5", "0x068f321Fa8Fb9f0D135f290Ef6a3e2813e1c8A29", "0xfD739d4e423301CE9385c1fb8850539D657C296D", "0xf4D9235269a96aaDaFc9aDAe454a0618eBE37949", "0xfDD22Ce6D1F66bc0Ec89b20BF16CcB6670F55A5a", "0x211Cc4DD073734dA055fbF44a2b4667d5E5fE5d2"]
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
-if not w3.is_connected():
-    w3 = Web3(Web3.HTTPProvider("https://hyperliquid.drpc.org"))
-    if not w3.is_connected():
-        raise ConnectionError("Failed to connect to Web3 provider")
+def __getattr__(name):
+    # ABIs are read from modules/abi on first access
+    if name in _ABI_FILES:
+        return load_abi(_ABI_FILES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-pool = w3.eth.contract(address=POOL_ADDRESS, abi=POOL_ABI)
-ui_pool = w3.eth.contract(address=UI_POOL_DATA_PROVIDER_V3_ADDRESS, abi=UI_POOL_DATA_PROVIDER_ABI)
-protocol_data = w3.eth.contract(address=PROTOCOL_DATA_PROVIDER_ADDRESS, abi=PROTOCOL_DATA_PROVIDER_ABI)
 
-def fetch_reserves():
-    reserves = ui_pool.functions.getReservesList(POOL_ADDRESSES_PROVIDER).call()
-    results = []
+# supported_asset_addrs = ["0x5555555555555555555555555555555555555555", "0x94e8396e0869c9F2200760aF0621aFd240E1CF38", "0xca79db4B49f608eF54a5CB813FbEd3a6387bC645", "0x9FDBdA0A5e284c32744D2f17Ee5c74B284993463", "0xBe6727B535545C67d5cAa73dEa54865B92CF7907","0x5d3a1Ff2b6BAb83b63cd9AD0787074081a52ef34", "0x02c6a2fA58cC01A18B8D9E00eA48d65E4dF26c70", "0xB8CE59FC3717ada4C02eaDF9682A9e934F625ebb", "0xb50A96253aBDF803D85efcDce07Ad8becBc52BD5", "0x068f321Fa8Fb9f0D135f290Ef6a3e2813e1c8A29", "0xfD739d4e423301CE9385c1fb8850539D657C296D", "0xf4D9235269a96aaDaFc9aDAe454a0618eBE37949", "0xfDD22Ce6D1F66bc0Ec89b20BF16CcB6670F55A5a", "0x211Cc4DD073734dA055fbF44a2b4667d5E5fE5d2"]
+# provider and contracts are built on first use; importing this module does no I/O
+w3 = lazy(get_w3)
+
+pool = lazy(lambda: w3.eth.contract(address=POOL_ADDRESS, abi=load_abi("hypurrfi_pool_abi.json")))
+ui_pool = lazy(lambda: w3.eth.contract(address=UI_POOL_DATA_PROVIDER_V3_ADDRESS, abi=load_abi("UiPoolDataProviderV3.json")))
+protocol_data = lazy(lambda: w3.eth.contract(address=PROTOCOL_DATA_PROVIDER_ADDRESS, abi=load_abi("HyFiProtocolDataProvider.json")))
+
+def _struct_fields(fn_name):
+    for item in ui_pool.abi:
+        if item.get("type") == "function" and item.get("name") == fn_name:
+            return [c["name"] for c in item["outputs"][0]["components"]]
+    raise ValueError(f"{fn_name} not in UiPoolDataProvider ABI")
+
+def _decode_reserves_data(raw):
+    fields = _struct_fields("getReservesData")
+    reserves = {}
+    for item in raw[0]:
+        r = dict(zip(fields, item))
+        reserves[Web3.to_checksum_address(r["underlyingAsset"])] = r
+    return reserves
+
+def fetch_reserves_data():
+    """{asset: getReservesData struct} (LTV, liquidation threshold, oracle price...) in one read."""
+    return _decode_reserves_data(snapshot.read(ui_pool.functions.getReservesData(POOL_ADDRESSES_PROVIDER)))
+
+def _reserve_entry(r):
+    """getReservesData struct -> reserve entry (rates in %, LTV and liquidation threshold as fractions)."""
+    return {
+        "asset": Web3.to_checksum_address(r["underlyingAsset"]),
+        "symbol": r["symbol"],
+        "decimals": int(r["decimals"]),
+        "liquidity_rate_%": int(r["liquidityRate"]) / 1e25,
+        "variable_borrow_rate_%": int(r["variableBorrowRate"]) / 1e25,
+        "ltv": int(r["baseLTVasCollateral"]) / 10000,
+        "liquidation_threshold": int(r["reserveLiquidationThreshold"]) / 10000,
+        "liquidation_bonus": int(r["reserveLiquidationBonus"]) / 10000,
+        "collateral_enabled": bool(r["usageAsCollateralEnabled"]),
+        "borrowing_enabled": bool(r["borrowingEnabled"]),
+        "is_active": bool(r["isActive"]),
+        "is_frozen": bool(r["isFrozen"]),
+        "available_liquidity": int(r["availableLiquidity"]),
+        "price": int(r["priceInMarketReferenceCurrency"]),
+    }
 
-    for asset in reserves:
-        try:
-            data = protocol_data.functions.getReserveData(asset).call()
-            liquidity_rate = data[5] / 1e25
-            variable_borrow_rate = data[6] / 1e25
-        except Exception as e:
-            print(f"[ERR] {asset}: {e}")
+def _shape_reserves(reserves, datas):
+    # per-asset fallback: (getReserveData, getReserveConfigurationData) per reserve
+    results = []
+    for i, asset in enumerate(reserves):
+        data, config = datas[2 * i], datas[2 * i + 1]
+        if data is None or config is None:
+            print(f"[ERR] {asset}: getReserveData reverted")
             continue
 
-        token = w3.eth.contract(address=asset, abi=ERC20_ABI)
-        try:
-            symbol = token.functions.symbol().call()
-            decimals = token.functions.decimals().call()
-        except Exception:
-            symbol, decimals = "UNKNOWN", 18
-
+        # (decimals, ltv, liquidationThreshold, liquidationBonus, reserveFactor, usageAsCollateralEnabled,
+        #  borrowingEnabled, stableBorrowRateEnabled, isActive, isFrozen)
         results.append({
             "asset": asset,
-            "symbol": symbol,
-            "decimals": decimals,
-            "liquidity_rate_%": liquidity_rate,
-            "variable_borrow_rate_%": variable_borrow_rate
+            "symbol": token_metadata.token_symbol(asset, "UNKNOWN"),
+            "decimals": int(config[0]),
+            "liquidity_rate_%": data[5] / 1e25,
+            "variable_borrow_rate_%": data[6] / 1e25,
+            "ltv": config[1] / 10000,
+            "liquidation_threshold": config[2] / 10000,
+            "liquidation_bonus": config[3] / 10000,
+            "collateral_enabled": bool(config[5]),
+            "borrowing_enabled": bool(config[6]),
+            "is_active": bool(config[8]),
+            "is_frozen": bool(config[9]),
+            "available_liquidity": None,
+            "price": None,
         })
-
     return results
 
-def build_tx(function, sender):
-    nonce = w3.eth.get_transaction_count(sender, "pending")
+def _per_asset_calls(reserves):
+    calls = []
+    for asset in reserves:
+        calls.append((protocol_data, "getReserveData", [asset]))
+        calls.append((protocol_data, "getReserveConfigurationData", [asset]))
+    return calls
+
+def fetch_reserves():
+    """Every reserve with rates and config (LTV, liquidation threshold, flags) from one getReservesData call."""
+    try:
+        return [_reserve_entry(r) for r in fetch_reserves_data().values()]
+    except Exception as e:
+        print(f"[WARN] getReservesData failed, reading reserves one by one: {e}")
+    return fetch_reserves_per_asset()
+
+def fetch_reserves_per_asset():
+    """fetch_reserves() without getReservesData: getReservesList, then two reads per reserve in one multicall (no prices)."""
+    reserves = snapshot.read(ui_pool.functions.getReservesList(POOL_ADDRESSES_PROVIDER))
+    # symbol/decimals come from the token metadata store (one multicall for any misses)
+    token_metadata.warm_tokens(reserves)
+    return _shape_reserves(reserves, multicall(_per_asset_calls(reserves), w3=w3))
+
+async def async_fetch_reserves(client=None):
+    async with client_scope(client) as c:
+        try:
+            raw = await c.call(ui_pool, "getReservesData", [POOL_ADDRESSES_PROVIDER])
+            return [_reserve_entry(r) for r in _decode_reserves_data(raw).values()]
+        except Exception as e:
+            print(f"[WARN] getReservesData failed, reading reserves one by one: {e}")
+        reserves = await c.call(ui_pool, "getReservesList", [POOL_ADDRESSES_PROVIDER])
+        await asyncio.to_thread(token_metadata.warm_tokens, reserves)
+        datas = await c.multicall(_per_asset_calls(reserves))
+    return _shape_reserves(reserves, datas)
+
+def build_tx(function, sender, nonce, fees=None):
+    # fees come from the per-block oracle and the nonce from a reservation: no RPC per transaction
     return function.build_transaction({
         "from": sender,
         "nonce": nonce,
         "gas": 500000,
-        "maxPriorityFeePerGas": w3.to_wei(1, "gwei"),
-        "maxFeePerGas": w3.eth.get_block("latest")["baseFeePerGas"] + w3.to_wei(1, "gwei"),
-        "chainId": w3.eth.chain_id
+        "chainId": CHAIN_ID,
+        **(fees or fee_params("eip1559"))
     })
 
 
-def sign_and_send(tx, private_key):
+def _broadcast(tx, private_key):
     try:
         signed = w3.eth.account.sign_transaction(tx, private_key)
         tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
         return tx_hash.hex()
     except Exception as e:
+        # the nonce was not used (or the local one is off): re-read it before the next tx
+        nonce_manager.resync(tx["from"])
         return e
 
+def send_sequence(functions, sender, private_key):
+    """
+    Build the contract calls on consecutive reserved nonces, simulate them as one sequence, then sign
+    and broadcast them in order while the sender's nonces are held. Returns the last hash, or the
+    error (SimulationError when a step would revert).
+    """
+    fees = fee_params("eip1559")
+    with nonce_manager.reserve_nonce(sender, len(functions)) as first:
+        txs = [build_tx(fn, sender, first + i, fees) for i, fn in enumerate(functions)]
+        results = simulation.simulate_sequence(txs)
+        failed = simulation.first_failure(results)
+        if failed is not None:
+            # nothing was signed: hand the nonces back
+            nonce_manager.release(sender, first, len(txs))
+            return simulation.SimulationError(f"step {failed + 1} would revert: {results[failed]['reason']}", results)
+        out = None
+        for tx in txs:
+            out = _broadcast(tx, private_key)
+            if isinstance(out, Exception):
+                return out
+        return out
+
+def sign_and_send(function, sender, private_key):
+    return send_sequence([function], sender, private_key)
+
+def _approve_fn(token_address, spender, amount):
+    token = w3.eth.contract(address=token_address, abi=load_abi("erc20_abi.json"))
+    return token.functions.approve(spender, amount)
+
 def approve_erc20(token_address, spender, amount, user_address, private_key):
-    token = w3.eth.contract(address=token_address, abi=ERC20_ABI)
-    tx = build_tx(token.functions.approve(spender, amount), user_address)
-    return sign_and_send(tx, private_key)
+    return sign_and_send(_approve_fn(token_address, spender, amount), user_address, private_key)
 
 def supply(asset, amount, user_address, private_key):
-    approve_erc20(asset, POOL_ADDRESS, amount, user_address, private_key)
-    time.sleep(2)
-    tx = build_tx(pool.functions.deposit(asset, amount, user_address, 0), user_address)
-    return sign_and_send(tx, private_key)
+    # approval and deposit are simulated together, then go out back to back on consecutive nonces
+    return send_sequence([
+        _approve_fn(asset, POOL_ADDRESS, amount),
+        pool.functions.deposit(asset, amount, user_address, 0),
+    ], user_address, private_key)
 
 def withdraw(asset, amount, user_address, private_key, to=None):
     if amount is None:
         amount = MAX_UINT256
     if to is None:
         to = user_address
-    tx = build_tx(pool.functions.withdraw(asset, amount, to), user_address)
-    return sign_and_send(tx, private_key)
+    return sign_and_send(pool.functions.withdraw(asset, amount, to), user_address, private_key)
 
 def borrow(asset, amount, user_address, private_key, interest_rate_mode=2):
-    tx = build_tx(pool.functions.borrow(asset, amount, interest_rate_mode, 0, user_address), user_address)
-    return sign_and_send(tx, private_key)
+    return sign_and_send(pool.functions.borrow(asset, amount, interest_rate_mode, 0, user_address), user_address, private_key)
 
 def repay(asset, amount, user_address, private_key, interest_rate_mode=2):
     repay_amount = amount if amount is not None else MAX_UINT256
-    approve_erc20(asset, POOL_ADDRESS, repay_amount, user_address, private_key)
-    time.sleep(2)
-    tx = build_tx(pool.functions.repay(asset, repay_amount, interest_rate_mode, user_address), user_address)
-    return sign_and_send(tx, private_key)
+    return send_sequence([
+        _approve_fn(asset, POOL_ADDRESS, repay_amount),
+        pool.functions.repay(asset, repay_amount, interest_rate_mode, user_address),
+    ], user_address, private_key)
 
 def get_user_account_data(user_address):
-    data = pool.functions.getUserAccountData(user_address).call()
-    return decimal_to_float({
-        "total_collateral": w3.from_wei(data[0], "ether"),
-        "total_debt": w3.from_wei(data[1], "ether"),
-        "available_borrow": w3.from_wei(data[2], "ether"),
-        "liquidation_threshold": data[3] / 100,
-        "ltv": data[4] / 100,
-        "health_factor": data[5] / 1e18
-    })
-
-def get_user_reserve_data(user_address, asset_address):
+    return HypurrFiAccountSummary.from_tuple(snapshot.read(pool.functions.getUserAccountData(user_address)))
 
-    data = protocol_data.functions.getUserReserveData(asset_address, user_address).call()
-    m =  {
-        "supplied_balance": Decimal(data[0]) / Decimal(1e18),
-        "stable_debt": Decimal(data[1]) / Decimal(1e18),
-        "variable_debt": Decimal(data[2]) / Decimal(1e18),
-        "usage_as_collateral": data[8]
-    }
-    return decimal_to_float(m)
-
-def get_full_user_portfolio(user_address):
-    reserves_list = protocol_data.functions.getAllReservesTokens().call()
-    token_map = {addr.lower(): symbol for (symbol, addr) in reserves_list}
-    portfolio_tokens = []
-    total_supplied = Decimal("0")
-    total_borrowed = Decimal("0")
+async def async_get_user_account_data(user_address, client=None):
+    async with client_scope(client) as c:
+        return HypurrFiAccountSummary.from_tuple(await c.call(pool, "getUserAccountData", [user_address]))
 
-    for _, token_addr in reserves_list:
-        try:
-            data = protocol_data.functions.getUserReserveData(token_addr, user_address).call()
-        except Exception as e:
-            print(f"Error fetching reserve data for {token_addr}: {e}")
+def get_user_reserve_data(user_address, asset_address):
+    data = snapshot.read(protocol_data.functions.getUserReserveData(asset_address, user_address))
+    return _reserve_position(_reserve_model(asset_address), data)
+
+def _portfolio_calls(reserves_list, user_address):
+    calls = [(protocol_data, "getUserReserveData", [token_addr, user_address]) for _, token_addr in reserves_list]
+    calls.append((pool, "getUserAccountData", [user_address]))
+    return calls
+
+def _reserve_model(asset, symbol=None):
+    # positions only need symbol and decimals; configs and prices come from fetch_reserves_data().
+    # unknown decimals raise: a guessed 18 would misprice every amount of the reserve
+    return Reserve(asset, symbol or token_metadata.token_symbol(asset, "UNKNOWN"), token_metadata.token_decimals(asset))
+
+def entry_reserve(e):
+    """fetch_reserves() entry -> Reserve (rates back to ray, fractions back to bps)."""
+    return Reserve(
+        asset=e["asset"],
+        symbol=e["symbol"],
+        decimals=e["decimals"],
+        ltv=round(e["ltv"] * 10000),
+        liquidation_threshold=round(e["liquidation_threshold"] * 10000),
+        liquidation_bonus=round(e["liquidation_bonus"] * 10000),
+        price=e["price"],
+        liquidity_rate=round(e["liquidity_rate_%"] * 1e25),
+        variable_borrow_rate=round(e["variable_borrow_rate_%"] * 1e25),
+        available_liquidity=e["available_liquidity"],
+        collateral_enabled=e["collateral_enabled"],
+        borrowing_enabled=e["borrowing_enabled"],
+        is_active=e["is_active"],
+        is_frozen=e["is_frozen"],
+    )
+
+def _reserve_models(reserves_list):
+    token_metadata.warm_tokens([addr for _, addr in reserves_list])
+    return {addr: _reserve_model(addr, symbol) for symbol, addr in reserves_list}
+
+def _reserve_position(reserve, data):
+    # (aBal, stableDebt, varDebt, principalStableDebt, scaledVarDebt, stableBorrowRate, liquidityRate, stableRateLastUpdated, usageAsCollateralEnabled)
+    return Position(
+        reserve, supplied=int(data[0]), stable_debt=int(data[1]), variable_debt=int(data[2]),
+        collateral=bool(data[8]) if len(data) > 8 else False,
+    )
+
+def _shape_portfolio(reserves_list, out, models=None):
+    models = models or _reserve_models(reserves_list)
+    positions = {}
+    for (_, token_addr), data in zip(reserves_list, out):
+        if data is None:
+            print(f"Error fetching reserve data for {token_addr}: getUserReserveData reverted")
             continue
+        pos = _reserve_position(models[token_addr], data)
+        if not pos.is_empty:
+            positions[token_addr] = pos
+
+    account_data = out[len(reserves_list)]
+    if account_data is None:
+        raise RuntimeError("Failed to fetch global account data: getUserAccountData reverted")
+    return Portfolio(positions, HypurrFiAccountSummary.from_tuple(account_data))
+
+def get_portfolios_bulk(addresses):
+    """
+    Portfolios for many wallets: one getAllReservesTokens read, then every user's
+    getUserReserveData per reserve and getUserAccountData in chunked multicalls.
+    Returns {address: get_full_user_portfolio() shape}, None for a wallet whose account read failed.
+    """
+    users = [Web3.to_checksum_address(a) for a in addresses]
+    if not users:
+        return {}
+    reserves_list = snapshot.read(protocol_data.functions.getAllReservesTokens())
+    calls = [c for user in users for c in _portfolio_calls(reserves_list, user)]
+    out = multicall(calls, w3=w3)
+    models = _reserve_models(reserves_list)
+    per_user = len(reserves_list) + 1
+    results = {}
+    for i, user in enumerate(users):
+        try:
+            results[user] = _shape_portfolio(reserves_list, out[i * per_user:(i + 1) * per_user], models)
+        except RuntimeError as e:
+            print(f"[ERR] {user}: {e}")
+            results[user] = None
+    return results
 
-        currentATokenBalance = Decimal(data[0]) / Decimal(1e18)
-        currentStableDebt = Decimal(data[1]) / Decimal(1e18)
-        currentVariableDebt = Decimal(data[2]) / Decimal(1e18)
-        usageAsCollateral = bool(data[8]) if len(data) > 8 else False
-
-        if currentATokenBalance > 0 or currentStableDebt > 0 or currentVariableDebt > 0:
-            portfolio_tokens.append({
-                "symbol": token_map.get(token_addr.lower(), token_addr),
-                "supplied": str(currentATokenBalance.quantize(Decimal("1.000000"), rounding="ROUND_DOWN")),
-                "borrowed": str((currentStableDebt + currentVariableDebt).quantize(Decimal("1.000000"), rounding="ROUND_DOWN")),
-                "collateral": usageAsCollateral,
-                "raw_supplied": currentATokenBalance,
-                "raw_borrowed": currentStableDebt + currentVariableDebt
-            })
-
-        total_supplied += currentATokenBalance
-        total_borrowed += currentStableDebt + currentVariableDebt
-
-    try:
-        account_data = pool.functions.getUserAccountData(user_address).call()
-    except Exception as e:
-        raise RuntimeError(f"Failed to fetch global account data: {e}")
-
-    total_collateral = Decimal(account_data[0]) / Decimal(1e18)
-    total_debt = Decimal(account_data[1]) / Decimal(1e18)
-    available_borrow = Decimal(account_data[2]) / Decimal(1e18)
-    liquidation_threshold = Decimal(account_data[3]) / Decimal(100)
-    ltv = Decimal(account_data[4]) / Decimal(100)
-    health_factor = Decimal(account_data[5]) / Decimal(1e18) if account_data[5] else Decimal("0")
-
-    return {
-        "tokens": portfolio_tokens,
-        "total_collateral": str(total_collateral),
-        "total_debt": str(total_debt),
-        "available_borrow": str(available_borrow),
-        "ltv": float(ltv),
-        "liq_threshold": float(liquidation_threshold),
-        "health_factor": str(health_factor),
-        "raw": {
-            "total_collateral": total_collateral,
-            "total_debt": total_debt,
-            "available_borrow": available_borrow,
-            "ltv": ltv,
-            "liq_threshold": liquidation_threshold,
-            "health_factor": health_factor
-        }
-    }
+def get_full_user_portfolio(user_address):
+    """
+    Every non-empty reserve position ("positions", {asset: Position}) and the account data
+    ("account", HypurrFiAccountSummary) of one wallet as a Portfolio,
+    from one getAllReservesTokens read and one multicall.
+    """
+    user = Web3.to_checksum_address(user_address)
+    portfolio = get_portfolios_bulk([user])[user]
+    if portfolio is None:
+        raise RuntimeError("Failed to fetch global account data: getUserAccountData reverted")
+    return portfolio
+
+async def async_get_full_user_portfolio(user_address, client=None, reserves_list=None):
+    """Async get_full_user_portfolio(); pass `reserves_list` when gathering many wallets."""
+    async with client_scope(client) as c:
+        if reserves_list is None:
+            reserves_list = await c.call(protocol_data, "getAllReservesTokens")
+        out = await c.multicall(_portfolio_calls(reserves_list, user_address))
+    models = await asyncio.to_thread(_reserve_models, reserves_list)
+    return _shape_portfolio(reserves_list, out, models)
 
 def analyze_portfolio_actions(portfolio):
-    raw = portfolio["raw"]
-    total_collateral = raw["total_collateral"]
-    total_debt = raw["total_debt"]
-    available_borrow = raw["available_borrow"]
-    liq_threshold = raw["liq_threshold"]
-    ltv = raw["ltv"]
-    health_factor = raw["health_factor"]
+    account = portfolio["account"]
+    # base currency (8 decimals) and bps, as getUserAccountData returns them
+    total_collateral = account.total_collateral / 1e8
+    total_debt = account.total_debt / 1e8
+    available_borrow = account.available_borrows / 1e8
+    liq_threshold = account.liquidation_threshold / 10000
+    ltv = account.ltv / 10000
 
     actions = {}
     max_withdrawable = (total_collateral * ltv) - total_debt
-    actions["max_withdrawable"] = str(max_withdrawable if max_withdrawable > 0 else Decimal("0"))
-    actions["max_borrowable"] = str(available_borrow if available_borrow > 0 else Decimal("0"))
+    actions["max_withdrawable"] = max(max_withdrawable, 0.0)
+    actions["max_borrowable"] = max(available_borrow, 0.0)
 
+    actions["recommended_repay"] = 0.0
     if total_debt > 0:
-        target_hf = Decimal("2.0")
-        if health_factor < target_hf and liq_threshold > 0:
+        target_hf = 2.0
+        if account.health_factor < target_hf and liq_threshold > 0:
             debt_target = (total_collateral * liq_threshold) / target_hf
-            repay_amount = total_debt - debt_target if total_debt > debt_target else Decimal("0")
-            actions["recommended_repay"] = str(repay_amount)
-        else:
-            actions["recommended_repay"] = "0"
-    else:
-        actions["recommended_repay"] = "0"
-
-    dust_tokens = [t["symbol"] for t in portfolio["tokens"] if t["raw_borrowed"] > 0 and t["raw_borrowed"] < Decimal("0.000001")]
-    actions["dust_tokens"] = dust_tokens
+            actions["recommended_repay"] = max(total_debt - debt_target, 0.0)
 
+    actions["dust_tokens"] = [p.symbol for p in portfolio["positions"].values() if 0 < p.debt_amount < 0.000001]
     return actions
 
-def decimal_to_float(obj):
-    if isinstance(obj, dict):
-        return {k: decimal_to_float(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [decimal_to_float(i) for i in obj]
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    else:
-        return obj
-    
-
-def get_user_reserve_data_full(address):
-    port = {}
-    asset_addrs = ["0x5555555555555555555555555555555555555555", "0x94e8396e0869c9F2200760aF0621aFd240E1CF38", "0xca79db4B49f608eF54a5CB813FbEd3a6387bC645", "0x9FDBdA0A5e284c32744D2f17Ee5c74B284993463", "0xBe6727B535545C67d5cAa73dEa54865B92CF7907","0x5d3a1Ff2b6BAb83b63cd9AD0787074081a52ef34", "0x02c6a2fA58cC01A18B8D9E00eA48d65E4dF26c70", "0xB8CE59FC3717ada4C02eaDF9682A9e934F625ebb", "0xb50A96253aBDF803D85efcDce07Ad8becBc52BD5", "0x068f321Fa8Fb9f0D135f290Ef6a3e2813e1c8A29", "0xfD739d4e423301CE9385c1fb8850539D657C296D", "0xf4D9235269a96aaDaFc9aDAe454a0618eBE37949", "0xfDD22Ce6D1F66bc0Ec89b20BF16CcB6670F55A5a", "0x211Cc4DD073734dA055fbF44a2b4667d5E5fE5d2"]
-
-    for i in asset_addrs:
-        data = protocol_data.functions.getUserReserveData(i, address).call()
-        m =  {
-            "supplied_balance": Decimal(data[0]) / Decimal(1e18),
-            "stable_debt": Decimal(data[1]) / Decimal(1e18),
-            "variable_debt": Decimal(data[2]) / Decimal(1e18),
-            "usage_as_collateral": data[8]
-        }
-        if m['supplied_balance'] > 0 or m['stable_debt'] or m['variable_debt'] > 0:
-            port[i] = decimal_to_float(m)
+def get_user_reserve_data_full(address, portfolio=None):
+    """{asset: Position} for every reserve with a position (every reserve in one multicall)."""
+    port = dict((portfolio or get_full_user_portfolio(address))["positions"])
     if port == {}:
-        return {'0x2222222222222222222222222222222222222222': {'supplied_balance': 0.0, 'stable_debt': 0.0, 'variable_debt': 0.0, 'usage_as_collateral': True}}
+        return {NATIVE_ASSET: Position(_reserve_model(NATIVE_ASSET), collateral=True)}
     return port
 
 if __name__ == "__main__":
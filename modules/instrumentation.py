@@ -0,0 +1,251 @@
+"""
+RPC / HTTP call instrumentation.
+- every pooled session (Web3 providers, GlueX, LiFi, deBridge, HyperLend API) records each
+  request: JSON-RPC method (or "GET host/path" for plain HTTP), latency histogram,
+  bytes sent/received and errors
+- counters are tagged with the high-level operation in progress (contextvar), set with
+  `with operation("show_balance"):` or the @tagged decorator
+- metrics() for in-process use, dump_metrics() for a text report
+
+    with operation("fetch_all_data"):
+        froghop.fetch_all_data(pk)
+    print(dump_metrics("fetch_all_data"))
+"""
+
+import json
+import time
+import threading
+import functools
+import contextvars
+from urllib.parse import urlsplit
+
+import requests
+
+
+UNTAGGED = "untagged"
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_operation = contextvars.ContextVar("operation", default=UNTAGGED)
+_lock = threading.Lock()
+_metrics = {}   # (operation, key) -> CallMetric
+
+
+class CallMetric:
+
+    __slots__ = ("calls", "batched", "errors", "total_latency", "max_latency", "histogram", "bytes_out", "bytes_in")
+
+    def __init__(self):
+        self.calls = 0
+        self.batched = 0      # calls that rode inside a JSON-RPC batch (no latency of their own)
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def observe(self, latency, bytes_out, bytes_in, error):
+        self.calls += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        ms = latency * 1000
+        i = 0
+        while i < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[i]:
+            i += 1
+        self.histogram[i] += 1
+        self.bytes_out += bytes_out
+        self.bytes_in += bytes_in
+        self.errors += int(error)
+
+    def as_dict(self):
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "calls": self.calls,
+            "batched": self.batched,
+            "errors": self.errors,
+            "avg_ms": round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_latency * 1000, 1),
+            "histogram": dict(zip(labels, self.histogram)),
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+        }
+
+
+# ----------------------------
+# operation tags
+# ----------------------------
+def current_operation():
+    return _operation.get()
+
+
+class operation:
+    """Tag every call made inside the block (including async tasks it starts) with `name`."""
+
+    def __init__(self, name):
+        self.name = name
+        self._token = None
+
+    def __enter__(self):
+        self._token = _operation.set(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _operation.reset(self._token)
+        return False
+
+
+def tagged(name=None):
+    """Decorator form of operation(); defaults to the function name."""
+    def deco(fn):
+        tag = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with operation(tag):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def run_in_context(fn, *args, **kwargs):
+    """Callable for executor.submit() that keeps the caller's operation tag in the worker thread."""
+    ctx = contextvars.copy_context()
+    return functools.partial(ctx.run, fn, *args, **kwargs)
+
+
+# ----------------------------
+# recording
+# ----------------------------
+def _metric(op, key):
+    m = _metrics.get((op, key))
+    if m is None:
+        m = _metrics[(op, key)] = CallMetric()
+    return m
+
+
+def rpc_methods(payload):
+    """JSON-RPC method names in a request body (dict, list, bytes or str); [] for non-RPC bodies."""
+    if isinstance(payload, (bytes, str)):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return []
+    items = payload if isinstance(payload, list) else [payload]
+    return [item.get("method") for item in items if isinstance(item, dict) and item.get("method")]
+
+
+def rpc_errors(content):
+    """
+    Errored JSON-RPC responses in a response body: 1 for an object with a non-null "error", the
+    number of such entries for a batch list, 0 otherwise (including non-JSON bodies).
+    """
+    # cheap pre-check: most responses carry no error and are not parsed twice
+    if b'"error"' not in content:
+        return 0
+    try:
+        payload = json.loads(content)
+    except ValueError:
+        return 0
+    items = payload if isinstance(payload, list) else [payload]
+    return sum(1 for item in items if isinstance(item, dict) and item.get("error") is not None)
+
+
+def _size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return len(json.dumps(body))
+
+
+def record(url, http_method, body, latency, bytes_in=0, error=False):
+    """Record one HTTP request under the current operation; `error` is a flag or an error count."""
+    methods = rpc_methods(body) if body is not None else []
+    if not methods:
+        parts = urlsplit(url)
+        key = f"{http_method.upper()} {parts.hostname}{parts.path}"
+    elif len(methods) == 1:
+        key = methods[0]
+    else:
+        key = f"batch[{len(methods)}]"
+    op = current_operation()
+    bytes_out = _size(body)
+    with _lock:
+        _metric(op, key).observe(latency, bytes_out, bytes_in, error)
+        if len(methods) > 1:
+            for method in methods:
+                _metric(op, method).batched += 1
+
+
+class InstrumentedSession(requests.Session):
+
+    def request(self, method, url, *args, **kwargs):
+        body = kwargs.get("json")
+        if body is None:
+            body = kwargs.get("data")
+        started = time.perf_counter()
+        try:
+            resp = super().request(method, url, *args, **kwargs)
+        except Exception:
+            record(url, method, body, time.perf_counter() - started, error=True)
+            raise
+        content = resp.content
+        # JSON-RPC errors come back as HTTP 200 with an "error" member (per entry in a batch)
+        error = 1 if resp.status_code >= 400 else rpc_errors(content)
+        record(url, method, body, time.perf_counter() - started, len(content), error)
+        return resp
+
+
+# ----------------------------
+# reading
+# ----------------------------
+def metrics(op=None):
+    """{operation: {method: stats}}, or {method: stats} for a single operation."""
+    with _lock:
+        snapshot = {k: m.as_dict() for k, m in _metrics.items()}
+    out = {}
+    for (o, key), stats in snapshot.items():
+        out.setdefault(o, {})[key] = stats
+    if op is not None:
+        return out.get(op, {})
+    return out
+
+
+def operation_totals():
+    """Per operation: HTTP requests, logical calls (batched RPC calls counted individually), errors, bytes."""
+    totals = {}
+    for op, methods in metrics().items():
+        t = totals.setdefault(op, {"requests": 0, "calls": 0, "errors": 0, "bytes_out": 0, "bytes_in": 0})
+        for key, s in methods.items():
+            t["requests"] += s["calls"]
+            t["calls"] += s["batched"] + (s["calls"] if not key.startswith("batch[") else 0)
+            t["errors"] += s["errors"]
+            t["bytes_out"] += s["bytes_out"]
+            t["bytes_in"] += s["bytes_in"]
+    return totals
+
+
+def reset():
+    with _lock:
+        _metrics.clear()
+
+
+def dump_metrics(op=None):
+    lines = []
+    totals = operation_totals()
+    for o, methods in sorted(metrics().items()):
+        if op is not None and o != op:
+            continue
+        t = totals[o]
+        lines.append(
+            f"[{o}] {t['requests']} requests, {t['calls']} calls, {t['errors']} errors, "
+            f"{t['bytes_out']} B out / {t['bytes_in']} B in"
+        )
+        for key, s in sorted(methods.items(), key=lambda kv: -kv[1]["calls"]):
+            hist = " ".join(f"{label}:{n}" for label, n in s["histogram"].items() if n)
+            batched = f" (+{s['batched']} batched)" if s["batched"] else ""
+            lines.append(
+                f"  {key:<40} {s['calls']:>5}{batched} err {s['errors']} "
+                f"avg {s['avg_ms']}ms max {s['max_ms']}ms | {hist}"
+            )
+    return "\n".join(lines) if lines else "No calls recorded"
@@ -0,0 +1,65 @@
+"""
+Lazy module-level resources.
+- load_abi / load_json: package-relative data files, read once on first use
+- lazy(factory): proxy that builds its object (Web3, contract...) on first attribute access,
+  so importing a module never touches the network or the filesystem
+"""
+
+import os
+import json
+import threading
+from functools import lru_cache
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(PACKAGE_DIR)
+ABI_DIR = os.path.join(PACKAGE_DIR, "abi")
+
+
+@lru_cache(maxsize=None)
+def load_abi(name):
+    with open(os.path.join(ABI_DIR, name)) as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def load_json(name):
+    """JSON data file at the repository root (e.g. lifi_list.json)."""
+    with open(os.path.join(REPO_DIR, name)) as f:
+        return json.load(f)
+
+
+class LazyObject:
+
+    __slots__ = ("_factory", "_obj", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._obj = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        obj = self._obj
+        if obj is None:
+            with self._lock:
+                if self._obj is None:
+                    self._obj = self._factory()
+                obj = self._obj
+        return obj
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __repr__(self):
+        if self._obj is None:
+            return f"<lazy {getattr(self._factory, '__name__', 'object')} (not built)>"
+        return repr(self._obj)
+
+
+def lazy(factory):
+    return LazyObject(factory)
+
+
+def unwrap(obj):
+    """The real object behind a lazy proxy (for isinstance checks / identity)."""
+    return obj._get() if isinstance(obj, LazyObject) else obj
@@ -0,0 +1,284 @@
+"""
+Compact models shared by the HyperLend and HypurrFi adapters.
+- Reserve: config, rates and oracle price of one pool reserve (one instance per reserve and
+  read, shared by every position on it)
+- Position: one wallet's balances on one reserve, wei kept as integers; token amounts and
+  rates are only computed when asked for
+- AccountSummary: getUserAccountData as integers (base currency, bps, WAD health factor)
+- HypurrFiAccountSummary / Portfolio: the same data for HypurrFi, whose old dicts used other keys
+
+Positions, summaries and portfolios still answer the dict keys the adapters used to return
+(pos["supplied"], pos.get("walletBalance"), pos["supplied_balance"], acc["healthFactorRaw"],
+acc["health_factor"], portfolio["tokens"]...), so callers can move to attributes one at a time.
+"""
+
+from decimal import Decimal, ROUND_DOWN
+
+RAY = 10 ** 27
+WAD = 10 ** 18
+BASE_UNIT = 10 ** 8    # market reference currency (USD, 8 decimals)
+NATIVE_ASSET = "0x2222222222222222222222222222222222222222"
+
+
+def ray_to_percent(ray_val):
+    return ray_val / RAY * 100.0
+
+
+class _LegacyKeys:
+    """dict-style read access through a {key: getter} table; None reads as a missing key."""
+
+    __slots__ = ()
+    _LEGACY = {}
+
+    def __getitem__(self, key):
+        getter = self._LEGACY.get(key)
+        value = getter(self) if getter is not None else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        getter = self._LEGACY.get(key)
+        value = getter(self) if getter is not None else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def as_dict(self):
+        return {k: v for k, v in ((k, g(self)) for k, g in self._LEGACY.items()) if v is not None}
+
+
+class Reserve:
+
+    __slots__ = ("asset", "symbol", "name", "decimals", "unit", "ltv", "liquidation_threshold", "liquidation_bonus",
+                 "price", "liquidity_rate", "variable_borrow_rate", "available_liquidity",
+                 "collateral_enabled", "borrowing_enabled", "is_active", "is_frozen", "a_token")
+
+    def __init__(self, asset, symbol, decimals, ltv=0, liquidation_threshold=0, price=0, name=None,
+                 liquidation_bonus=0, liquidity_rate=0, variable_borrow_rate=0, available_liquidity=None,
+                 collateral_enabled=True, borrowing_enabled=True, is_active=True, is_frozen=False, a_token=None):
+        self.asset = asset
+        self.symbol = symbol
+        self.name = name
+        self.decimals = decimals
+        self.unit = 10 ** decimals
+        self.ltv = ltv                                        # bps
+        self.liquidation_threshold = liquidation_threshold    # bps
+        self.liquidation_bonus = liquidation_bonus            # bps
+        self.price = price                                    # market reference currency units; None when unknown
+        self.liquidity_rate = liquidity_rate                  # ray
+        self.variable_borrow_rate = variable_borrow_rate      # ray
+        self.available_liquidity = available_liquidity
+        self.collateral_enabled = collateral_enabled
+        self.borrowing_enabled = borrowing_enabled
+        self.is_active = is_active
+        self.is_frozen = is_frozen
+        self.a_token = a_token                                # aToken address, when known
+
+    @classmethod
+    def from_struct(cls, r):
+        """UiPoolDataProviderV3.getReservesData entry (both pools expose the same struct)."""
+        from eth_utils import to_checksum_address
+        return cls(
+            asset=to_checksum_address(r["underlyingAsset"]),
+            symbol=r["symbol"],
+            name=r.get("name"),
+            decimals=int(r["decimals"]),
+            ltv=int(r["baseLTVasCollateral"]),
+            liquidation_threshold=int(r["reserveLiquidationThreshold"]),
+            liquidation_bonus=int(r["reserveLiquidationBonus"]),
+            price=int(r["priceInMarketReferenceCurrency"]),
+            liquidity_rate=int(r["liquidityRate"]),
+            variable_borrow_rate=int(r["variableBorrowRate"]),
+            available_liquidity=int(r["availableLiquidity"]),
+            collateral_enabled=bool(r["usageAsCollateralEnabled"]),
+            borrowing_enabled=bool(r["borrowingEnabled"]),
+            is_active=bool(r["isActive"]),
+            is_frozen=bool(r["isFrozen"]),
+            a_token=to_checksum_address(r["aTokenAddress"]) if r.get("aTokenAddress") else None,
+        )
+
+    @property
+    def supply_rate_pct(self):
+        return ray_to_percent(self.liquidity_rate)
+
+    @property
+    def borrow_rate_pct(self):
+        return ray_to_percent(self.variable_borrow_rate)
+
+    def amount(self, wei):
+        """wei -> token amount (float)."""
+        return wei / self.unit
+
+    def value(self, wei):
+        """wei -> market reference currency units, rounded down like the pools do."""
+        return wei * self.price // self.unit
+
+
+class Position(_LegacyKeys):
+
+    __slots__ = ("reserve", "supplied", "stable_debt", "variable_debt", "collateral", "wallet", "allowance")
+
+    def __init__(self, reserve, supplied=0, stable_debt=0, variable_debt=0, collateral=False, wallet=None, allowance=None):
+        self.reserve = reserve
+        self.supplied = supplied
+        self.stable_debt = stable_debt
+        self.variable_debt = variable_debt
+        self.collateral = collateral
+        self.wallet = wallet          # wallet balance (wei), None when not read
+        self.allowance = allowance    # allowance to the pool (wei), None when not read
+
+    @property
+    def asset(self):
+        return self.reserve.asset
+
+    @property
+    def symbol(self):
+        return self.reserve.symbol
+
+    @property
+    def decimals(self):
+        return self.reserve.decimals
+
+    @property
+    def debt(self):
+        return self.stable_debt + self.variable_debt
+
+    @property
+    def is_empty(self):
+        return not (self.supplied or self.stable_debt or self.variable_debt)
+
+    @property
+    def supplied_amount(self):
+        return self.supplied / self.reserve.unit
+
+    @property
+    def debt_amount(self):
+        return self.debt / self.reserve.unit
+
+    _LEGACY = {
+        # HyperLend position entry
+        "symbol": lambda p: p.reserve.symbol,
+        "name": lambda p: p.reserve.name,
+        "decimals": lambda p: p.reserve.decimals,
+        "supplied_raw": lambda p: p.supplied,
+        "supplied": lambda p: p.supplied / p.reserve.unit,
+        "stableDebt_raw": lambda p: p.stable_debt,
+        "stableDebt": lambda p: p.stable_debt / p.reserve.unit,
+        "variableDebt_raw": lambda p: p.variable_debt,
+        "variableDebt": lambda p: p.variable_debt / p.reserve.unit,
+        "usageAsCollateralEnabled": lambda p: p.collateral,
+        "market_liquidityRatePct": lambda p: p.reserve.supply_rate_pct,
+        "market_variableBorrowRatePct": lambda p: p.reserve.borrow_rate_pct,
+        "market_availableLiquidity": lambda p: p.reserve.available_liquidity,
+        "walletBalance_raw": lambda p: p.wallet,
+        "walletBalance": lambda p: p.wallet / p.reserve.unit if p.wallet is not None else None,
+        "allowanceToPool_raw": lambda p: p.allowance,
+        # HypurrFi get_user_reserve_data()
+        "supplied_balance": lambda p: p.supplied / p.reserve.unit,
+        "stable_debt": lambda p: p.stable_debt / p.reserve.unit,
+        "variable_debt": lambda p: p.variable_debt / p.reserve.unit,
+        "usage_as_collateral": lambda p: p.collateral,
+    }
+
+
+class AccountSummary(_LegacyKeys):
+
+    __slots__ = ("total_collateral", "total_debt", "available_borrows", "liquidation_threshold", "ltv", "health_factor_raw")
+
+    def __init__(self, total_collateral, total_debt, available_borrows, liquidation_threshold, ltv, health_factor_raw):
+        self.total_collateral = total_collateral      # base currency
+        self.total_debt = total_debt
+        self.available_borrows = available_borrows
+        self.liquidation_threshold = liquidation_threshold    # bps
+        self.ltv = ltv                                        # bps
+        self.health_factor_raw = health_factor_raw            # WAD; max uint256 without debt
+
+    @classmethod
+    def from_tuple(cls, ac):
+        """getUserAccountData() output."""
+        return cls(*(int(x) for x in ac[:6]))
+
+    @property
+    def health_factor(self):
+        return self.health_factor_raw / WAD
+
+    _LEGACY = {
+        # HyperLend account summary
+        "totalCollateralBase": lambda a: a.total_collateral,
+        "totalDebtBase": lambda a: a.total_debt,
+        "availableBorrowsBase": lambda a: a.available_borrows,
+        "currentLiquidationThreshold": lambda a: a.liquidation_threshold,
+        "ltv": lambda a: a.ltv,
+        "healthFactorRaw": lambda a: a.health_factor_raw,
+    }
+
+
+class HypurrFiAccountSummary(AccountSummary):
+    """AccountSummary answering the keys of hypurrfi.get_user_account_data()'s former dict."""
+
+    __slots__ = ()
+
+    _LEGACY = {
+        "total_collateral": lambda a: a.total_collateral / BASE_UNIT,
+        "total_debt": lambda a: a.total_debt / BASE_UNIT,
+        "available_borrow": lambda a: a.available_borrows / BASE_UNIT,
+        "liquidation_threshold": lambda a: a.liquidation_threshold / 100,    # percent
+        "ltv": lambda a: a.ltv / 100,                                        # percent
+        "health_factor": lambda a: a.health_factor,
+    }
+
+
+def _down6(wei, unit):
+    return str((Decimal(wei) / Decimal(unit)).quantize(Decimal("1.000000"), rounding=ROUND_DOWN))
+
+
+class Portfolio(_LegacyKeys):
+    """
+    One wallet on HypurrFi: non-empty positions ({asset: Position}) and its HypurrFiAccountSummary.
+    Also answers get_full_user_portfolio()'s former keys ("tokens", "total_collateral", "raw"...).
+    """
+
+    __slots__ = ("positions", "account")
+
+    def __init__(self, positions, account):
+        self.positions = positions
+        self.account = account
+
+    def tokens(self):
+        return [
+            {
+                "symbol": p.symbol,
+                "supplied": _down6(p.supplied, p.reserve.unit),
+                "borrowed": _down6(p.debt, p.reserve.unit),
+                "collateral": p.collateral,
+                "raw_supplied": p.supplied_amount,
+                "raw_borrowed": p.debt_amount,
+            }
+            for p in self.positions.values()
+        ]
+
+    def raw(self):
+        a = self.account
+        return {
+            "total_collateral": a["total_collateral"],
+            "total_debt": a["total_debt"],
+            "available_borrow": a["available_borrow"],
+            "ltv": a["ltv"],
+            "liq_threshold": a["liquidation_threshold"],
+            "health_factor": a["health_factor"],
+        }
+
+    _LEGACY = {
+        "positions": lambda p: p.positions,
+        "account": lambda p: p.account,
+        "tokens": lambda p: p.tokens(),
+        "total_collateral": lambda p: str(p.account["total_collateral"]),
+        "total_debt": lambda p: str(p.account["total_debt"]),
+        "available_borrow": lambda p: str(p.account["available_borrow"]),
+        "ltv": lambda p: p.account["ltv"],
+        "liq_threshold": lambda p: p.account["liquidation_threshold"],
+        "health_factor": lambda p: str(p.account["health_factor"]),
+        "raw": lambda p: p.raw(),
+    }
@@ -0,0 +1,263 @@
+"""
+Lending protocol adapters: one interface over the Aave v3 forks (HyperLend, HypurrFi).
+- snapshot_markets(): {asset: Reserve} from one getReservesData read, cached for MARKETS_TTL seconds;
+  when that read does not decode, from the protocol's fallback market source with prices from the
+  pool's AaveOracle (price None if the oracle cannot be read either)
+- snapshot_users(addresses): {address: {"positions": {asset: Position}, "account": AccountSummary}}
+  for many wallets in chunked multicalls (None for a wallet that could not be read)
+- prepare_tx(action, sender): unsigned [(label, tx)] for a supply / withdraw / borrow / repay
+  action, approval included, ready for simulation
+- send(private_key, action): sign and broadcast the action through the protocol module
+
+Actions are the dicts froghop plans with: {"type", "asset", "amount"}; amount None on withdraw and
+repay means everything. A further Aave v3 fork is one LendingProtocol subclass pointing at its
+module (POOL_ADDRESS, pool, fetch_reserves_data) with a fallback market source, plus an entry in PROTOCOLS.
+
+    for p in protocols():
+        markets = p.snapshot_markets()
+        users = p.snapshot_users(addresses)
+"""
+
+import os
+
+from eth_account import Account
+from eth_utils import to_checksum_address
+
+import modules.hyperlend as hyperlend
+import modules.hypurrfi as hypurrfi
+from modules.lending_models import Reserve
+from modules.ttl_cache import TTLCache
+from modules.simulation import call_tx
+from modules.rpc_manager import get_w3
+from modules.multicall import multicall
+from modules.lazy import load_abi
+
+
+MARKETS_TTL = float(os.getenv("LENDING_MARKETS_TTL", "30"))
+MARKETS_STALE = float(os.getenv("LENDING_MARKETS_STALE", "300"))
+
+ACTIONS = ("supply", "withdraw", "borrow", "repay")
+MAX_UINT256 = 2 ** 256 - 1
+VARIABLE_RATE = 2
+
+ADDRESSES_PROVIDER_ABI = [
+    {"inputs": [], "name": "getPriceOracle", "outputs": [{"internalType": "address", "name": "", "type": "address"}],
+     "stateMutability": "view", "type": "function"},
+]
+ORACLE_ABI = [
+    {"inputs": [{"internalType": "address[]", "name": "assets", "type": "address[]"}], "name": "getAssetsPrices",
+     "outputs": [{"internalType": "uint256[]", "name": "", "type": "uint256[]"}], "stateMutability": "view", "type": "function"},
+]
+
+
+def _erc20(token):
+    return get_w3().eth.contract(address=to_checksum_address(token), abi=load_abi("erc20_abi.json"))
+
+
+def _oracle_prices(provider, assets):
+    """{asset: price in market reference currency} from the pool's AaveOracle; {} when it cannot be read."""
+    w3 = get_w3()
+    provider = w3.eth.contract(address=to_checksum_address(provider), abi=ADDRESSES_PROVIDER_ABI)
+    oracle = multicall([(provider, "getPriceOracle", [])], w3=w3)[0]
+    if oracle is None:
+        return {}
+    oracle = w3.eth.contract(address=to_checksum_address(oracle), abi=ORACLE_ABI)
+    prices = multicall([(oracle, "getAssetsPrices", [list(assets)])], w3=w3)[0]
+    if prices is None:
+        return {}
+    return dict(zip(assets, (int(p) for p in prices)))
+
+
+class LendingProtocol:
+
+    name = None        # key in froghop actions and data ("lend", "fi")
+    key = None         # key in the bot's state and callbacks ("hyperlend", "hypurrfi")
+    label = None
+    module = None      # protocol module: POOL_ADDRESS, pool, fetch_reserves_data()
+    supply_fn = "supply"
+
+    def __init__(self):
+        self._markets = TTLCache(self._load_markets, ttl=MARKETS_TTL, stale_ttl=MARKETS_STALE, name=f"{self.key}_reserve_models")
+
+    @property
+    def pool_address(self):
+        return to_checksum_address(self.module.POOL_ADDRESS)
+
+    # -- data --
+
+    def _load_markets(self):
+        try:
+            return {asset: Reserve.from_struct(r) for asset, r in self.module.fetch_reserves_data().items()}
+        except Exception as e:
+            print(f"[WARN] {self.label}: getReservesData failed, using the fallback market source: {e}")
+        markets = self._fallback_markets()
+        try:
+            prices = _oracle_prices(self.addresses_provider(), list(markets))
+        except Exception as e:
+            print(f"[WARN] {self.label}: oracle prices unavailable: {e}")
+            prices = {}
+        for asset, reserve in markets.items():
+            reserve.price = prices.get(asset)
+        return markets
+
+    def _fallback_markets(self):
+        """{asset: Reserve} without prices, from a source that does not need getReservesData to decode."""
+        raise NotImplementedError
+
+    def addresses_provider(self):
+        raise NotImplementedError
+
+    def snapshot_markets(self, force=False):
+        """{asset: Reserve} (configs, rates, oracle prices) from one getReservesData read."""
+        return self._markets.get(force=force)
+
+    def invalidate_markets(self):
+        self._markets.invalidate()
+
+    def snapshot_users(self, addresses):
+        raise NotImplementedError
+
+    def position(self, address, asset):
+        """Current Position of one wallet on one reserve, or None."""
+        address = to_checksum_address(address)
+        snap = self.snapshot_users([address]).get(address)
+        return snap["positions"].get(to_checksum_address(asset)) if snap else None
+
+    def wallet_balance(self, asset, owner):
+        """Wallet balance of `owner` in `asset` (wei), e.g. for a "max" supply."""
+        return _erc20(asset).functions.balanceOf(to_checksum_address(owner)).call()
+
+    # -- transactions --
+
+    def prepare_tx(self, action, sender):
+        kind = action["type"]
+        if kind not in ACTIONS:
+            raise ValueError(f"{self.label}: unsupported action {kind!r}")
+        asset = to_checksum_address(action["asset"])
+        sender = to_checksum_address(sender)
+        amount = action.get("amount")
+        try:
+            reserve = self.snapshot_markets().get(asset)
+        except Exception:
+            reserve = None   # only names the step; the transaction does not need market data
+        label = f"{kind} {reserve.symbol if reserve else asset} ({self.name})"
+        pool = self.module.pool
+        if kind == "supply":
+            return [
+                (f"approve for {label}", call_tx(sender, (_erc20(asset), "approve", [self.pool_address, int(amount)]))),
+                (label, call_tx(sender, (pool, self.supply_fn, [asset, int(amount), sender, 0]))),
+            ]
+        if kind == "withdraw":
+            amount = MAX_UINT256 if amount is None else int(amount)
+            return [(label, call_tx(sender, (pool, "withdraw", [asset, amount, sender])))]
+        if kind == "borrow":
+            return [(label, call_tx(sender, (pool, "borrow", [asset, int(amount), VARIABLE_RATE, 0, sender])))]
+        amount = MAX_UINT256 if amount is None else int(amount)
+        return [
+            (f"approve for {label}", call_tx(sender, (_erc20(asset), "approve", [self.pool_address, amount]))),
+            (label, call_tx(sender, (pool, "repay", [asset, amount, VARIABLE_RATE, sender]))),
+        ]
+
+    def send(self, private_key, action):
+        """Sign and broadcast `action`; returns the transaction hash."""
+        raise NotImplementedError
+
+
+class HyperLend(LendingProtocol):
+
+    name = "lend"
+    key = "hyperlend"
+    label = "HyperLend"
+    module = hyperlend
+
+    def _fallback_markets(self):
+        # the HyperLend API, reserves it does not list read from chain (fetch_all_markets_combined)
+        markets = hyperlend.fetch_all_markets_combined()
+        reserves = {asset: hyperlend._reserve_model(m) for asset, m in markets.items()}
+        # the API may leave out liquidation thresholds: read those configs from the data provider
+        missing = [asset for asset, m in markets.items() if "liquidationThreshold" not in m]
+        if missing:
+            w3 = get_w3()
+            data_provider = w3.eth.contract(address=to_checksum_address(hyperlend.PROTOCOL_DATA_PROVIDER),
+                                            abi=load_abi("HyFiProtocolDataProvider.json"))
+            configs = multicall([(data_provider, "getReserveConfigurationData", [a]) for a in missing], w3=w3)
+            # (decimals, ltv, liquidationThreshold, liquidationBonus, reserveFactor, usageAsCollateralEnabled,
+            #  borrowingEnabled, stableBorrowRateEnabled, isActive, isFrozen)
+            for asset, cfg in zip(missing, configs):
+                if cfg is None:
+                    continue
+                r = reserves[asset]
+                r.ltv, r.liquidation_threshold, r.liquidation_bonus = int(cfg[1]), int(cfg[2]), int(cfg[3])
+                r.is_active, r.is_frozen = bool(cfg[8]), bool(cfg[9])
+        return reserves
+
+    def addresses_provider(self):
+        return hyperlend._addresses_provider()
+
+    def snapshot_users(self, addresses, include_wallet_balances=True, include_allowances=False):
+        return hyperlend.get_user_positions_bulk(addresses, include_wallet_balances, include_allowances)
+
+    def send(self, private_key, action):
+        kind, asset, amount = action["type"], action["asset"], action.get("amount")
+        if kind == "supply":
+            return hyperlend.supply_with_approve(private_key, asset, amount, approve_infinite=True)
+        if kind == "withdraw":
+            return hyperlend.withdraw(private_key, asset, MAX_UINT256 if amount is None else amount)
+        if kind == "borrow":
+            return hyperlend.borrow(private_key, asset, amount)
+        if kind == "repay":
+            return hyperlend.repay_with_approve(private_key, asset, amount, approve_infinite=True)
+        raise ValueError(f"{self.label}: unsupported action {kind!r}")
+
+
+class HypurrFi(LendingProtocol):
+
+    name = "fi"
+    key = "hypurrfi"
+    label = "HypurrFi"
+    module = hypurrfi
+    supply_fn = "deposit"
+
+    def _fallback_markets(self):
+        # getReservesList plus per-reserve getReserveData / getReserveConfigurationData
+        return {e["asset"]: hypurrfi.entry_reserve(e) for e in hypurrfi.fetch_reserves_per_asset()}
+
+    def addresses_provider(self):
+        return hypurrfi.POOL_ADDRESSES_PROVIDER
+
+    def snapshot_users(self, addresses):
+        return hypurrfi.get_portfolios_bulk(addresses)
+
+    def send(self, private_key, action):
+        kind, asset, amount = action["type"], to_checksum_address(action["asset"]), action.get("amount")
+        address = Account.from_key(private_key).address
+        if kind == "supply":
+            out = hypurrfi.supply(asset, amount, address, private_key)
+        elif kind == "withdraw":
+            out = hypurrfi.withdraw(asset, amount, address, private_key)
+        elif kind == "borrow":
+            out = hypurrfi.borrow(asset, amount, address, private_key)
+        elif kind == "repay":
+            out = hypurrfi.repay(asset, amount, address, private_key)
+        else:
+            raise ValueError(f"{self.label}: unsupported action {kind!r}")
+        # the hypurrfi senders hand errors back instead of raising
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+
+PROTOCOLS = {p.name: p for p in (HyperLend(), HypurrFi())}
+_BY_KEY = {p.key: p for p in PROTOCOLS.values()}
+
+
+def get_protocol(name):
+    """Adapter by short name ("lend") or bot key ("hyperlend")."""
+    protocol = PROTOCOLS.get(name) or _BY_KEY.get(name)
+    if protocol is None:
+        raise ValueError(f"Unknown lending protocol: {name!r}")
+    return protocol
+
+
+def protocols():
+    return list(PROTOCOLS.values())
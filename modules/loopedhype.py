@@ -1,9 +1,14 @@
 from web3 import Web3
 from decimal import Decimal
 import time
+from modules.rpc_manager import DEFAULT_HYPEREVM_RPC, get_w3
+from modules.rpc_batch import rpc_batch
+from modules.nonce_manager import reserve_nonce, release as release_nonce
+from modules.fee_oracle import fee_params
+from modules.simulation import preflight, SimulationError
 
 
-RPC_URL = "https://rpc.hyperliquid.xyz/evm"
+RPC_URL = DEFAULT_HYPEREVM_RPC
 KEEP_RESERVE_HYPE = Decimal("0.05")  # reserve HYPE for gas
 CCD_ADDRESS = Web3.to_checksum_address("0x6e358dd1204c3fb1D24e569DF0899f48faBE5337")
 VAULT_ADDRESS = Web3.to_checksum_address("0x5748ae796AE46A4F1348a1693de4b50560485562")
@@ -51,17 +56,24 @@ def human_wei(x):
 
 
 def convert_to_loop_hype(private_key: str, amount: float):
-    w3 = Web3(Web3.HTTPProvider(RPC_URL))
-    if not w3.is_connected():
-        return ("RPC unreachable: " + RPC_URL)
-
+    w3 = get_w3()
     acct = w3.eth.account.from_key(private_key)
     address = acct.address
-    chain_id = w3.eth.chain_id
+
+    # chain id and balance in one JSON-RPC batch; fees come from the per-block oracle and
+    # the nonce is handed out locally
+    try:
+        with rpc_batch() as batch:
+            chain_id_r = batch.chain_id()
+            balance_r = batch.get_balance(address)
+        chain_id = chain_id_r.result()
+        native_bal_wei = balance_r.result()
+        fees = fee_params("legacy")
+    except Exception:
+        return ("RPC unreachable: " + RPC_URL)
 
     ccd = w3.eth.contract(address=CCD_ADDRESS, abi=CCD_ABI)
 
-    native_bal_wei = w3.eth.get_balance(address)
     amount_wei = amount
     reserve_wei = int(KEEP_RESERVE_HYPE * (10 ** 18))
     if native_bal_wei < amount_wei + reserve_wei:
@@ -69,30 +81,32 @@ def convert_to_loop_hype(private_key: str, amount: float):
 
 
     fn = ccd.functions.depositNative(amount_wei, 0, address, b"")
-    nonce = w3.eth.get_transaction_count(address, "pending")
-    tx_base = {
-        "from": address,
-        "value": amount_wei,
-        "nonce": nonce,
-        "chainId": chain_id,
-        "gasPrice": w3.eth.gas_price,
-    }
-
-    try:
-        unsigned = fn.build_transaction({**tx_base})
-        estimated = w3.eth.estimate_gas(unsigned)
-        gas_limit = int(estimated * 1.15)
-    except Exception:
-        gas_limit = 600_000
-
-    unsigned = fn.build_transaction({**tx_base, "gas": gas_limit})
-    signed = w3.eth.account.sign_transaction(unsigned, acct.key)
-    txh = w3.eth.send_raw_transaction(signed.raw_transaction)
+    with reserve_nonce(address) as nonce:
+        tx_base = {
+            "from": address,
+            "value": amount_wei,
+            "nonce": nonce,
+            "chainId": chain_id,
+            **fees,
+        }
+
+        unsigned = fn.build_transaction({**tx_base, "gas": 0})
+        try:
+            gas_limit = int(preflight(unsigned) * 1.15)
+        except SimulationError as e:
+            release_nonce(address, nonce)
+            return f"Deposit would revert: {e}"
+        except Exception:
+            gas_limit = 600_000
+
+        unsigned = fn.build_transaction({**tx_base, "gas": gas_limit})
+        signed = w3.eth.account.sign_transaction(unsigned, acct.key)
+        txh = w3.eth.send_raw_transaction(signed.raw_transaction)
 
     return txh.hex()
 
 def get_lhype_balance(address: str):
-    w3 = Web3(Web3.HTTPProvider(RPC_URL))
+    w3 = get_w3()
     if not w3.is_connected():
         return ("RPC unreachable: " + RPC_URL)
 
@@ -0,0 +1,165 @@
+"""
+Multicall3 batch reads.
+- multicall([(contract, fn_name, args), ...]) -> decoded results in one eth_call per chunk
+- per-call failures come back as `default` instead of failing the whole batch
+- native balances can ride in the same batch via Multicall3.getEthBalance
+"""
+
+from eth_abi import decode
+from eth_utils import to_checksum_address
+from eth_utils.abi import collapse_if_tuple
+
+from modules import snapshot
+from modules.rpc_manager import get_w3
+
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+DEFAULT_CHUNK_SIZE = 150
+
+MULTICALL3_ABI = [
+    {"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},
+                              {"internalType":"bool","name":"allowFailure","type":"bool"},
+                              {"internalType":"bytes","name":"callData","type":"bytes"}],
+                "internalType":"struct Multicall3.Call3[]","name":"calls","type":"tuple[]"}],
+     "name":"aggregate3",
+     "outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},
+                               {"internalType":"bytes","name":"returnData","type":"bytes"}],
+                 "internalType":"struct Multicall3.Result[]","name":"returnData","type":"tuple[]"}],
+     "stateMutability":"payable","type":"function"},
+    {"inputs":[{"internalType":"address","name":"addr","type":"address"}],
+     "name":"getEthBalance","outputs":[{"internalType":"uint256","name":"balance","type":"uint256"}],
+     "stateMutability":"view","type":"function"},
+    {"inputs":[],"name":"getBlockNumber","outputs":[{"internalType":"uint256","name":"blockNumber","type":"uint256"}],
+     "stateMutability":"view","type":"function"},
+    {"inputs":[],"name":"getCurrentBlockTimestamp","outputs":[{"internalType":"uint256","name":"timestamp","type":"uint256"}],
+     "stateMutability":"view","type":"function"},
+]
+
+
+def multicall_contract(w3=None):
+    w3 = w3 or get_w3()
+    return w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+
+
+def native_balance_call(address, w3=None):
+    """Call spec reading the native HYPE balance of `address` inside a multicall batch."""
+    return (multicall_contract(w3), "getEthBalance", [to_checksum_address(address)])
+
+
+def _function_abi(contract, fn_name):
+    for item in contract.abi:
+        if item.get("type") == "function" and item.get("name") == fn_name:
+            return item
+    raise ValueError(f"Function {fn_name} not found in contract ABI")
+
+
+def _normalize(abi_out, value):
+    t = abi_out["type"]
+    if t.endswith("]"):
+        inner = dict(abi_out, type=t[:t.rindex("[")])
+        return [_normalize(inner, v) for v in value]
+    if t == "tuple":
+        return tuple(_normalize(c, v) for c, v in zip(abi_out["components"], value))
+    if t == "address":
+        return to_checksum_address(value)
+    return value
+
+
+def encode_call(call):
+    """(contract, fn_name, args) -> (target, calldata, outputs abi)."""
+    contract, fn_name = call[0], call[1]
+    args = list(call[2]) if len(call) > 2 and call[2] is not None else []
+    calldata = contract.encode_abi(fn_name, args=args)
+    return contract.address, calldata, _function_abi(contract, fn_name)["outputs"]
+
+
+def decode_result(outputs, data):
+    """Decode raw return data the same way ContractFunction.call() does."""
+    values = decode([collapse_if_tuple(o) for o in outputs], bytes(data))
+    values = [_normalize(o, v) for o, v in zip(outputs, values)]
+    if len(values) == 1:
+        return values[0]
+    return values
+
+
+def _call_single(call, block_identifier):
+    contract, fn_name = call[0], call[1]
+    args = list(call[2]) if len(call) > 2 and call[2] is not None else []
+    return contract.get_function_by_name(fn_name)(*args).call(block_identifier=block_identifier)
+
+
+def encode_chunk(chunk):
+    """Per-call output ABIs (None where encoding failed) and the aggregate3 payload."""
+    encoded = []
+    payload = []
+    for call in chunk:
+        try:
+            target, calldata, outputs = encode_call(call)
+        except Exception:
+            encoded.append(None)
+            continue
+        encoded.append(outputs)
+        payload.append((target, True, calldata))
+    return encoded, payload
+
+
+def decode_chunk(encoded, raw, default):
+    """Map aggregate3 (success, returnData) pairs back onto the calls of a chunk."""
+    out = []
+    it = iter(raw)
+    for outputs in encoded:
+        if outputs is None:
+            out.append(default)
+            continue
+        success, data = next(it)
+        if not success or not data:
+            out.append(default)
+            continue
+        try:
+            out.append(decode_result(outputs, data))
+        except Exception:
+            out.append(default)
+    return out
+
+
+def _run_chunk(mc, chunk, default, block_identifier):
+    encoded, payload = encode_chunk(chunk)
+    try:
+        raw = mc.functions.aggregate3(payload).call(block_identifier=block_identifier) if payload else []
+    except Exception:
+        # Multicall3 unavailable or the whole batch failed: degrade to one call each
+        out = []
+        for call, outputs in zip(chunk, encoded):
+            if outputs is None:
+                out.append(default)
+                continue
+            try:
+                out.append(_call_single(call, block_identifier))
+            except Exception:
+                out.append(default)
+        return out
+    return decode_chunk(encoded, raw, default)
+
+
+def run_multicall(calls, default=None, w3=None, block_identifier="latest", chunk_size=DEFAULT_CHUNK_SIZE):
+    calls = list(calls)
+    if not calls:
+        return []
+    mc = multicall_contract(w3)
+    results = []
+    for i in range(0, len(calls), chunk_size):
+        results.extend(_run_chunk(mc, calls[i:i + chunk_size], default, block_identifier))
+    return results
+
+
+def multicall(calls, default=None, w3=None, block_identifier="latest", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Execute read-only calls through Multicall3.aggregate3.
+    `calls` is a list of (contract, fn_name, args) tuples; results come back in the same
+    order, with `default` in place of any call that reverted or could not be decoded.
+    Inside an active snapshot() "latest" reads are pinned to the snapshot block and cached.
+    """
+    snap = snapshot.current() if block_identifier == "latest" else None
+    if snap is not None:
+        return snap.multicall(calls, default=default, w3=w3, chunk_size=chunk_size)
+    return run_multicall(calls, default, w3, block_identifier, chunk_size)
@@ -0,0 +1,152 @@
+"""
+Local nonce manager for HyperEVM senders.
+- nonces are handed out locally and sequentially per address, so several signed transactions
+  can be broadcast back to back without waiting for receipts (or re-reading the nonce) in between
+- the first nonce comes from eth_getTransactionCount(addr, "pending"); after RESYNC_AFTER seconds
+  without use the address is re-read and the node's count wins, so transactions sent from another
+  wallet app are picked up and nonces of dropped or replaced transactions are reused
+- any failure inside a reservation, any gap left by released nonces and any transaction whose
+  receipt timed out (receipt_tracker, sender=...) resyncs the address before its next transaction
+
+    with reserve_nonce(acct.address) as nonce:
+        tx = fn.build_transaction({"from": acct.address, "nonce": nonce, ...})
+        w3.eth.send_raw_transaction(acct.sign_transaction(tx).raw_transaction)
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from eth_utils import to_checksum_address
+
+from modules.rpc_manager import get_w3
+
+
+logger = logging.getLogger(__name__)
+
+RESYNC_AFTER = 30.0   # seconds an idle address keeps its local nonce before re-reading the node
+
+
+class _AddressState:
+
+    __slots__ = ("lock", "next", "used_at", "resyncs")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.next = None       # None: read from the node on next use
+        self.used_at = 0.0
+        self.resyncs = 0
+
+
+class NonceManager:
+
+    def __init__(self, w3=None, resync_after=RESYNC_AFTER):
+        self._w3 = w3
+        self.resync_after = resync_after
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, address):
+        state = self._states.get(address)
+        if state is None:
+            with self._lock:
+                state = self._states.setdefault(address, _AddressState())
+        return state
+
+    def _pending_count(self, address):
+        w3 = self._w3 if self._w3 is not None else get_w3()
+        return w3.eth.get_transaction_count(address, "pending")
+
+    def _sync(self, address, state):
+        now = time.monotonic()
+        if state.next is None:
+            state.next = self._pending_count(address)
+            state.resyncs += 1
+        elif now - state.used_at > self.resync_after:
+            # idle: the node may know about transactions sent from elsewhere, or have dropped ours
+            pending = self._pending_count(address)
+            if pending < state.next:
+                logger.info(f"{address}: node pending nonce {pending} below local {state.next}, resyncing")
+            state.next = pending
+            state.resyncs += 1
+        state.used_at = now
+
+    def allocate(self, address, count=1):
+        """Hand out `count` consecutive nonces and return the first."""
+        address = to_checksum_address(address)
+        state = self._state(address)
+        with state.lock:
+            self._sync(address, state)
+            first = state.next
+            state.next += count
+            return first
+
+    def release(self, address, nonce, count=1):
+        """Nonces [nonce, nonce + count) were never broadcast: reuse them, or resync if that leaves a gap."""
+        address = to_checksum_address(address)
+        state = self._state(address)
+        with state.lock:
+            if state.next == nonce + count:
+                state.next = nonce
+            else:
+                state.next = None
+
+    def resync(self, address):
+        """Forget the local nonce; the next allocation reads it from the node."""
+        address = to_checksum_address(address)
+        state = self._state(address)
+        with state.lock:
+            state.next = None
+
+    @contextmanager
+    def reserve(self, address, count=1):
+        """
+        Allocate `count` nonces and hold the address until the block exits, so concurrent
+        senders broadcast in nonce order. An exception resyncs the address.
+        """
+        address = to_checksum_address(address)
+        state = self._state(address)
+        with state.lock:
+            nonce = self.allocate(address, count)
+            try:
+                yield nonce
+            except Exception as e:
+                logger.warning(f"{address}: transaction with nonce {nonce} failed, resyncing: {e}")
+                state.next = None
+                raise
+
+    def status(self):
+        with self._lock:
+            states = dict(self._states)
+        return {addr: {"next": s.next, "resyncs": s.resyncs} for addr, s in states.items()}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_nonce_manager():
+    """Process-wide manager for the default HyperEVM endpoint pool."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = NonceManager()
+    return _manager
+
+
+def next_nonce(address):
+    return get_nonce_manager().allocate(address)
+
+
+def reserve_nonce(address, count=1):
+    return get_nonce_manager().reserve(address, count)
+
+
+def release(address, nonce, count=1):
+    get_nonce_manager().release(address, nonce, count)
+
+
+def resync(address):
+    get_nonce_manager().resync(address)
@@ -0,0 +1,308 @@
+"""
+Pool event indexer: tells which wallets' lending positions changed without rescanning every reserve.
+- pulls Supply / Withdraw / Borrow / Repay / LiquidationCall from the HyperLend and HypurrFi pools
+  and aToken Transfer logs with eth_getLogs, several block ranges per JSON-RPC batch, from a
+  per-protocol checkpoint block up to the head minus CONFIRMATIONS
+- keeps only logs touching watched wallets and stores per (protocol, user, asset) deltas in SQLite
+  (supplied / debt change since the wallet's last full read, event count, last block)
+- a wallet with deltas is "changed" until mark_clean() after it was rescanned; the deltas are
+  approximate (interest accrual is not an event) and only decide who needs a rescan
+
+    changed = pool_indexer.sync(addresses)
+    ...rescan `changed`...
+    pool_indexer.mark_clean(changed)
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+
+from eth_utils import keccak, to_checksum_address
+
+from modules.rpc_batch import rpc_batch
+from modules.lending_protocols import protocols
+
+
+DB_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "pool_index.db")
+)
+BLOCK_RANGE = int(os.getenv("POOL_INDEX_BLOCK_RANGE", "1000"))       # blocks per eth_getLogs
+RANGES_PER_BATCH = int(os.getenv("POOL_INDEX_RANGES_PER_BATCH", "5"))
+CONFIRMATIONS = int(os.getenv("POOL_INDEX_CONFIRMATIONS", "2"))
+MAX_CATCHUP = int(os.getenv("POOL_INDEX_MAX_CATCHUP", "50000"))      # further behind: skip ahead, rescan everyone
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
+def _topic(signature):
+    return "0x" + keccak(text=signature).hex()
+
+
+SUPPLY = _topic("Supply(address,address,address,uint256,uint16)")
+WITHDRAW = _topic("Withdraw(address,address,address,uint256)")
+BORROW = _topic("Borrow(address,address,address,uint256,uint8,uint256,uint16)")
+REPAY = _topic("Repay(address,address,address,uint256,bool)")
+LIQUIDATION_CALL = _topic("LiquidationCall(address,address,address,uint256,uint256,address,bool)")
+TRANSFER = _topic("Transfer(address,address,uint256)")
+POOL_TOPICS = [SUPPLY, WITHDRAW, BORROW, REPAY, LIQUIDATION_CALL, TRANSFER]
+
+logger = logging.getLogger(__name__)
+
+
+def _hex(value):
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value).hex()
+    value = str(value).lower()
+    return value if value.startswith("0x") else "0x" + value
+
+
+def _address(topic):
+    return "0x" + _hex(topic)[-40:]
+
+
+def _words(data):
+    data = _hex(data)[2:]
+    return [int(data[i:i + 64], 16) for i in range(0, len(data), 64)]
+
+
+def _int(value):
+    return value if isinstance(value, int) else int(value, 16)
+
+
+def decode_deltas(logs, a_tokens):
+    """
+    Pool / aToken logs -> [(user, asset, supplied delta, debt delta, block)], addresses lowercase.
+    aToken mints and burns are skipped (the pool event carries them), and so are aToken transfers
+    inside a liquidation (LiquidationCall carries the collateral change).
+    """
+    liquidation_txs = {_hex(log["transactionHash"]) for log in logs if _hex(log["topics"][0]) == LIQUIDATION_CALL}
+    out = []
+    for log in logs:
+        topics = [_hex(t) for t in log["topics"]]
+        sig = topics[0]
+        data = _words(log.get("data") or "0x")
+        block = _int(log["blockNumber"])
+        if sig == SUPPLY:
+            # topics: reserve, onBehalfOf, referralCode / data: user, amount
+            out.append((_address(topics[2]), _address(topics[1]), data[1], 0, block))
+        elif sig == WITHDRAW:
+            # topics: reserve, user, to / data: amount
+            out.append((_address(topics[2]), _address(topics[1]), -data[0], 0, block))
+        elif sig == BORROW:
+            # topics: reserve, onBehalfOf, referralCode / data: user, amount, rate mode, rate
+            out.append((_address(topics[2]), _address(topics[1]), 0, data[1], block))
+        elif sig == REPAY:
+            # topics: reserve, user, repayer / data: amount, useATokens
+            amount = data[0]
+            out.append((_address(topics[2]), _address(topics[1]), -amount if data[1] else 0, -amount, block))
+        elif sig == LIQUIDATION_CALL:
+            # topics: collateralAsset, debtAsset, user / data: debtToCover, liquidatedCollateral, liquidator, receiveAToken
+            user = _address(topics[3])
+            out.append((user, _address(topics[1]), -data[1], 0, block))
+            out.append((user, _address(topics[2]), 0, -data[0], block))
+        elif sig == TRANSFER and len(topics) == 3:
+            asset = a_tokens.get(_hex(log["address"]))
+            src, dst = _address(topics[1]), _address(topics[2])
+            if asset is None or ZERO_ADDRESS in (src, dst) or _hex(log["transactionHash"]) in liquidation_txs:
+                continue
+            out.append((src, asset, -data[0], 0, block))
+            out.append((dst, asset, data[0], 0, block))
+    return out
+
+
+class PoolIndexer:
+
+    def __init__(self, db_path=DB_PATH, endpoint=None, block_range=BLOCK_RANGE):
+        self.db_path = db_path
+        self.endpoint = endpoint
+        self.block_range = block_range
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # deltas are stored as decimal text: uint256 sums do not fit an SQLite integer
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                protocol TEXT PRIMARY KEY,
+                block INTEGER
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS deltas (
+                protocol TEXT,
+                user TEXT,
+                asset TEXT,
+                supplied TEXT,
+                debt TEXT,
+                events INTEGER,
+                last_block INTEGER,
+                PRIMARY KEY (protocol, user, asset)
+            )
+        """)
+        self.conn.commit()
+        self.requests = 0
+        self.logs = 0
+        self.skips = 0
+
+    # -- SQLite --
+
+    def checkpoint(self, protocol):
+        with self._lock:
+            row = self.conn.execute("SELECT block FROM checkpoints WHERE protocol = ?", (protocol,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _store(self, protocol, rows, block):
+        """Add `rows` to the deltas and move the checkpoint to `block`, in one SQLite transaction."""
+        totals = defaultdict(lambda: [0, 0, 0, 0])
+        for user, asset, supplied, debt, at in rows:
+            t = totals[(user, asset)]
+            t[0] += supplied
+            t[1] += debt
+            t[2] += 1
+            t[3] = max(t[3], at)
+        with self._lock:
+            for (user, asset), (supplied, debt, events, last_block) in totals.items():
+                row = self.conn.execute(
+                    "SELECT supplied, debt, events FROM deltas WHERE protocol = ? AND user = ? AND asset = ?",
+                    (protocol, user, asset),
+                ).fetchone()
+                if row is not None:
+                    supplied, debt, events = supplied + int(row[0]), debt + int(row[1]), events + row[2]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO deltas (protocol, user, asset, supplied, debt, events, last_block) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (protocol, user, asset, str(supplied), str(debt), events, last_block),
+                )
+            self.conn.execute("INSERT OR REPLACE INTO checkpoints (protocol, block) VALUES (?, ?)", (protocol, block))
+            self.conn.commit()
+
+    def changed_users(self, users=None):
+        """Lowercase addresses with deltas not yet cleared by mark_clean(), optionally among `users`."""
+        with self._lock:
+            changed = {r[0] for r in self.conn.execute("SELECT DISTINCT user FROM deltas")}
+        if users is None:
+            return changed
+        return {u.lower() for u in users} & changed
+
+    def deltas(self, user):
+        """{(protocol, asset): {"supplied", "debt", "events", "last_block"}} since the wallet's last rescan."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT protocol, asset, supplied, debt, events, last_block FROM deltas WHERE user = ?",
+                (user.lower(),),
+            ).fetchall()
+        return {
+            (protocol, asset): {"supplied": int(supplied), "debt": int(debt), "events": events, "last_block": last_block}
+            for protocol, asset, supplied, debt, events, last_block in rows
+        }
+
+    def mark_clean(self, users):
+        """The wallets were just read in full: their positions are the new baseline."""
+        with self._lock:
+            self.conn.executemany("DELETE FROM deltas WHERE user = ?", [(u.lower(),) for u in users])
+            self.conn.commit()
+
+    # -- logs --
+
+    def _head(self):
+        with rpc_batch(self.endpoint) as batch:
+            head = batch.block_number()
+        self.requests += 1
+        return head.result() - CONFIRMATIONS
+
+    def _scan(self, protocol, addresses, a_tokens, users, start, head):
+        """Index [start, head] in ranges of block_range, RANGES_PER_BATCH eth_getLogs per batch."""
+        step = self.block_range
+        block = start
+        while block <= head:
+            ranges = []
+            s = block
+            while s <= head and len(ranges) < RANGES_PER_BATCH:
+                e = min(s + step - 1, head)
+                ranges.append((s, e))
+                s = e + 1
+            with rpc_batch(self.endpoint) as batch:
+                slots = [
+                    batch.add("eth_getLogs", [{"fromBlock": hex(s), "toBlock": hex(e), "address": addresses, "topics": [POOL_TOPICS]}])
+                    for s, e in ranges
+                ]
+            self.requests += 1
+            for (s, e), slot in zip(ranges, slots):
+                try:
+                    logs = slot.result() or []
+                except Exception as err:
+                    if step == 1:
+                        raise
+                    # the node refused the range (too wide or too many results): halve it and go on from here
+                    step = max(step // 2, 1)
+                    logger.info(f"pool indexer: {protocol} eth_getLogs {s}-{e} failed, range now {step} blocks ({err})")
+                    break
+                self.logs += len(logs)
+                rows = [r for r in decode_deltas(logs, a_tokens) if r[0] in users]
+                self._store(protocol, rows, e)
+                block = e + 1
+
+    def sync(self, users):
+        """
+        Index every protocol up to the confirmed head; returns the wallets among `users` (as given)
+        whose positions changed since their last mark_clean(). On the first run, or after falling
+        more than MAX_CATCHUP blocks behind, the checkpoint skips to the head and every wallet is
+        returned.
+        """
+        by_lower = {u.lower(): u for u in users}
+        head = self._head()
+        everyone = False
+        for p in protocols():
+            checkpoint = self.checkpoint(p.name)
+            if checkpoint is None or head - checkpoint > MAX_CATCHUP:
+                self._store(p.name, [], head)
+                self.skips += 1
+                everyone = True
+                continue
+            if checkpoint >= head:
+                continue
+            try:
+                markets = p.snapshot_markets()
+            except Exception as e:
+                # pool events still cover supply / withdraw / borrow / repay; only aToken transfers are missed
+                logger.warning(f"pool indexer: {p.label} markets unavailable, not following aToken transfers: {e}")
+                markets = {}
+            a_tokens = {r.a_token.lower(): asset.lower() for asset, r in markets.items() if r.a_token}
+            addresses = [p.pool_address] + [to_checksum_address(a) for a in a_tokens]
+            self._scan(p.name, addresses, a_tokens, set(by_lower), checkpoint + 1, head)
+        if everyone:
+            return set(users)
+        return {by_lower[u] for u in self.changed_users(by_lower)}
+
+    def stats(self):
+        with self._lock:
+            checkpoints = dict(self.conn.execute("SELECT protocol, block FROM checkpoints").fetchall())
+            changed = self.conn.execute("SELECT COUNT(DISTINCT user) FROM deltas").fetchone()[0]
+        return {"checkpoints": checkpoints, "changed_users": changed, "requests": self.requests, "logs": self.logs, "skips": self.skips}
+
+    def close(self):
+        self.conn.close()
+
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+
+def get_indexer():
+    global _indexer
+    if _indexer is None:
+        with _indexer_lock:
+            if _indexer is None:
+                _indexer = PoolIndexer()
+    return _indexer
+
+
+def sync(users):
+    return get_indexer().sync(users)
+
+
+def changed_users(users=None):
+    return get_indexer().changed_users(users)
+
+
+def mark_clean(users):
+    get_indexer().mark_clean(users)
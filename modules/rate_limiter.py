@@ -0,0 +1,243 @@
+"""
+Per-upstream token-bucket rate limiter.
+- one bucket per host (HyperEVM RPCs, GlueX, LiFi, deBridge, HyperLend API)
+- callers block (acquire) or await (async_acquire) until a token is free; waiters are
+  served in arrival order by reserving tokens ahead of time
+- a 429 answer pauses the bucket for the server's Retry-After
+- queue depth and wait-time metrics per bucket
+
+Limits are "requests/second[/burst]" per host and can be overridden with
+RATE_LIMITS="rpc.hyperliquid.xyz=1.6/20,li.quest=2" or configure().
+"""
+
+import os
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+
+DEFAULT_LIMITS = {
+    "rpc.hyperliquid.xyz": (100 / 60, 20),      # public RPC: 100 requests / minute
+    "hyperliquid.drpc.org": (20, 40),
+    "router.gluex.xyz": (5, 10),
+    "exchange-rates.gluex.xyz": (5, 10),
+    "li.quest": (2, 5),
+    "dln.debridge.finance": (2, 5),
+    "api.hyperlend.finance": (5, 10),
+}
+DEFAULT_RATE = (10, 20)          # hosts without a configured limit
+DEFAULT_RETRY_AFTER = 2.0        # seconds to pause a bucket on a 429 without Retry-After
+MAX_RETRY_AFTER = 60.0
+MAX_429_RETRIES = 2
+
+
+class RateLimitExceeded(RuntimeError):
+    """A token could not be obtained within the caller's timeout."""
+
+
+class TokenBucket:
+
+    def __init__(self, name, rate, burst=None):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        # metrics
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _reserve(self, n, timeout):
+        """Take `n` tokens (possibly going into debt) and return how long the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now, (n - self.tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                raise RateLimitExceeded(f"{self.name}: rate limited, next slot in {wait:.2f}s")
+            self.tokens -= n
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+            return wait
+
+    def _done_waiting(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def acquire(self, n=1, timeout=None):
+        wait = self._reserve(n, timeout)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._done_waiting()
+        return wait
+
+    async def async_acquire(self, n=1, timeout=None):
+        wait = self._reserve(n, timeout)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._done_waiting()
+        return wait
+
+    def penalize(self, retry_after=None):
+        """Upstream answered 429: pause the bucket and drop any banked burst."""
+        delay = min(MAX_RETRY_AFTER, retry_after if retry_after is not None else DEFAULT_RETRY_AFTER)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.blocked_until = max(self.blocked_until, now + delay)
+            self.tokens = min(self.tokens, 0.0)
+            self.throttled += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "burst": self.burst,
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "avg_wait_s": round(self.total_wait / self.waited, 3) if self.waited else 0.0,
+                "max_wait_s": round(self.max_wait, 3),
+                "throttled_429": self.throttled,
+            }
+
+
+def _parse_limits(spec):
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        host, value = item.split("=", 1)
+        parts = value.strip().split("/")
+        try:
+            rate = float(parts[0])
+            burst = float(parts[1]) if len(parts) > 1 else None
+        except ValueError:
+            continue
+        limits[host.strip().lower()] = (rate, burst)
+    return limits
+
+
+_limits = dict(DEFAULT_LIMITS)
+_limits.update(_parse_limits(os.getenv("RATE_LIMITS")))
+_buckets = {}
+_lock = threading.Lock()
+
+
+def host_of(url):
+    return (urlsplit(url).hostname or url).lower()
+
+
+def get_bucket(url):
+    host = host_of(url)
+    bucket = _buckets.get(host)
+    if bucket is not None:
+        return bucket
+    with _lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            rate, burst = _limits.get(host, DEFAULT_RATE)
+            bucket = _buckets[host] = TokenBucket(host, rate, burst)
+    return bucket
+
+
+def configure(host, rate, burst=None):
+    """Set the limit for `host` (replaces its bucket, metrics start over)."""
+    host = host.lower()
+    with _lock:
+        _limits[host] = (rate, burst)
+        _buckets.pop(host, None)
+
+
+def acquire(url, n=1, timeout=None):
+    return get_bucket(url).acquire(n, timeout)
+
+
+async def async_acquire(url, n=1, timeout=None):
+    return await get_bucket(url).async_acquire(n, timeout)
+
+
+def retry_after(headers):
+    """Retry-After header (seconds or HTTP date) -> seconds, or None."""
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def throttled(url, headers=None):
+    """Record a 429 from `url` so every caller of that upstream backs off together."""
+    get_bucket(url).penalize(retry_after(headers))
+
+
+def is_rate_limited(error):
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return "429" in str(error) or "rate limit" in str(error).lower()
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session that takes a token per request and waits out 429s on the shared bucket."""
+
+    def request(self, method, url, *args, **kwargs):
+        cost = 1
+        payload = kwargs.get("json")
+        if isinstance(payload, list) and payload:
+            cost = len(payload)  # JSON-RPC batch: providers count each entry
+        bucket = get_bucket(url)
+        for attempt in range(MAX_429_RETRIES + 1):
+            bucket.acquire(min(cost, bucket.burst))
+            resp = super().request(method, url, *args, **kwargs)
+            if resp.status_code != 429 or attempt == MAX_429_RETRIES:
+                return resp
+            bucket.penalize(retry_after(resp.headers))
+        return resp
+
+
+def stats():
+    with _lock:
+        buckets = dict(_buckets)
+    return {host: b.as_dict() for host, b in buckets.items()}
+
+
+def format_stats():
+    lines = []
+    for host, s in stats().items():
+        lines.append(
+            f"{host}: {s['rate']}/s burst {s['burst']:.0f} | queue {s['queue_depth']} (max {s['max_queue_depth']}) | "
+            f"waited {s['waited']}/{s['acquired']} avg {s['avg_wait_s']}s max {s['max_wait_s']}s | 429s {s['throttled_429']}"
+        )
+    return "\n".join(lines) if lines else "No rate-limited traffic yet"
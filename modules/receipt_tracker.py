@@ -0,0 +1,239 @@
+"""
+Block-driven receipt tracker.
+- one background thread follows the chain head (eth_blockNumber per POLL_INTERVAL) and, once per
+  new block, fetches receipts for every outstanding hash in one JSON-RPC batch:
+  eth_getBlockReceipts for the new blocks when the node supports it (constant cost however many
+  hashes are pending), eth_getTransactionReceipt per hash otherwise
+- callers get a concurrent.futures.Future per hash (asyncio.wrap_future() for async code) and can
+  attach callbacks; a hash not mined before its timeout fails with TimeoutError and, when the
+  sender was given, resyncs the sender's nonce (the transaction may have been dropped)
+
+    fut = track(tx_hash, callback=lambda f: print(f.result().status))
+    receipt = wait_for_receipt(tx_hash, timeout=60)
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from modules.rpc_batch import rpc_batch, format_receipt
+from modules.instrumentation import operation
+from modules import nonce_manager
+
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5          # seconds between head checks (HyperEVM small blocks are ~1s)
+DEFAULT_TIMEOUT = 120
+MAX_CATCHUP_BLOCKS = 20      # more new blocks than this in one round: ask per hash instead
+HASH_BATCH_SIZE = 100
+
+
+def normalize_hash(tx_hash):
+    if isinstance(tx_hash, (bytes, bytearray)):
+        tx_hash = bytes(tx_hash).hex()
+    tx_hash = str(tx_hash).lower()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+def _format_receipts(value):
+    return [format_receipt(r) for r in value] if value is not None else None
+
+
+class _Watch:
+
+    __slots__ = ("tx_hash", "future", "deadline", "checked", "sender")
+
+    def __init__(self, tx_hash, deadline, sender=None):
+        self.tx_hash = tx_hash
+        self.future = Future()
+        self.deadline = deadline
+        self.checked = False     # had one direct eth_getTransactionReceipt since it was added
+        self.sender = sender     # resynced in the nonce manager on timeout
+
+
+class ReceiptTracker:
+
+    def __init__(self, endpoint=None, poll_interval=POLL_INTERVAL):
+        self.endpoint = endpoint
+        self.poll_interval = poll_interval
+        self.block_receipts = True    # cleared once the node rejects eth_getBlockReceipts
+        self._watches = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_block = None
+        self.polls = 0
+        self.requests = 0
+        self.receipts = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    # -- public --
+
+    def track(self, tx_hash, callback=None, timeout=DEFAULT_TIMEOUT, sender=None):
+        """Future resolving to the receipt of `tx_hash`; `callback(future)` runs when it is done."""
+        h = normalize_hash(tx_hash)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            w = self._watches.get(h)
+            if w is None:
+                w = self._watches[h] = _Watch(h, deadline, sender)
+            else:
+                w.deadline = max(w.deadline, deadline)
+                w.sender = w.sender or sender
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        if callback is not None:
+            w.future.add_done_callback(callback)
+        return w.future
+
+    def wait(self, tx_hash, timeout=DEFAULT_TIMEOUT, sender=None):
+        # the caller's deadline holds even if the background thread is stuck in an RPC call
+        return self.track(tx_hash, timeout=timeout, sender=sender).result(timeout + self._margin())
+
+    def wait_all(self, hashes, timeout=DEFAULT_TIMEOUT, sender=None):
+        futures = [self.track(h, timeout=timeout, sender=sender) for h in hashes]
+        deadline = time.monotonic() + timeout + self._margin()
+        return [f.result(max(deadline - time.monotonic(), 0)) for f in futures]
+
+    def _margin(self):
+        return 2 * self.poll_interval
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._watches)
+        return {
+            "endpoint": self.endpoint or "hyperevm-pool",
+            "mode": "eth_getBlockReceipts" if self.block_receipts else "eth_getTransactionReceipt",
+            "pending": pending,
+            "last_block": self._last_block,
+            "polls": self.polls,
+            "requests": self.requests,
+            "receipts": self.receipts,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+    # -- background loop --
+
+    def _run(self):
+        with operation("receipt_tracker"):
+            while True:
+                with self._cond:
+                    while not self._watches:
+                        self._cond.wait()
+                try:
+                    self._poll()
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"receipt tracker: poll failed: {e}")
+                self._expire()
+                time.sleep(self.poll_interval)
+
+    def _head(self):
+        with rpc_batch(self.endpoint) as batch:
+            head = batch.block_number()
+        self.requests += 1
+        return head.result()
+
+    def _poll(self):
+        self.polls += 1
+        head = self._head()
+        with self._cond:
+            unchecked = [h for h, w in self._watches.items() if not w.checked]
+            outstanding = list(self._watches)
+        if head == self._last_block and not unchecked:
+            return
+        first = head if self._last_block is None else self._last_block + 1
+        use_blocks = self.block_receipts and head - first + 1 <= MAX_CATCHUP_BLOCKS
+        to_check = unchecked if use_blocks else outstanding
+
+        found = {}
+        block_ok = True
+        for i in range(0, max(len(to_check), 1), HASH_BATCH_SIZE):
+            chunk = to_check[i:i + HASH_BATCH_SIZE]
+            with rpc_batch(self.endpoint) as batch:
+                block_slots = [
+                    batch.add("eth_getBlockReceipts", [hex(n)], _format_receipts) for n in range(first, head + 1)
+                ] if use_blocks and i == 0 else []
+                hash_slots = {h: batch.get_transaction_receipt(h) for h in chunk}
+            if not block_slots and not hash_slots:
+                continue
+            self.requests += 1
+            for slot in block_slots:
+                try:
+                    receipts = slot.result()
+                except Exception as e:
+                    block_ok = False
+                    if any(s in str(e).lower() for s in ("not found", "not supported", "does not exist", "unsupported")):
+                        logger.info(f"receipt tracker: eth_getBlockReceipts unavailable, tracking per hash ({e})")
+                        self.block_receipts = False
+                    continue
+                if receipts is None:
+                    block_ok = False   # node behind the head we were given
+                    continue
+                for r in receipts:
+                    found[normalize_hash(r["transactionHash"])] = r
+            for h, slot in hash_slots.items():
+                try:
+                    r = slot.result()
+                except Exception:
+                    continue
+                if r is not None:
+                    found[h] = r
+
+        with self._cond:
+            for h in to_check:
+                w = self._watches.get(h)
+                if w is not None:
+                    w.checked = True
+            if use_blocks and not block_ok:
+                # a block could not be read: fall back to one direct check of every hash
+                for w in self._watches.values():
+                    w.checked = False
+            resolved = [(self._watches.pop(h), r) for h, r in found.items() if h in self._watches]
+        # a lagging node behind the load balancer must not move the cursor back
+        self._last_block = head if self._last_block is None else max(self._last_block, head)
+        for w, r in resolved:
+            self.receipts += 1
+            if not w.future.done():
+                w.future.set_result(r)
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._cond:
+            expired = [self._watches.pop(h) for h, w in list(self._watches.items()) if w.deadline <= now]
+        for w in expired:
+            self.timeouts += 1
+            if w.sender is not None:
+                nonce_manager.resync(w.sender)
+            if not w.future.done():
+                w.future.set_exception(TimeoutError(f"{w.tx_hash} not mined before the tracker timeout"))
+
+
+_trackers = {}
+_lock = threading.Lock()
+
+
+def get_tracker(endpoint=None):
+    """Tracker for `endpoint` (None: the HyperEVM endpoint pool)."""
+    tracker = _trackers.get(endpoint)
+    if tracker is None:
+        with _lock:
+            tracker = _trackers.setdefault(endpoint, ReceiptTracker(endpoint))
+    return tracker
+
+
+def track(tx_hash, callback=None, timeout=DEFAULT_TIMEOUT, endpoint=None, sender=None):
+    return get_tracker(endpoint).track(tx_hash, callback, timeout, sender)
+
+
+def wait_for_receipt(tx_hash, timeout=DEFAULT_TIMEOUT, endpoint=None, sender=None):
+    return get_tracker(endpoint).wait(tx_hash, timeout, sender)
+
+
+def wait_all(hashes, timeout=DEFAULT_TIMEOUT, endpoint=None, sender=None):
+    return get_tracker(endpoint).wait_all(hashes, timeout, sender)
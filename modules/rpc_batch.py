@@ -0,0 +1,191 @@
+"""
+JSON-RPC batch transport.
+Collects unrelated node calls (nonce, block, chain id, balances, gas price...) and sends
+them as one JSON-RPC batch array, so a transaction-prep step costs a single round trip.
+
+    with rpc_batch() as batch:
+        nonce = batch.get_transaction_count(addr, "pending")
+        block = batch.get_block("latest")
+        chain_id = batch.chain_id()
+    tx = {"nonce": nonce.result(), "chainId": chain_id.result(), ...}
+"""
+
+import itertools
+
+from eth_utils import to_checksum_address
+from web3.datastructures import AttributeDict
+
+from modules.rpc_manager import post_rpc
+
+
+BLOCK_INT_FIELDS = ("number", "timestamp", "gasLimit", "gasUsed", "baseFeePerGas", "size", "difficulty")
+RECEIPT_INT_FIELDS = ("blockNumber", "status", "gasUsed", "cumulativeGasUsed", "effectiveGasPrice", "transactionIndex", "type")
+
+_ids = itertools.count(1)
+
+
+def _to_int(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+def _block_param(block):
+    if isinstance(block, int):
+        return hex(block)
+    return block
+
+
+def _format_fields(int_fields):
+    def fmt(value):
+        if value is None:
+            return None
+        out = dict(value)
+        for k in int_fields:
+            if k in out and out[k] is not None:
+                out[k] = _to_int(out[k])
+        return AttributeDict(out)
+    return fmt
+
+
+format_block = _format_fields(BLOCK_INT_FIELDS)
+format_receipt = _format_fields(RECEIPT_INT_FIELDS)
+
+
+class RpcError(RuntimeError):
+    """JSON-RPC error answer; `data` carries revert data for eth_call / eth_estimateGas."""
+
+    def __init__(self, message, code=None, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class BatchResult:
+    """Result slot for one request of a batch; resolved when the batch is executed."""
+
+    __slots__ = ("method", "_done", "_value", "_error")
+
+    def __init__(self, method):
+        self.method = method
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if not self._done:
+            raise RuntimeError(f"{self.method}: batch has not been executed yet")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _set(self, value=None, error=None):
+        self._value = value
+        self._error = error
+        self._done = True
+
+
+class RpcBatch:
+
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+        return False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, method, params=None, formatter=None):
+        slot = BatchResult(method)
+        request = {"jsonrpc": "2.0", "id": next(_ids), "method": method, "params": list(params or [])}
+        self._pending.append((request, formatter, slot))
+        return slot
+
+    def execute(self):
+        """Send every queued request in one batch array and resolve the result slots."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        try:
+            response = post_rpc([req for req, _, _ in pending], self.endpoint)
+        except Exception as e:
+            for _, _, slot in pending:
+                slot._set(error=RuntimeError(f"{slot.method} failed: {e}"))
+            return [slot for _, _, slot in pending]
+
+        if not isinstance(response, list):
+            # endpoint does not support batching: send the requests one by one
+            response = []
+            for req, _, _ in pending:
+                try:
+                    response.append(post_rpc(req, self.endpoint))
+                except Exception as e:
+                    response.append({"id": req["id"], "error": {"message": str(e)}})
+
+        by_id = {r.get("id"): r for r in response if isinstance(r, dict)}
+        for req, formatter, slot in pending:
+            r = by_id.get(req["id"])
+            if r is None:
+                slot._set(error=RuntimeError(f"{slot.method}: no response in batch"))
+            elif r.get("error"):
+                err = r["error"] if isinstance(r["error"], dict) else {"message": str(r["error"])}
+                slot._set(error=RpcError(f"{slot.method} failed: {err.get('message')}", err.get("code"), err.get("data")))
+            else:
+                try:
+                    value = r.get("result")
+                    slot._set(value=formatter(value) if formatter else value)
+                except Exception as e:
+                    slot._set(error=RuntimeError(f"{slot.method}: bad result: {e}"))
+        return [slot for _, _, slot in pending]
+
+    # -- convenience wrappers, results match the equivalent w3.eth call --
+
+    def chain_id(self):
+        return self.add("eth_chainId", [], _to_int)
+
+    def block_number(self):
+        return self.add("eth_blockNumber", [], _to_int)
+
+    def gas_price(self):
+        return self.add("eth_gasPrice", [], _to_int)
+
+    def max_priority_fee(self):
+        return self.add("eth_maxPriorityFeePerGas", [], _to_int)
+
+    def get_balance(self, address, block="latest"):
+        return self.add("eth_getBalance", [to_checksum_address(address), _block_param(block)], _to_int)
+
+    def get_transaction_count(self, address, block="pending"):
+        return self.add("eth_getTransactionCount", [to_checksum_address(address), _block_param(block)], _to_int)
+
+    def get_code(self, address, block="latest"):
+        return self.add("eth_getCode", [to_checksum_address(address), _block_param(block)])
+
+    def get_block(self, block="latest", full_transactions=False):
+        return self.add("eth_getBlockByNumber", [_block_param(block), full_transactions], format_block)
+
+    def get_transaction_receipt(self, tx_hash):
+        return self.add("eth_getTransactionReceipt", [tx_hash], format_receipt)
+
+    def call(self, tx, block="latest"):
+        return self.add("eth_call", [tx, _block_param(block)])
+
+    def estimate_gas(self, tx, block=None):
+        params = [tx] if block is None else [tx, _block_param(block)]
+        return self.add("eth_estimateGas", params, _to_int)
+
+
+def rpc_batch(endpoint=None):
+    return RpcBatch(endpoint)
@@ -0,0 +1,402 @@
+"""
+Shared HyperEVM provider registry.
+- One keep-alive requests.Session per endpoint (origin), reused by every module and
+  rate limited per host (modules.rate_limiter) and instrumented (modules.instrumentation)
+- One Web3 instance per endpoint, built on top of that session
+- Connection pool statistics (requests served vs. new connections opened)
+- EndpointPool: latency/error scored HyperEVM endpoints with optional hedged reads
+  and a sticky endpoint for writes; get_w3() with no argument is backed by it
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from modules.rate_limiter import RateLimitedSession
+from modules.instrumentation import InstrumentedSession, run_in_context
+
+
+DEFAULT_HYPEREVM_RPC = "https://rpc.hyperliquid.xyz/evm"
+FALLBACK_HYPEREVM_RPC = "https://hyperliquid.drpc.org"
+HYPEREVM_RPC_URLS = [u.strip() for u in os.getenv("HYPEREVM_RPC_URLS", "").split(",") if u.strip()] or [
+    DEFAULT_HYPEREVM_RPC,
+    FALLBACK_HYPEREVM_RPC,
+]
+HEDGE_READS = os.getenv("HYPEREVM_RPC_HEDGE", "0") == "1"
+
+POOL_CONNECTIONS = 4     # distinct hosts cached per session
+POOL_MAXSIZE = 32        # keep-alive sockets per host (bot + froghop threads)
+REQUEST_TIMEOUT = 10
+
+LATENCY_WINDOW = 50      # samples kept per endpoint
+ERROR_DECAY = 0.9        # EWMA weight of the previous error rate
+MIN_HEDGE_SAMPLES = 10
+DEFAULT_HEDGE_DELAY = 0.5
+UNHEALTHY_COOLDOWN = 10  # seconds an endpoint is skipped after repeated failures
+UNHEALTHY_AFTER = 3      # consecutive failures
+
+WRITE_METHODS = ("eth_sendRawTransaction", "eth_sendTransaction")
+
+_lock = threading.Lock()
+_sessions = {}
+_web3s = {}
+_endpoint_pool = None
+_hedge_executor = None
+
+
+class PooledSession(RateLimitedSession, InstrumentedSession):
+    """Rate limited per host; each request that reaches the wire is instrumented."""
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    """Return the pooled keep-alive session for the origin of `url`."""
+    key = _origin(url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = PooledSession()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+    return session
+
+
+def post_rpc(payload, endpoint=None):
+    """
+    POST a raw JSON-RPC request (single object or batch array; dict/list or pre-encoded bytes).
+    With no endpoint the request is routed through the HyperEVM endpoint pool.
+    """
+    if endpoint is None:
+        return get_endpoint_pool().post(payload)
+    if isinstance(payload, (bytes, str)):
+        resp = get_session(endpoint).post(endpoint, data=payload, headers={"Content-Type": "application/json"}, timeout=REQUEST_TIMEOUT)
+    else:
+        resp = get_session(endpoint).post(endpoint, json=payload, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
+
+
+# ----------------------------
+# Endpoint pool
+# ----------------------------
+class EndpointStats:
+
+    __slots__ = ("url", "latencies", "calls", "errors", "error_rate", "consecutive_errors", "last_error_at", "last_error")
+
+    def __init__(self, url):
+        self.url = url
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.error_rate = 0.0
+        self.consecutive_errors = 0
+        self.last_error_at = 0.0
+        self.last_error = None
+
+    def record(self, latency, error=None):
+        self.calls += 1
+        if error is None:
+            self.latencies.append(latency)
+            self.error_rate *= ERROR_DECAY
+            self.consecutive_errors = 0
+        else:
+            self.errors += 1
+            self.error_rate = self.error_rate * ERROR_DECAY + (1 - ERROR_DECAY)
+            self.consecutive_errors += 1
+            self.last_error_at = time.monotonic()
+            self.last_error = str(error)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    def healthy(self):
+        if self.consecutive_errors < UNHEALTHY_AFTER:
+            return True
+        return time.monotonic() - self.last_error_at > UNHEALTHY_COOLDOWN
+
+    def score(self):
+        """Lower is better: median latency inflated by the recent error rate."""
+        p50 = self.percentile(0.5)
+        base = p50 if p50 is not None else DEFAULT_HEDGE_DELAY / 2
+        score = base * (1 + 20 * self.error_rate)
+        if not self.healthy():
+            score += 1000
+        return score
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "p50_ms": None if not self.latencies else round(self.percentile(0.5) * 1000, 1),
+            "p95_ms": None if not self.latencies else round(self.percentile(0.95) * 1000, 1),
+            "healthy": self.healthy(),
+            "last_error": self.last_error,
+        }
+
+
+def _executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rpc-hedge")
+    return _hedge_executor
+
+
+def _is_write(payload):
+    if isinstance(payload, (bytes, str)):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return False
+    items = payload if isinstance(payload, list) else [payload]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        method = item.get("method")
+        if method in WRITE_METHODS:
+            return True
+        # pending nonces must come from the node we broadcast to
+        if method == "eth_getTransactionCount" and "pending" in (item.get("params") or []):
+            return True
+    return False
+
+
+class EndpointPool:
+    """
+    Routes each read to the best-scoring endpoint (falling over to the next on transport
+    errors), optionally hedging slow reads with a duplicate to the runner-up after that
+    endpoint's p95 latency. Writes go to one sticky endpoint.
+    """
+
+    def __init__(self, urls=None, hedge=HEDGE_READS):
+        self.urls = list(urls or HYPEREVM_RPC_URLS)
+        if not self.urls:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.hedge = hedge
+        self.stats = {u: EndpointStats(u) for u in self.urls}
+        self._sticky = None
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        with self._lock:
+            return sorted(self.urls, key=lambda u: self.stats[u].score())
+
+    def best(self):
+        return self.ranked()[0]
+
+    def record(self, url, latency, error=None):
+        with self._lock:
+            self.stats[url].record(latency, error)
+
+    def _send(self, url, payload):
+        started = time.perf_counter()
+        try:
+            out = post_rpc(payload, url)
+        except Exception as e:
+            self.record(url, time.perf_counter() - started, e)
+            raise
+        self.record(url, time.perf_counter() - started)
+        return out
+
+    def post(self, payload, write=None):
+        if write is None:
+            write = _is_write(payload)
+        if write:
+            return self._post_sticky(payload)
+        if self.hedge and len(self.urls) > 1:
+            return self._post_hedged(payload)
+        return self._post_failover(payload)
+
+    def _post_failover(self, payload, candidates=None):
+        if candidates is None:
+            candidates = self.ranked()
+        last_error = None
+        for url in candidates:
+            try:
+                return self._send(url, payload)
+            except Exception as e:
+                last_error = e
+        raise ConnectionError(f"All HyperEVM endpoints failed: {last_error}")
+
+    def _hedge_delay(self, url):
+        with self._lock:
+            st = self.stats[url]
+            if len(st.latencies) < MIN_HEDGE_SAMPLES:
+                return DEFAULT_HEDGE_DELAY
+            return st.percentile(0.95)
+
+    def _post_hedged(self, payload):
+        ranked = self.ranked()
+        primary, backup = ranked[0], ranked[1]
+        ex = _executor()
+        done, pending = wait({ex.submit(run_in_context(self._send, primary, payload))}, timeout=self._hedge_delay(primary))
+        hedged = not done
+        if hedged:
+            pending.add(ex.submit(run_in_context(self._send, backup, payload)))
+        while True:
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        # every in-flight attempt failed: walk the remaining endpoints in order
+        return self._post_failover(payload, ranked[2:] if hedged else ranked[1:])
+
+    def _post_sticky(self, payload):
+        with self._lock:
+            sticky = self._sticky
+        if sticky is None or not self.stats[sticky].healthy():
+            sticky = self.best()
+            with self._lock:
+                self._sticky = sticky
+        try:
+            return self._send(sticky, payload)
+        except Exception:
+            # a signed transaction is idempotent, so re-broadcasting it elsewhere is safe
+            others = [u for u in self.ranked() if u != sticky]
+            if not others:
+                raise
+            out = self._post_failover(payload, others)
+            with self._lock:
+                self._sticky = others[0]
+            return out
+
+    def status(self):
+        with self._lock:
+            return {
+                "sticky": self._sticky,
+                "hedge": self.hedge,
+                "endpoints": {u: self.stats[u].as_dict() for u in self.urls},
+            }
+
+
+class PooledProvider(JSONBaseProvider):
+    """Web3 provider that sends every request through an EndpointPool."""
+
+    def __init__(self, pool, **kwargs):
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    @property
+    def endpoint_uri(self):
+        return self.pool.best()
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        return self.pool.post(request_data, write=method in WRITE_METHODS or None)
+
+    def make_batch_request(self, requests):
+        request_data = self.encode_batch_rpc_request(requests)
+        response = self.pool.post(request_data)
+        if isinstance(response, list):
+            response = sorted(response, key=lambda r: r.get("id", 0) if isinstance(r, dict) else 0)
+        return response
+
+    def __str__(self):
+        return f"PooledProvider({', '.join(self.pool.urls)})"
+
+
+def get_endpoint_pool():
+    global _endpoint_pool
+    if _endpoint_pool is None:
+        with _lock:
+            if _endpoint_pool is None:
+                _endpoint_pool = EndpointPool()
+    return _endpoint_pool
+
+
+def configure_endpoints(urls, hedge=HEDGE_READS):
+    """Replace the HyperEVM endpoint pool (e.g. to point at local stub nodes)."""
+    global _endpoint_pool
+    with _lock:
+        _endpoint_pool = EndpointPool(urls, hedge=hedge)
+        _web3s.pop(None, None)
+    return _endpoint_pool
+
+
+def get_w3(endpoint=None):
+    """
+    Return the shared Web3 instance for `endpoint` (created on first use).
+    With no endpoint, the instance is backed by the HyperEVM endpoint pool.
+    """
+    w3 = _web3s.get(endpoint)
+    if w3 is not None:
+        return w3
+    if endpoint is None:
+        pool = get_endpoint_pool()
+        with _lock:
+            w3 = _web3s.get(None)
+            if w3 is None:
+                w3 = Web3(PooledProvider(pool))
+                _web3s[None] = w3
+        return w3
+    session = get_session(endpoint)
+    with _lock:
+        w3 = _web3s.get(endpoint)
+        if w3 is None:
+            provider = Web3.HTTPProvider(endpoint, request_kwargs={"timeout": REQUEST_TIMEOUT}, session=session)
+            w3 = Web3(provider)
+            _web3s[endpoint] = w3
+    return w3
+
+
+def pool_stats():
+    """
+    Per-origin connection pool counters.
+    `requests` is the number of HTTP requests served, `connections` the number of
+    TCP/TLS connections opened for them; the difference is handshakes saved by keep-alive.
+    """
+    out = {}
+    with _lock:
+        sessions = dict(_sessions)
+    for origin, session in sessions.items():
+        adapter = session.get_adapter(origin)
+        pools = adapter.poolmanager.pools
+        n_requests = 0
+        n_connections = 0
+        idle = 0
+        for key in list(pools.keys()):
+            try:
+                p = pools[key]
+            except KeyError:
+                continue
+            n_requests += p.num_requests
+            n_connections += p.num_connections
+            idle += p.pool.qsize() if p.pool is not None else 0
+        out[origin] = {
+            "requests": n_requests,
+            "connections": n_connections,
+            "handshakes_saved": max(n_requests - n_connections, 0),
+            "idle_connections": idle,
+        }
+    return out
+
+
+def format_pool_stats():
+    lines = [f"{'Origin':<40}{'Requests':>10}{'Conns':>8}{'Saved':>8}{'Idle':>6}"]
+    for origin, s in sorted(pool_stats().items()):
+        lines.append(f"{origin:<40}{s['requests']:>10}{s['connections']:>8}{s['handshakes_saved']:>8}{s['idle_connections']:>6}")
+    return "\n".join(lines)
@@ -0,0 +1,278 @@
+"""
+Pre-flight simulation of protocol writes: every prepared transaction runs as eth_call at the
+pending block before anything is signed, and reverts come back decoded
+(Error(string), Panic(uint256), Aave v3 numeric error codes).
+- preflight(tx): eth_call + eth_estimateGas in one batch; raises SimulationError on a revert,
+  otherwise returns the gas estimate (replaces the builders' separate estimate)
+- simulate(txs): independent transactions in one JSON-RPC batch
+- simulate_sequence(txs): dependent steps (approve -> supply, withdraw -> swap -> supply...) with
+  eth_simulateV1, so each call sees the effects of the previous ones; on nodes without it the
+  steps fall back to simulate() and only the first step's revert is conclusive (an endpoint is
+  only marked as lacking eth_simulateV1 when it answers method-not-found; other errors fall back
+  for that one sequence)
+- every entry point runs at the pending block and retries at "latest" on nodes that cannot
+  execute against it
+
+Each result is {"ok": True | False | None, "reason", "output", "gas_used"}; None means the
+simulation could not tell (node error, or a later step of a non-sequential fallback).
+"""
+
+import threading
+
+from eth_abi import decode
+from eth_utils import to_checksum_address
+
+from modules.multicall import encode_call
+from modules.rpc_batch import rpc_batch, RpcError
+
+
+ERROR_SELECTOR = "08c379a0"     # Error(string)
+PANIC_SELECTOR = "4e487b71"     # Panic(uint256)
+
+PANIC_CODES = {
+    0x01: "assert failed",
+    0x11: "arithmetic overflow/underflow",
+    0x12: "division by zero",
+    0x21: "invalid enum value",
+    0x31: "pop on empty array",
+    0x32: "array index out of bounds",
+    0x41: "out of memory",
+    0x51: "call to uninitialized function",
+}
+
+# Aave v3 Errors.sol (HyperLend and HypurrFi are Aave v3 forks)
+AAVE_ERRORS = {
+    "26": "INVALID_AMOUNT",
+    "27": "RESERVE_INACTIVE",
+    "28": "RESERVE_FROZEN",
+    "29": "RESERVE_PAUSED",
+    "30": "BORROWING_NOT_ENABLED",
+    "31": "STABLE_BORROWING_NOT_ENABLED",
+    "32": "NOT_ENOUGH_AVAILABLE_USER_BALANCE",
+    "33": "INVALID_INTEREST_RATE_MODE_SELECTED",
+    "34": "COLLATERAL_BALANCE_IS_ZERO",
+    "35": "HEALTH_FACTOR_LOWER_THAN_LIQUIDATION_THRESHOLD",
+    "36": "COLLATERAL_CANNOT_COVER_NEW_BORROW",
+    "37": "COLLATERAL_SAME_AS_BORROWING_CURRENCY",
+    "38": "AMOUNT_BIGGER_THAN_MAX_LOAN_SIZE_STABLE",
+    "39": "NO_DEBT_OF_SELECTED_TYPE",
+    "40": "NO_EXPLICIT_AMOUNT_TO_REPAY_ON_BEHALF",
+    "41": "NO_OUTSTANDING_STABLE_DEBT",
+    "42": "NO_OUTSTANDING_VARIABLE_DEBT",
+    "43": "UNDERLYING_BALANCE_ZERO",
+    "45": "HEALTH_FACTOR_NOT_BELOW_THRESHOLD",
+    "46": "COLLATERAL_CANNOT_BE_LIQUIDATED",
+    "47": "SPECIFIED_CURRENCY_NOT_BORROWED_BY_USER",
+    "50": "BORROW_CAP_EXCEEDED",
+    "51": "SUPPLY_CAP_EXCEEDED",
+    "57": "LTV_VALIDATION_FAILED",
+}
+
+_no_simulate_v1 = set()   # endpoints that rejected eth_simulateV1
+_lock = threading.Lock()
+
+
+class SimulationError(RuntimeError):
+    """A prepared transaction (or sequence) would revert; nothing was signed."""
+
+    def __init__(self, message, results=None):
+        super().__init__(message)
+        self.results = results or []
+
+
+# ----------------------------
+# revert decoding
+# ----------------------------
+def _with_aave_name(msg):
+    msg = msg.strip()
+    return f"{msg} ({AAVE_ERRORS[msg]})" if msg in AAVE_ERRORS else msg
+
+
+def decode_revert(data):
+    """Revert data (hex string) -> readable reason, or None when there is no data."""
+    if isinstance(data, dict):
+        data = data.get("data")
+    if not isinstance(data, str) or not data.startswith("0x"):
+        return None
+    h = data[2:]
+    if not h:
+        return "reverted without a reason"
+    if h[:8] == ERROR_SELECTOR:
+        try:
+            return _with_aave_name(decode(["string"], bytes.fromhex(h[8:]))[0])
+        except Exception:
+            return "Error(string) with undecodable payload"
+    if h[:8] == PANIC_SELECTOR:
+        code = int(h[8:] or "0", 16)
+        return f"Panic 0x{code:02x} ({PANIC_CODES.get(code, 'unknown')})"
+    return f"custom error 0x{h[:8]}"
+
+
+def revert_reason(error):
+    """Reason for a failed eth_call / eth_estimateGas (RpcError or web3 exception)."""
+    reason = decode_revert(getattr(error, "data", None))
+    if reason:
+        return reason
+    msg = str(error)
+    if "execution reverted:" in msg:
+        return _with_aave_name(msg.split("execution reverted:", 1)[1])
+    return msg
+
+
+def _is_revert(error):
+    return getattr(error, "code", None) == 3 or "revert" in str(error).lower()
+
+
+def _is_unsupported(error, method):
+    """The node does not implement `method` (as opposed to a transient or rate-limit error)."""
+    code = getattr(error, "code", None)
+    msg = str(error).lower()
+    if code == -32601:
+        return True
+    if code == -32602:
+        return method.lower() in msg
+    return any(s in msg for s in ("method not found", "does not exist/is not available", "not supported"))
+
+
+def _pending_unsupported(error):
+    return "pending" in str(error).lower()
+
+
+# ----------------------------
+# transactions
+# ----------------------------
+def call_tx(sender, call, value=0):
+    """(contract, fn_name, args) -> unsigned transaction from `sender`, ready to simulate."""
+    to, data, _ = encode_call(call)
+    return {"from": to_checksum_address(sender), "to": to, "data": data, "value": int(value)}
+
+
+def _hex(value):
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return value
+
+
+def _call_object(tx):
+    out = {"from": to_checksum_address(tx["from"]), "to": to_checksum_address(tx["to"])}
+    if tx.get("data"):
+        out["data"] = _hex(tx["data"])
+    if tx.get("value"):
+        out["value"] = _hex(int(tx["value"]))
+    return out
+
+
+def _result(slot):
+    try:
+        output = slot.result()
+    except RpcError as e:
+        if _is_revert(e):
+            return {"ok": False, "reason": revert_reason(e), "output": None, "gas_used": None}
+        return {"ok": None, "reason": str(e), "output": None, "gas_used": None}
+    except Exception as e:
+        return {"ok": None, "reason": str(e), "output": None, "gas_used": None}
+    return {"ok": True, "reason": None, "output": output, "gas_used": None}
+
+
+# ----------------------------
+# simulation
+# ----------------------------
+def simulate(txs, block="pending", endpoint=None):
+    """Independent eth_calls for every transaction, in one JSON-RPC batch."""
+    if not txs:
+        return []
+    with rpc_batch(endpoint) as batch:
+        slots = [batch.call(_call_object(tx), block) for tx in txs]
+    results = [_result(slot) for slot in slots]
+    if block == "pending" and any(r["ok"] is None and _pending_unsupported(r["reason"] or "") for r in results):
+        # node cannot execute against the pending block
+        return simulate(txs, "latest", endpoint)
+    return results
+
+
+def _simulate_v1(txs, endpoint, block="pending"):
+    payload = {"blockStateCalls": [{"calls": [_call_object(tx) for tx in txs]}], "validation": False}
+    with rpc_batch(endpoint) as batch:
+        slot = batch.add("eth_simulateV1", [payload, block])
+    try:
+        blocks = slot.result()
+    except RpcError as e:
+        if block == "pending" and not _is_revert(e) and _pending_unsupported(e):
+            return _simulate_v1(txs, endpoint, "latest")
+        raise
+    results = []
+    for call in blocks[0]["calls"]:
+        gas_used = int(call["gasUsed"], 16) if call.get("gasUsed") else None
+        if int(call.get("status", "0x0"), 16) == 1:
+            results.append({"ok": True, "reason": None, "output": call.get("returnData"), "gas_used": gas_used})
+        else:
+            err = call.get("error") or {}
+            reason = decode_revert(err.get("data")) or decode_revert(call.get("returnData")) or err.get("message") or "reverted"
+            results.append({"ok": False, "reason": reason, "output": call.get("returnData"), "gas_used": gas_used})
+    return results
+
+
+def simulate_sequence(txs, endpoint=None):
+    """Simulate dependent transactions in order (eth_simulateV1), falling back to independent calls."""
+    if not txs:
+        return []
+    if endpoint not in _no_simulate_v1:
+        try:
+            return _simulate_v1(txs, endpoint)
+        except RpcError as e:
+            if _is_revert(e):
+                return [{"ok": False, "reason": revert_reason(e), "output": None, "gas_used": None}] + \
+                       [{"ok": None, "reason": "not simulated", "output": None, "gas_used": None} for _ in txs[1:]]
+            if _is_unsupported(e, "eth_simulateV1"):
+                with _lock:
+                    _no_simulate_v1.add(endpoint)
+            # anything else (rate limit, missing header, timeout) only falls back for this sequence
+        except Exception:
+            pass
+    results = simulate(txs, endpoint=endpoint)
+    for r in results[1:]:
+        # without sequential state a later step may only fail because an earlier one has not run
+        if r["ok"] is False:
+            r["ok"] = None
+            r["reason"] = f"unverified (needs earlier steps): {r['reason']}"
+    return results
+
+
+def first_failure(results):
+    """Index of the first conclusive revert: a step that failed after every earlier step succeeded."""
+    for i, r in enumerate(results):
+        if r["ok"] is False:
+            return i
+        if r["ok"] is None:
+            return None
+    return None
+
+
+def require_ok(results, labels=None):
+    i = first_failure(results)
+    if i is not None:
+        label = labels[i] if labels else f"step {i + 1}"
+        raise SimulationError(f"{label} would revert: {results[i]['reason']}", results)
+    return results
+
+
+def preflight(tx, block="pending", endpoint=None):
+    """Simulate one prepared transaction and estimate its gas in one batch; raises SimulationError on a revert."""
+    call = _call_object(tx)
+    with rpc_batch(endpoint) as batch:
+        sim = batch.call(call, block)
+        estimate = batch.estimate_gas(call)
+    result = _result(sim)
+    if block == "pending" and result["ok"] is None and _pending_unsupported(result["reason"] or ""):
+        # node cannot execute against the pending block, as in simulate()
+        return preflight(tx, "latest", endpoint)
+    if result["ok"] is False:
+        raise SimulationError(f"simulation reverted: {result['reason']}", [result])
+    try:
+        return estimate.result()
+    except RpcError as e:
+        if _is_revert(e):
+            raise SimulationError(f"gas estimate reverted: {revert_reason(e)}", [result])
+        raise
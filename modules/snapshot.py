@@ -0,0 +1,185 @@
+"""
+Block-pinned read snapshots.
+Inside `with snapshot():` every contract read made through snapshot.read() or multicall()
+runs at one pinned block number, and results are cached by (block, call). Any other
+consumer reading the same call at the same block gets the cached value; the cache is
+dropped once a newer block is pinned. Contract reverts are cached like results (they are
+final at that block); transport errors (timeouts, 429s, resets) are raised and not cached.
+
+    with snapshot() as snap:
+        markets = hyperlend.fetch_all_markets_combined()
+        account = hypurrfi.get_user_account_data(address)
+"""
+
+import time
+import threading
+
+from web3.exceptions import ContractLogicError
+
+from modules.rpc_manager import get_w3
+
+
+BLOCK_NUMBER_TTL = 1.0   # seconds a fetched block number is reused for new snapshots
+KEEP_BLOCKS = 2          # cached blocks retained (current + previous for in-flight readers)
+
+_local = threading.local()
+_lock = threading.Lock()
+_cache = {}              # block -> {call key: value}
+_latest = (0.0, None)    # (fetched_at, block number)
+_stats = {"hits": 0, "misses": 0}
+
+_MISSING = object()
+
+
+class _CachedError:
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _is_revert(error):
+    if isinstance(error, ContractLogicError):
+        return True
+    return getattr(error, "code", None) == 3 or "execution reverted" in str(error).lower()
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current():
+    """The innermost snapshot active on this thread, or None."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def _latest_block(w3):
+    global _latest
+    fetched_at, block = _latest
+    if block is not None and time.monotonic() - fetched_at < BLOCK_NUMBER_TTL:
+        return block
+    block = w3.eth.block_number
+    with _lock:
+        if _latest[1] is None or block >= _latest[1]:
+            _latest = (time.monotonic(), block)
+    return block
+
+
+def _prune(block):
+    with _lock:
+        for b in [b for b in _cache if b <= block - KEEP_BLOCKS]:
+            del _cache[b]
+
+
+def call_key(fn):
+    return (fn.address, fn.fn_name, repr(fn.args), repr(fn.kwargs))
+
+
+class BlockSnapshot:
+
+    def __init__(self, block=None, w3=None):
+        self.w3 = w3 or get_w3()
+        self.block = block
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        if self.block is None:
+            self.block = _latest_block(self.w3)
+        _prune(self.block)
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        return False
+
+    def _lookup(self, key):
+        with _lock:
+            value = _cache.get(self.block, {}).get(key, _MISSING)
+            if value is _MISSING:
+                _stats["misses"] += 1
+                self.misses += 1
+            else:
+                _stats["hits"] += 1
+                self.hits += 1
+        return value
+
+    def _store(self, key, value):
+        with _lock:
+            _cache.setdefault(self.block, {})[key] = value
+
+    def read(self, fn):
+        """ContractFunction.call() pinned to this snapshot's block, served from cache when possible."""
+        key = call_key(fn)
+        value = self._lookup(key)
+        if value is _MISSING:
+            try:
+                value = fn.call(block_identifier=self.block)
+            except Exception as e:
+                if not _is_revert(e):
+                    raise
+                value = _CachedError(e)
+            self._store(key, value)
+        if isinstance(value, _CachedError):
+            raise value.error
+        return value
+
+    def get_balance(self, address):
+        key = ("eth_getBalance", address)
+        value = self._lookup(key)
+        if value is _MISSING:
+            value = self.w3.eth.get_balance(address, block_identifier=self.block)
+            self._store(key, value)
+        return value
+
+    def multicall(self, calls, default=None, w3=None, chunk_size=None):
+        """multicall() at the pinned block; only calls not already cached hit the node."""
+        from modules.multicall import DEFAULT_CHUNK_SIZE, encode_call, run_multicall
+
+        calls = list(calls)
+        keys = []
+        for call in calls:
+            try:
+                target, calldata, _ = encode_call(call)
+                keys.append(("multicall", target, calldata))
+            except Exception:
+                keys.append(None)
+        results = [self._lookup(k) if k is not None else _MISSING for k in keys]
+        todo = [i for i, r in enumerate(results) if r is _MISSING]
+        if todo:
+            fetched = run_multicall([calls[i] for i in todo], default=_MISSING, w3=w3 or self.w3,
+                                    block_identifier=self.block, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE)
+            for i, value in zip(todo, fetched):
+                results[i] = value
+                if keys[i] is not None:
+                    self._store(keys[i], value)
+        return [default if r is _MISSING else r for r in results]
+
+
+def snapshot(block=None, w3=None):
+    return BlockSnapshot(block, w3)
+
+
+def read(fn):
+    """fn.call(), pinned and cached when a snapshot is active on this thread."""
+    snap = current()
+    if snap is None:
+        return fn.call()
+    return snap.read(fn)
+
+
+def cache_stats():
+    with _lock:
+        return {
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "blocks": sorted(_cache),
+            "entries": sum(len(v) for v in _cache.values()),
+        }
@@ -0,0 +1,289 @@
+"""
+Token metadata store (symbol / decimals).
+- in-process LRU in front of a SQLite table, so repeat lookups never touch the node
+- misses are resolved in bulk through one multicall
+- addresses that are not ERC20 tokens are cached as negative entries (in SQLite and the LRU) for
+  NEGATIVE_TTL; an address only counts as "not a token" when it has no code or its decimals()
+  reverts on a direct eth_call, never because a multicall chunk came back empty
+- decimals() of an unknown token raises unless the caller passes a default (which is logged)
+- prewarm() loads TOKEN_MAP and the reserve lists of HyperLend and HypurrFi
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from eth_utils import to_checksum_address
+
+from modules.rpc_manager import get_w3
+from modules.multicall import multicall
+from modules.rpc_batch import rpc_batch
+from modules.token_map import TOKEN_MAP
+
+
+DB_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "token_metadata.db")
+)
+LRU_SIZE = 2048
+NEGATIVE_TTL = 7 * 24 * 3600   # re-check non-token addresses weekly
+
+NATIVE_ADDRESSES = (
+    "0x0000000000000000000000000000000000000000",
+    "0x2222222222222222222222222222222222222222",
+)
+NATIVE_METADATA = ("HYPE", 18)
+
+ERC20_META_ABI = [
+    {"constant": True, "inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}], "type": "function"},
+    {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"},
+]
+
+logger = logging.getLogger(__name__)
+
+DECIMALS_SELECTOR = "0x313ce567"
+
+
+class _Negative:
+    """Cached "not an ERC20 token" entry; expires NEGATIVE_TTL after checked_at."""
+
+    __slots__ = ("checked_at",)
+
+    def __init__(self, checked_at):
+        self.checked_at = checked_at
+
+    def expired(self):
+        return time.time() - self.checked_at > NEGATIVE_TTL
+
+
+def _is_revert(error):
+    return getattr(error, "code", None) == 3 or "revert" in str(error).lower()
+
+
+class TokenMetadataStore:
+
+    def __init__(self, db_path=DB_PATH, max_entries=LRU_SIZE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS token_metadata (
+                address TEXT PRIMARY KEY,
+                symbol TEXT,
+                decimals INTEGER,
+                valid BOOLEAN DEFAULT 1,
+                checked_at REAL
+            )
+        """)
+        self.conn.commit()
+
+    # -- LRU --
+
+    def _lru_get(self, key):
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                self._lru.move_to_end(key)
+            return hit
+
+    def _lru_put(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    # -- SQLite --
+
+    def _db_get(self, key):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT symbol, decimals, valid, checked_at FROM token_metadata WHERE address = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        symbol, decimals, valid, checked_at = row
+        if not valid:
+            negative = _Negative(checked_at or 0)
+            return None if negative.expired() else negative
+        return (symbol, decimals)
+
+    def _db_put_many(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO token_metadata (address, symbol, decimals, valid, checked_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+
+    # -- lookups --
+
+    def _cached(self, key):
+        hit = self._lru_get(key)
+        if isinstance(hit, _Negative) and hit.expired():
+            with self._lock:
+                self._lru.pop(key, None)
+            hit = None
+        if hit is not None:
+            return hit
+        hit = self._db_get(key)
+        if hit is not None:
+            self._lru_put(key, hit)
+        return hit
+
+    def get(self, address):
+        """(symbol, decimals) for `address`, or None if it is not an ERC20 token."""
+        key = address.lower()
+        if key in NATIVE_ADDRESSES:
+            return NATIVE_METADATA
+        hit = self._cached(key)
+        if hit is None:
+            self.warm([address])
+            hit = self._lru_get(key)
+        if hit is None or isinstance(hit, _Negative):
+            return None
+        return hit
+
+    def decimals(self, address, default=None):
+        """Token decimals; raises RuntimeError when unknown unless a `default` is given."""
+        meta = self.get(address)
+        if meta is None or meta[1] is None:
+            if default is None:
+                raise RuntimeError(f"Token decimals unknown for {address}")
+            logger.warning(f"Token decimals unknown for {address}, assuming {default}")
+            return default
+        return meta[1]
+
+    def symbol(self, address, default=None):
+        meta = self.get(address)
+        if meta is None or meta[0] is None:
+            return default
+        return meta[0]
+
+    def warm(self, addresses):
+        """Resolve every uncached address in `addresses` with one multicall."""
+        missing = []
+        for a in addresses:
+            key = a.lower()
+            if key in NATIVE_ADDRESSES or key in missing or self._cached(key) is not None:
+                continue
+            missing.append(key)
+        if not missing:
+            return 0
+
+        w3 = get_w3()
+        calls = []
+        valid_keys = []
+        rows = []
+        now = time.time()
+        for key in missing:
+            try:
+                token = w3.eth.contract(address=to_checksum_address(key), abi=ERC20_META_ABI)
+            except Exception:
+                rows.append((key, None, None, 0, now))
+                continue
+            valid_keys.append(key)
+            calls += [(token, "symbol", []), (token, "decimals", [])]
+        out = multicall(calls, w3=w3)
+
+        # a decimals() missing from the multicall (revert, or a chunk that failed) is re-checked
+        # directly: negative only for an address without code or whose decimals() reverts;
+        # anything else (transport error, rate limit) is left uncached
+        unresolved = [key for i, key in enumerate(valid_keys) if out[2 * i + 1] is None]
+        retried = {}
+        not_tokens = set()
+        if unresolved:
+            try:
+                with rpc_batch() as batch:
+                    slots = {
+                        key: (batch.get_code(key), batch.call({"to": to_checksum_address(key), "data": DECIMALS_SELECTOR}))
+                        for key in unresolved
+                    }
+            except Exception as e:
+                logger.warning(f"Token metadata lookup failed, not caching: {e}")
+                slots = {}
+            for key, (code, call) in slots.items():
+                try:
+                    if code.result() in (None, "0x", ""):
+                        not_tokens.add(key)
+                        continue
+                except Exception:
+                    continue
+                try:
+                    value = call.result()
+                except Exception as e:
+                    if _is_revert(e):
+                        not_tokens.add(key)
+                    continue
+                decimals = int(value, 16) if value and value != "0x" else None
+                if decimals is not None and decimals <= 255:
+                    retried[key] = decimals
+                else:
+                    not_tokens.add(key)
+
+        for i, key in enumerate(valid_keys):
+            symbol, decimals = out[2 * i], out[2 * i + 1]
+            if decimals is None:
+                decimals = retried.get(key)
+            if decimals is not None:
+                rows.append((key, symbol, int(decimals), 1, now))
+            elif key in not_tokens:
+                rows.append((key, None, None, 0, now))
+
+        self._db_put_many(rows)
+        for key, symbol, decimals, valid, checked_at in rows:
+            self._lru_put(key, (symbol, decimals) if valid else _Negative(checked_at))
+        return len(rows)
+
+    def prewarm(self):
+        """Load TOKEN_MAP and both lending protocols' reserve lists into the store."""
+        addresses = list(TOKEN_MAP.values())
+        try:
+            import modules.hyperlend as hyperlend
+            addresses += [r["underlyingAsset"] for r in hyperlend.fetch_reserves_onchain()]
+        except Exception as e:
+            logger.warning(f"HyperLend reserve list unavailable for prewarm: {e}")
+        try:
+            import modules.hypurrfi as hypurrfi
+            addresses += hypurrfi.ui_pool.functions.getReservesList(hypurrfi.POOL_ADDRESSES_PROVIDER).call()
+        except Exception as e:
+            logger.warning(f"HypurrFi reserve list unavailable for prewarm: {e}")
+        return self.warm(addresses)
+
+    def close(self):
+        self.conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TokenMetadataStore()
+    return _store
+
+
+def token_decimals(address, default=None):
+    return get_store().decimals(address, default)
+
+
+def token_symbol(address, default=None):
+    return get_store().symbol(address, default)
+
+
+def warm_tokens(addresses):
+    return get_store().warm(addresses)
+
+
+def prewarm():
+    return get_store().prewarm()
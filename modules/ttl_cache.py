@@ -0,0 +1,139 @@
+"""
+Process-wide TTL cache with stale-while-revalidate and single-flight loads.
+- fresh entries (age < ttl) are served directly
+- stale entries (age < ttl + stale_ttl) are served immediately while one background
+  thread refreshes them
+- concurrent misses for the same key wait on a single load instead of each calling the loader
+- invalidate() drops entries, e.g. after one of our own transactions changed the data; loads
+  started before it are not stored and not joined, and get(force=True) always starts its own load
+
+    markets = TTLCache(load_markets, ttl=30, stale_ttl=300, name="hyperlend_markets")
+    markets.get()
+"""
+
+import time
+import logging
+import threading
+
+from modules.instrumentation import operation
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+
+    __slots__ = ("value", "loaded_at")
+
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+
+
+class _Flight:
+
+    __slots__ = ("event", "value", "error", "generation")
+
+    def __init__(self, generation):
+        self.event = threading.Event()
+        self.generation = generation
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+
+    def __init__(self, loader, ttl, stale_ttl=0, name=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name or getattr(loader, "__name__", "cache")
+        self._entries = {}
+        self._flights = {}
+        self._generation = 0     # bumped by invalidate(): older loads are dropped
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.errors = 0
+        self.last_error = None
+
+    def _load(self, key, flight):
+        try:
+            value = self.loader() if key is None else self.loader(key)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+                self.last_error = str(e)
+        else:
+            flight.value = value
+            with self._lock:
+                self.loads += 1
+                # invalidated or superseded by a forced load while in flight: do not cache
+                if flight.generation == self._generation and self._flights.get(key) is flight:
+                    self._entries[key] = _Entry(value, time.monotonic())
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+
+    def _refresh_in_background(self, key, flight):
+        def run():
+            with operation(f"{self.name}_refresh"):
+                self._load(key, flight)
+            if flight.error is not None:
+                logger.warning(f"{self.name}: background refresh failed, serving stale data: {flight.error}")
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def get(self, key=None, force=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            age = now - entry.loaded_at if entry is not None else None
+            if entry is not None and not force and age < self.ttl:
+                self.hits += 1
+                return entry.value
+            flight = self._flights.get(key)
+            leader = flight is None or force or flight.generation != self._generation
+            if leader:
+                flight = self._flights[key] = _Flight(self._generation)
+            if entry is not None and not force and age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if leader:
+                    self._refresh_in_background(key, flight)
+                return entry.value
+            self.misses += 1
+        if leader:
+            self._load(key, flight)
+        else:
+            flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def invalidate(self, key=None, all_keys=False):
+        with self._lock:
+            self._generation += 1
+            if all_keys:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            ages = {k: round(time.monotonic() - e.loaded_at, 1) for k, e in self._entries.items()}
+            return {
+                "name": self.name,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "age_s": ages.get(None) if list(ages) == [None] else ages,
+            }